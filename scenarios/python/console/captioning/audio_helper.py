@@ -0,0 +1,66 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# The parts of audio input that use the Speech SDK. helper.py does not import the SDK, so captions can be
+# rendered without it.
+
+from typing import Optional
+import azure.cognitiveservices.speech as speechsdk # type: ignore
+import helper
+
+# See speech_recognize_once_compressed_input() in:
+# https://github.com/Azure-Samples/cognitive-services-speech-sdk/blob/master/samples/python/console/speech_sample.py
+# If start and end are set, the callback reads only that byte range of the file.
+# If read_wav_header is True, the callback parses the WAV header, which is then available as wav_header,
+# and reads only the audio data, so the header is not passed to the SDK as audio. start is then relative to
+# the start of the audio data, and end is ignored.
+class BinaryFileReaderCallback(speechsdk.audio.PullAudioInputStreamCallback):
+    def __init__(self, filename: str, start: int = 0, end: Optional[int] = None, read_wav_header: bool = False):
+        super().__init__()
+        # The file is unbuffered, because we read from it straight into the buffer the SDK gives us.
+        self._file_h = open(filename, "rb", buffering=0)
+        self.wav_header : Optional[helper.WavHeader] = None
+        if read_wav_header :
+            self.wav_header = helper.wav_header_from_stream(self._file_h, filename)
+            self.seek_data(start)
+        else :
+            self._file_h.seek(start)
+            self._remaining = end - start if end is not None else None
+
+    # Start reading start bytes into the audio data, so callers can decide where to start from the WAV header.
+    # Valid only with read_wav_header, and before the first read.
+    def seek_data(self, start: int) -> None:
+        end = self.wav_header.data_offset + self.wav_header.data_size
+        start = min(self.wav_header.data_offset + start, end)
+        self._file_h.seek(start)
+        self._remaining = end - start
+
+    def read(self, buffer: memoryview) -> int:
+        try:
+            view = buffer if 1 == buffer.itemsize else buffer.cast("B")
+            size = view.nbytes
+            if self._remaining is not None :
+                size = min(size, self._remaining)
+            if 0 == size :
+                return 0
+            # readinto fills the SDK buffer without allocating a bytes object for each read.
+            read = self._file_h.readinto(view[:size])
+            if self._remaining is not None :
+                self._remaining -= read
+            return read
+        except Exception as ex:
+            print('Exception in `read`: {}'.format(ex))
+            raise
+
+    def close(self) -> None:
+        print('closing file')
+        try:
+            self._file_h.close()
+        except Exception as ex:
+            print('Exception in `close`: {}'.format(ex))
+            raise
+
+def audio_stream_format_from_wav_header(header : helper.WavHeader) -> speechsdk.audio.AudioStreamFormat :
+    return speechsdk.audio.AudioStreamFormat(samples_per_second=header.samples_per_second, bits_per_sample=header.bits_per_sample, channels=header.channels)
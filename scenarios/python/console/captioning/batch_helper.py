@@ -0,0 +1,135 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from os import linesep, listdir, makedirs
+from os.path import abspath, basename, dirname, isdir, isfile, join, normcase, splitext
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+import helper
+import checkpoint
+import result_cache
+
+UNCOMPRESSED_AUDIO_EXTENSIONS = [".wav"]
+COMPRESSED_AUDIO_EXTENSIONS = [".alaw", ".flac", ".mp3", ".mp4", ".mulaw", ".ogg", ".opus"]
+
+class BatchJob(object) :
+    def __init__(self, input_file : str, output_file : str, cache_file : Optional[str] = None, checkpoint_file : Optional[str] = None) :
+        self.input_file = input_file
+        self.output_file = output_file
+        self.cache_file = cache_file
+        self.checkpoint_file = checkpoint_file
+        # Every caption file the job writes. See helper.output_files_from_user_config.
+        self.output_files = [output_file]
+        self.audio_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.error : Optional[str] = None
+
+def input_files_from_directory(directory : str, use_compressed_audio : bool) -> List[str] :
+    extensions = COMPRESSED_AUDIO_EXTENSIONS if use_compressed_audio else UNCOMPRESSED_AUDIO_EXTENSIONS
+    return [join(directory, name) for name in sorted(listdir(directory)) if splitext(name)[1].lower() in extensions and isfile(join(directory, name))]
+
+def input_files_from_manifest(manifest : str) -> List[str] :
+    retval : List[str] = []
+    with open(manifest, mode = "r", encoding = "utf-8") as f :
+        for line in f :
+            line = line.strip()
+            # Skip blank lines and comments.
+            if line and not line.startswith("#") :
+                retval.append(join(dirname(manifest), line))
+    return retval
+
+def jobs_from_user_config(user_config : helper.Read_Only_Dict) -> List[BatchJob] :
+    batch_input = user_config["batch_input"]
+    input_files = input_files_from_directory(batch_input, user_config["use_compressed_audio"]) if isdir(batch_input) else input_files_from_manifest(batch_input)
+    extension = "." + user_config["caption_format"]
+    output_directory = user_config["batch_output_directory"]
+    retval : List[BatchJob] = []
+    for input_file in input_files :
+        output_file = splitext(input_file)[0] + extension
+        if output_directory is not None :
+            output_file = join(output_directory, basename(output_file))
+        # With --batch, --cache and --checkpoint name directories, with one file per input file.
+        name = splitext(basename(input_file))[0]
+        cache_file = join(user_config["cache_file"], name + result_cache.CACHE_FILE_EXTENSION) if user_config["cache_file"] is not None else None
+        checkpoint_file = join(user_config["checkpoint_file"], name + checkpoint.CHECKPOINT_FILE_EXTENSION) if user_config["checkpoint_file"] is not None else None
+        job = BatchJob(input_file, output_file, cache_file, checkpoint_file)
+        job.output_files = helper.output_files_from_user_config(helper.Read_Only_Dict(dict(user_config, output_file = output_file)))
+        retval.append(job)
+    check_unique_files(retval)
+    return retval
+
+# The jobs run at the same time, so two jobs that write the same file would overwrite each other's output.
+# This happens when input files in different directories have the same name, or a manifest lists a file twice.
+# It also happens when the --translate, --formats or --layouts files of one job have the name of another job's file.
+def check_unique_files(jobs : List[BatchJob]) -> None :
+    input_files_by_file : Dict[str, str] = {}
+    for job in jobs :
+        for file in job.output_files + [job.cache_file, job.checkpoint_file] :
+            if file is None :
+                continue
+            key = normcase(abspath(file))
+            if key in input_files_by_file :
+                raise RuntimeError("{} and {} would both write {}. Rename one of them, or caption them in separate batches.".format(input_files_by_file[key], job.input_file, file))
+            input_files_by_file[key] = job.input_file
+
+def throughput(audio_seconds : float, wall_seconds : float) -> float :
+    return audio_seconds / wall_seconds if wall_seconds > 0 else 0.0
+
+# Caption every file in the batch, running up to user_config["concurrency"] recognition sessions at once.
+# caption_session runs one session for the user_config it is given, and returns the seconds of audio it processed.
+# Check the error of each job that is returned to see if it failed.
+def caption_batch(user_config : helper.Read_Only_Dict, caption_session : Callable[[helper.Read_Only_Dict], float]) -> List[BatchJob] :
+    if user_config["serve_port"] is not None :
+        # Every session would try to listen on the same port.
+        raise RuntimeError("--serve is not valid with --batch.")
+    if user_config["hls_directory"] is not None :
+        # Every session would write the same segments and playlist.
+        raise RuntimeError("--hls is not valid with --batch.")
+    if user_config["metrics_file"] is not None :
+        # Metrics measure live audio, and every session would write the same file.
+        raise RuntimeError("--metrics is not valid with --batch.")
+    if user_config["recording_file"] is not None :
+        raise RuntimeError("--record is not valid with --batch.")
+    if user_config["use_stdin"] or user_config["ffmpeg_source"] is not None :
+        # Each session would read its audio from the same source, rather than from its input file.
+        raise RuntimeError("--stdin and --ffmpeg are not valid with --batch.")
+    jobs = jobs_from_user_config(user_config)
+    if user_config["batch_output_directory"] is not None :
+        makedirs(user_config["batch_output_directory"], exist_ok = True)
+    if user_config["cache_file"] is not None :
+        makedirs(user_config["cache_file"], exist_ok = True)
+    # A batch that fails can be run again with --resume.
+    if user_config["checkpoint_file"] is not None :
+        makedirs(user_config["checkpoint_file"], exist_ok = True)
+    # Sessions run side by side, so their console output would be interleaved. We print a summary line per file instead.
+    print_lock = Lock()
+
+    def run_job(job : BatchJob) -> BatchJob :
+        job_config = helper.Read_Only_Dict(dict(user_config, input_file = job.input_file, output_file = job.output_file, cache_file = job.cache_file, checkpoint_file = job.checkpoint_file, suppress_console_output = True))
+        start = perf_counter()
+        try :
+            job.audio_seconds = caption_session(job_config)
+        except Exception as ex :
+            job.error = str(ex)
+        job.wall_seconds = perf_counter() - start
+        with print_lock :
+            if job.error is not None :
+                print("{}: failed after {:.1f} s: {}".format(job.input_file, job.wall_seconds, job.error))
+            else :
+                print("{}: {:.1f} s of audio in {:.1f} s ({:.2f} audio seconds per second) -> {}".format(job.input_file, job.audio_seconds, job.wall_seconds, throughput(job.audio_seconds, job.wall_seconds), job.output_file))
+        return job
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers = user_config["concurrency"]) as executor :
+        for future in as_completed([executor.submit(run_job, job) for job in jobs]) :
+            future.result()
+    wall_seconds = perf_counter() - start
+
+    audio_seconds = sum(job.audio_seconds for job in jobs)
+    failed = sum(1 for job in jobs if job.error is not None)
+    print("{}Captioned {} of {} files: {:.1f} s of audio in {:.1f} s ({:.2f} audio seconds per second).".format(linesep, len(jobs) - failed, len(jobs), audio_seconds, wall_seconds, throughput(audio_seconds, wall_seconds)))
+    return jobs
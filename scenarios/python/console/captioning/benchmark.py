@@ -0,0 +1,317 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Measures the caption engine without a Speech resource. We generate recognition results with realistic
+# offsets, durations and partial result bursts, feed them to the offline and real-time caption paths in
+# place of SDK results, and report throughput, per-event latency percentiles and peak memory.
+# Run with --baseline to compare against a previous --json report, for example before and after a change
+# to line length or timing logic.
+
+from hashlib import sha256
+from json import dump, load
+from os import linesep
+from random import Random
+from time import perf_counter_ns
+from typing import Callable, Dict, List, Optional, Sequence
+import tracemalloc
+import caption_helper
+import caption_renderer
+import helper
+import user_config_helper
+
+USAGE = """Usage: python benchmark.py [...]
+
+  HELP
+    --help                           Show this help and stop.
+
+  WORKLOAD
+    --languages LANG1;LANG2          Languages to generate results for.
+                                     Default is en-US;zh-CN.
+    --utterances COUNT               Number of utterances (final results) per language.
+                                     Minimum is 1. Default is 2000.
+    --seed NUMBER                    Seed for the result generator, so runs can be compared.
+                                     Default is 1.
+    --maxLineLength LENGTH           As for captioning.py.
+    --lines LINES                    As for captioning.py.
+    --repeat COUNT                   Run each scenario COUNT times and report the fastest run, to reduce noise.
+                                     Minimum is 1. Default is 3.
+
+  REPORT
+    --json FILE                      Also write the report to FILE as JSON.
+    --baseline FILE                  Compare with a report written by --json, and exit with an error if any
+                                     scenario is slower, or its captions differ.
+    --tolerance PERCENT              How much slower than the baseline a scenario can be before it counts as a regression.
+                                     Default is 20.
+"""
+
+# Rough speaking rates, used to spread words over time.
+TICKS_PER_WORD = helper.ticks_from_milliseconds(350)
+TICKS_PER_IDEOGRAPH = helper.ticks_from_milliseconds(220)
+
+ENGLISH_WORDS = ("the of and to a in is it you that he was for on are with as I his they be at one have this from "
+    "or had by word but what some we can out other were all there when up use your how said an each she which do "
+    "their time if will way about many then them write would like so these her long make thing see him two has "
+    "look more day could go come did number sound no most people my over know water than call first who may down "
+    "side been now find any new work part take get place made live where after back little only round man year "
+    "came show every good me give our under name very through just form sentence great think say help low line "
+    "Contoso 3.14 1,000 e.g. bing.com").split()
+ENGLISH_PUNCTUATION = ["", "", "", "", "", "", ",", ",", ";", "?", "!"]
+CHINESE_CHARACTERS = "的一是不了人我在有他这为之大来以个中上们到说国和地也子时道出而要于就下得可你年生自会那后能对着事其里所去行过家十用发天如然作方成者多日都三小军二无同么经法当起与好看学进种将还分此心前面又定见只主没公从"
+CHINESE_PUNCTUATION = ["", "", "", "", "，", "，", "、", "？", "！"]
+
+class Scenario(object) :
+    def __init__(self, name : str, language : str, results : int, audio_seconds : float) :
+        self.name = name
+        self.language = language
+        self.results = results
+        self.audio_seconds = audio_seconds
+        self.wall_seconds = 0.0
+        self.latencies_ns : List[int] = []
+        self.peak_memory_bytes = 0
+        self.captions = 0
+        self.digest = ""
+
+    def percentile_microseconds(self, percentile : float) -> Optional[float] :
+        if not self.latencies_ns :
+            return None
+        return helper.percentile_from_sorted(sorted(self.latencies_ns), percentile) / 1000
+
+    def to_dict(self) -> Dict :
+        return {
+            "name" : self.name,
+            "language" : self.language,
+            "results" : self.results,
+            "audio_seconds" : self.audio_seconds,
+            "wall_seconds" : self.wall_seconds,
+            "results_per_second" : self.results / self.wall_seconds if self.wall_seconds > 0 else 0.0,
+            "p50_us" : self.percentile_microseconds(50),
+            "p90_us" : self.percentile_microseconds(90),
+            "p99_us" : self.percentile_microseconds(99),
+            "max_us" : self.percentile_microseconds(100),
+            "peak_memory_bytes" : self.peak_memory_bytes,
+            "captions" : self.captions,
+            "digest" : self.digest,
+        }
+
+# A stream of recognition events as the SDK would raise them: for each utterance, a burst of Recognizing
+# results that grow a few words at a time, then one Recognized result with the full text.
+# Each event is (result, is_recognized_result).
+def events_from_language(language : str, utterances : int, seed : int) -> List[tuple] :
+    random = Random(seed)
+    is_ideographic = language.split("-")[0].lower() in ("zh", "ja")
+    retval : List[tuple] = []
+    offset = helper.ticks_from_milliseconds(random.randint(0, 2000))
+    for _ in range(utterances) :
+        tokens : List[str] = []
+        for _ in range(random.randint(3, 60)) :
+            if is_ideographic :
+                tokens.append(random.choice(CHINESE_CHARACTERS) + random.choice(CHINESE_PUNCTUATION))
+            else :
+                tokens.append(random.choice(ENGLISH_WORDS) + random.choice(ENGLISH_PUNCTUATION))
+        # Finish the sentence.
+        tokens[-1] = tokens[-1].rstrip(",;，、") + ("。" if is_ideographic else ".")
+        separator = "" if is_ideographic else " "
+        ticks_per_token = TICKS_PER_IDEOGRAPH if is_ideographic else TICKS_PER_WORD
+        duration = 0
+        count = 0
+        burst = 0
+        while count < len(tokens) :
+            if burst > 0 :
+                # In a burst, partial results arrive one token and a few milliseconds apart.
+                burst -= 1
+                count += 1
+                duration += helper.ticks_from_milliseconds(random.randint(10, 50))
+            else :
+                # Otherwise partial results arrive every one to four tokens.
+                step = random.randint(1, 4)
+                count = min(len(tokens), count + step)
+                duration += sum(random.randint(ticks_per_token // 2, ticks_per_token * 3 // 2) for _ in range(step))
+                if random.random() < 0.2 :
+                    burst = random.randint(2, 6)
+            if count < len(tokens) :
+                text = separator.join(tokens[:count])
+                # The service sometimes revises the last word of a partial result.
+                if not is_ideographic and random.random() < 0.1 :
+                    text = text.rsplit(" ", 1)[0] + " " + random.choice(ENGLISH_WORDS)
+                retval.append((caption_helper.RecognitionRecord(text, offset, duration, "RecognizingSpeech"), False))
+        retval.append((caption_helper.RecognitionRecord(separator.join(tokens), offset, duration, "RecognizedSpeech"), True))
+        # Pause between utterances.
+        offset += duration + helper.ticks_from_milliseconds(random.randint(100, 3000))
+    return retval
+
+def user_config_from_benchmark_args(language : str, captioning_mode : user_config_helper.CaptioningMode, stream_offline_captions : bool) -> helper.Read_Only_Dict :
+    max_line_length = helper.DEFAULT_MAX_LINE_LENGTH_SBCS
+    s_max_line_length = user_config_helper.get_cmd_option("--maxLineLength")
+    if s_max_line_length is not None :
+        max_line_length = max(int(s_max_line_length), 20)
+    lines = 2
+    s_lines = user_config_helper.get_cmd_option("--lines")
+    if s_lines is not None :
+        lines = max(int(s_lines), 1)
+    # Only the keys the caption renderer reads. There is no recognizer, so no key, region or input.
+    return helper.Read_Only_Dict({
+        "language" : language,
+        "captioning_mode" : captioning_mode,
+        "stream_offline_captions" : stream_offline_captions,
+        "remain_time" : helper.ticks_from_milliseconds(1000),
+        "delay" : helper.ticks_from_milliseconds(1000),
+        "caption_format" : user_config_helper.CaptionFormat.WEBVTT,
+        "max_line_length" : max_line_length,
+        "lines" : lines,
+    })
+
+# The caption paths. Each feeds the events to a renderer, records the latency of each event in scenario,
+# and returns the captions that the events complete.
+def real_time_path(scenario : Scenario, session : caption_renderer.CaptionRenderer, events : List[tuple]) -> List[caption_helper.Caption] :
+    retval : List[caption_helper.Caption] = []
+    for (result, is_recognized_result) in events :
+        start = perf_counter_ns()
+        caption = session.caption_from_real_time_result(result, is_recognized_result)
+        # Writing a caption includes formatting it.
+        if caption is not None :
+            session.string_from_caption(caption)
+        scenario.latencies_ns.append(perf_counter_ns() - start)
+        if caption is not None :
+            retval.append(caption)
+    return retval
+
+def offline_streaming_path(scenario : Scenario, session : caption_renderer.CaptionRenderer, events : List[tuple]) -> List[caption_helper.Caption] :
+    retval : List[caption_helper.Caption] = []
+    for (result, _) in events :
+        start = perf_counter_ns()
+        captions = session.captions_from_offline_result(result)
+        for caption in captions :
+            session.string_from_caption(caption)
+        scenario.latencies_ns.append(perf_counter_ns() - start)
+        retval += captions
+    return retval
+
+# Offline mode makes all captions at the end of the session, so there is no per-event latency.
+def offline_path(scenario : Scenario, session : caption_renderer.CaptionRenderer, events : List[tuple]) -> Sequence[caption_helper.Caption] :
+    for (result, _) in events :
+        session.captions_from_result(result, True)
+    return session.final_captions()
+
+CaptionPath = Callable[[Scenario, caption_renderer.CaptionRenderer, List[tuple]], Sequence[caption_helper.Caption]]
+
+# Run one caption path over the events, with a new session.
+# If measure_memory is True, we only measure peak memory, because tracing allocations slows everything down.
+def run_path(scenario : Scenario, user_config : helper.Read_Only_Dict, events : List[tuple], path : CaptionPath, measure_memory : bool) -> None :
+    # The caption paths keep state, so each run needs its own renderer.
+    session = caption_renderer.CaptionRenderer(user_config)
+    if measure_memory :
+        tracemalloc.start()
+        path(Scenario(scenario.name, scenario.language, scenario.results, scenario.audio_seconds), session, events)
+        scenario.peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return
+    digest = sha256()
+    start = perf_counter_ns()
+    captions = path(scenario, session, events)
+    scenario.wall_seconds = (perf_counter_ns() - start) / 1e9
+    for caption in captions :
+        digest.update(session.string_from_caption(caption).encode("utf-8"))
+    scenario.captions = len(captions)
+    scenario.digest = digest.hexdigest()
+
+# Run the scenario repeat times and keep the fastest run, to reduce noise.
+def run_scenario(name : str, language : str, events : List[tuple], captioning_mode : user_config_helper.CaptioningMode, stream_offline_captions : bool, repeat : int) -> Scenario :
+    if user_config_helper.CaptioningMode.OFFLINE == captioning_mode :
+        # Offline mode only sees Recognized results.
+        events = [event for event in events if event[1]]
+    audio_seconds = (events[-1][0].offset + events[-1][0].duration) / helper.TICKS_PER_SECOND
+    if user_config_helper.CaptioningMode.REALTIME == captioning_mode :
+        path = real_time_path
+    elif stream_offline_captions :
+        path = offline_streaming_path
+    else :
+        path = offline_path
+    user_config = user_config_from_benchmark_args(language, captioning_mode, stream_offline_captions)
+    retval : Optional[Scenario] = None
+    for _ in range(repeat) :
+        scenario = Scenario(name, language, len(events), audio_seconds)
+        run_path(scenario, user_config, events, path, False)
+        if retval is None or scenario.wall_seconds < retval.wall_seconds :
+            retval = scenario
+    run_path(retval, user_config, events, path, True)
+    return retval
+
+def run_benchmark(languages : List[str], utterances : int, seed : int, repeat : int) -> List[Scenario] :
+    retval : List[Scenario] = []
+    for language in languages :
+        events = events_from_language(language, utterances, seed)
+        retval.append(run_scenario("offline", language, events, user_config_helper.CaptioningMode.OFFLINE, False, repeat))
+        retval.append(run_scenario("offline-stream", language, events, user_config_helper.CaptioningMode.OFFLINE, True, repeat))
+        retval.append(run_scenario("realtime", language, events, user_config_helper.CaptioningMode.REALTIME, False, repeat))
+    return retval
+
+def format_microseconds(value : Optional[float]) -> str :
+    return "-" if value is None else "{:.1f}".format(value)
+
+def print_report(scenarios : List[Scenario]) -> None :
+    print("{:<16}{:<8}{:>9}{:>12}{:>13}{:>9}{:>9}{:>9}{:>10}{:>11}".format("scenario", "lang", "results", "audio s/s", "results/s", "p50 us", "p90 us", "p99 us", "max us", "peak KiB"))
+    for scenario in scenarios :
+        report = scenario.to_dict()
+        print("{:<16}{:<8}{:>9}{:>12.0f}{:>13.0f}{:>9}{:>9}{:>9}{:>10}{:>11.0f}".format(
+            scenario.name, scenario.language, scenario.results,
+            scenario.audio_seconds / scenario.wall_seconds if scenario.wall_seconds > 0 else 0.0, report["results_per_second"],
+            format_microseconds(report["p50_us"]), format_microseconds(report["p90_us"]), format_microseconds(report["p99_us"]), format_microseconds(report["max_us"]),
+            scenario.peak_memory_bytes / 1024))
+
+# Return a description of each regression against the baseline report.
+def regressions_from_baseline(scenarios : List[Scenario], baseline : Dict, tolerance_percent : float) -> List[str] :
+    retval : List[str] = []
+    baseline_scenarios = { (scenario["name"], scenario["language"]) : scenario for scenario in baseline["scenarios"] }
+    for scenario in scenarios :
+        previous = baseline_scenarios.get((scenario.name, scenario.language))
+        if previous is None :
+            continue
+        current = scenario.to_dict()
+        if current["digest"] != previous["digest"] :
+            retval.append("{} {}: captions differ from the baseline.".format(scenario.name, scenario.language))
+        if current["results_per_second"] < previous["results_per_second"] * (1 - tolerance_percent / 100) :
+            retval.append("{} {}: {:.0f} results/s, baseline {:.0f}.".format(scenario.name, scenario.language, current["results_per_second"], previous["results_per_second"]))
+        if current["p99_us"] is not None and previous["p99_us"] is not None and current["p99_us"] > previous["p99_us"] * (1 + tolerance_percent / 100) :
+            retval.append("{} {}: p99 latency {:.1f} us, baseline {:.1f} us.".format(scenario.name, scenario.language, current["p99_us"], previous["p99_us"]))
+    return retval
+
+if __name__ == "__main__" :
+    if user_config_helper.cmd_option_exists("--help") :
+        print(USAGE)
+    else :
+        s_languages = user_config_helper.get_cmd_option("--languages")
+        languages = [language.strip() for language in s_languages.split(";")] if s_languages is not None else ["en-US", "zh-CN"]
+        utterances = 2000
+        s_utterances = user_config_helper.get_cmd_option("--utterances")
+        if s_utterances is not None :
+            utterances = max(int(s_utterances), 1)
+        repeat = 3
+        s_repeat = user_config_helper.get_cmd_option("--repeat")
+        if s_repeat is not None :
+            repeat = max(int(s_repeat), 1)
+        s_seed = user_config_helper.get_cmd_option("--seed")
+        seed = int(s_seed) if s_seed is not None else 1
+        s_tolerance = user_config_helper.get_cmd_option("--tolerance")
+        tolerance = float(s_tolerance) if s_tolerance is not None else 20.0
+
+        scenarios = run_benchmark(languages, utterances, seed, repeat)
+        print_report(scenarios)
+
+        report = { "utterances" : utterances, "seed" : seed, "scenarios" : [scenario.to_dict() for scenario in scenarios] }
+        json_file = user_config_helper.get_cmd_option("--json")
+        if json_file is not None :
+            with open(json_file, mode = "w", encoding = "utf-8") as f :
+                dump(report, f, indent = 2)
+
+        baseline_file = user_config_helper.get_cmd_option("--baseline")
+        if baseline_file is not None :
+            with open(baseline_file, mode = "r", encoding = "utf-8") as f :
+                baseline = load(f)
+            if baseline["utterances"] != utterances or baseline["seed"] != seed :
+                raise RuntimeError("The baseline was run with different --utterances or --seed.{}{}".format(linesep, USAGE))
+            regressions = regressions_from_baseline(scenarios, baseline, tolerance)
+            if regressions :
+                raise RuntimeError("Regressions against {}:{}{}".format(baseline_file, linesep, linesep.join(regressions)))
+            print("{}No regressions against {}.".format(linesep, baseline_file))
@@ -3,48 +3,160 @@
 # Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
 #
 
-from datetime import date, datetime, time, timedelta
-from typing import List, Optional, Tuple
-import azure.cognitiveservices.speech as speechsdk # type: ignore
+from array import array
+from bisect import bisect_right
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
 import helper
+import line_breaker
+
+try :
+    import numpy # type: ignore
+except ImportError :
+    # Optional. Without NumPy, CaptionStore.extend_ends loops in Python.
+    numpy = None
+
+# This module does not import the Speech SDK, so captions can be rendered without it.
+# A result is a speechsdk.RecognitionResult or a RecognitionRecord, and its reason is a
+# speechsdk.ResultReason or the name of one.
+RecognitionResult = Any
+PARTIAL_RESULT_REASONS = ["RecognizingSpeech", "TranslatingSpeech"]
+FINAL_RESULT_REASONS = ["RecognizedSpeech", "RecognizedIntent", "TranslatedSpeech"]
+
+def reason_name(reason : Any) -> str :
+    return reason if isinstance(reason, str) else reason.name
 
 class Caption(object) :
-    def __init__(self, language : Optional[str], sequence : int, begin : time, end : time, text : str) :
+    def __init__(self, language : Optional[str], sequence : int, begin : int, end : int, text : str) :
         self.language = language
         self.sequence = sequence
         self.begin = begin
         self.end = end
         self.text = text
 
+# Holds many captions of one language in arrays, rather than as a Caption object each: the sequence numbers
+# and begin and end times in arrays of 64-bit integers, and the text of all captions in one string, with
+# the offset at which the text of each caption starts. Offline mode keeps every caption until recognition
+# finishes, so this saves memory on long recordings, and lets us set the end times of all captions at once.
+# Reading a caption returns a new Caption object, so changing it does not change the store.
+class CaptionStore(object) :
+    def __init__(self, language : Optional[str]) :
+        self.language = language
+        self._sequences = array("q")
+        self._begins = array("q")
+        self._ends = array("q")
+        # The text of caption i is _text[_text_offsets[i]:_text_offsets[i + 1]].
+        self._text_offsets = array("q", [0])
+        self._text = ""
+        # Text appended since we last joined it to _text.
+        self._text_parts : List[str] = []
+
+    def append(self, sequence : int, begin : int, end : int, text : str) -> None :
+        self._sequences.append(sequence)
+        self._begins.append(begin)
+        self._ends.append(end)
+        self._text_parts.append(text)
+        self._text_offsets.append(self._text_offsets[-1] + len(text))
+
+    def __len__(self) -> int :
+        return len(self._sequences)
+
+    def __getitem__(self, index : int) -> Caption :
+        # Raises IndexError, and supports negative indexes, as a list does.
+        index = range(len(self._sequences))[index]
+        if self._text_parts :
+            self._text += "".join(self._text_parts)
+            self._text_parts = []
+        return Caption(self.language, self._sequences[index], self._begins[index], self._ends[index], self._text[self._text_offsets[index]:self._text_offsets[index + 1]])
+
+    def __iter__(self) -> Iterator[Caption] :
+        for index in range(len(self._sequences)) :
+            yield self[index]
+
+    # Set the end time of each caption to the earliest of:
+    # - Its end time plus remain_time.
+    # - The begin time of the next caption.
+    # The last caption has no next caption, so its end time is only extended.
+    def extend_ends(self, remain_time : int) -> None :
+        if not self._ends :
+            return
+        if numpy is not None :
+            # A view of the array, so we change the end times in place.
+            ends = numpy.frombuffer(self._ends, dtype = numpy.int64)
+            ends += remain_time
+            numpy.minimum(ends[:-1], numpy.frombuffer(self._begins, dtype = numpy.int64)[1:], out = ends[:-1])
+        else :
+            last_end = self._ends[-1] + remain_time
+            self._ends = array("q", [min(end + remain_time, next_begin) for (end, next_begin) in zip(self._ends, islice(self._begins, 1, None))])
+            self._ends.append(last_end)
+
+# A copy of the parts of a RecognitionResult that captioning uses.
+# Unlike a RecognitionResult, we can create one ourselves, for example to move a result to a different offset.
+# For a TranslationRecognitionResult, translations maps each target language to the translated text.
+class RecognitionRecord(object) :
+    def __init__(self, text : str, offset : int, duration : int, reason : Any, translations : Optional[Dict[str, str]] = None) :
+        self.text = text
+        self.offset = offset
+        self.duration = duration
+        self.reason = reason
+        self.translations = translations if translations is not None else {}
+
+    @staticmethod
+    def from_result(result : RecognitionResult, offset_ticks : int = 0) -> "RecognitionRecord" :
+        return RecognitionRecord(result.text, result.offset + offset_ticks, result.duration, result.reason, translations_from_result(result))
+
+    # Return a record whose text is the translation of this result into target_language.
+    # If the result has no such translation, the text is empty.
+    @staticmethod
+    def from_translation(result : RecognitionResult, target_language : str) -> "RecognitionRecord" :
+        return RecognitionRecord(translations_from_result(result).get(target_language, ""), result.offset, result.duration, result.reason)
+
+def translations_from_result(result : RecognitionResult) -> Dict[str, str] :
+    # SpeechRecognitionResult has no translations property.
+    translations = getattr(result, "translations", None)
+    return dict(translations) if translations else {}
+
 def get_captions(language : Optional[str], max_width : int, max_height : int, results : List[dict]) -> List[Caption] :
     caption_helper = CaptionHelper(language, max_width, max_height, results)
     return caption_helper.get_captions()
 
 class CaptionHelper(object) :
-    def __init__(self, language : Optional[str], max_width : int, max_height : int, results : List[speechsdk.RecognitionResult]) :
+    # Pass break_index_cache to share break analysis with the CaptionHelpers of other layouts in the same language.
+    def __init__(self, language : Optional[str], max_width : int, max_height : int, results : List[RecognitionResult], break_index_cache : Optional[line_breaker.BreakIndexCache] = None) :
         self._language = language
         self._max_width = max_width
         self._max_height = max_height
         self._results = results
 
-        self._first_pass_terminators = ["?", "!", ",", ";"]
-        self._second_pass_terminators = [" ", "."]
-
         self._captions : List[Caption] = []
+        # Set while store_captions_for_result lays out a result, to hold its captions instead of _captions.
+        self._caption_store : Optional[CaptionStore] = None
+        self._caption_count = 0
 
-        # consider adapting to use http://unicode.org/reports/tr29/#Sentence_Boundaries
-        if self._language is not None :
-            iso639 = self._language.split('-')[0]
-            if "zh" == iso639.lower() :
-                self._first_pass_terminators = ["，", "、", "；", "？", "！", "?", "!", ",", ";"]
-                self._second_pass_terminators = ["。", " "]
-                if (helper.DEFAULT_MAX_LINE_LENGTH_SBCS == self._max_width) :
-                    self._max_width = helper.DEFAULT_MAX_LINE_LENGTH_MBCS
+        self._break_index_cache = break_index_cache if break_index_cache is not None else line_breaker.BreakIndexCache(line_breaker.rules_from_language(self._language))
+        self._line_break_rules = self._break_index_cache.rules
+        if self._line_break_rules.use_mbcs_width and helper.DEFAULT_MAX_LINE_LENGTH_SBCS == self._max_width :
+            self._max_width = helper.DEFAULT_MAX_LINE_LENGTH_MBCS
 
     def get_captions(self) -> List[Caption] :
         self.ensure_captions()
         return self._captions
 
+    # Lay out a single result and add its captions to caption_store rather than keeping them.
+    # Sequence numbers continue across calls.
+    def store_captions_for_result(self, result : RecognitionResult, caption_store : CaptionStore) -> None :
+        if result.offset <= 0 or not self.is_final_result(result) :
+            return
+        text = self.get_text_or_translation(result)
+        if not text :
+            return
+        self._caption_store = caption_store
+        try :
+            self.add_captions_for_final_result(result, text)
+        finally :
+            self._caption_store = None
+
     def ensure_captions(self) -> None :
         if not self._captions :
             self.add_captions_for_all_results()
@@ -58,26 +170,28 @@ class CaptionHelper(object) :
                 continue
             self.add_captions_for_final_result(result, text)
 
-    def get_text_or_translation(self, result : speechsdk.RecognitionResult) -> Optional[str] :
-        return result.text
+    def take_captions_for_result(self, result : RecognitionResult) -> List[Caption] :
+        # Lay out a single result and hand its captions to the caller rather than keeping them,
+        # so a caller that streams captions as results arrive does not accumulate them here.
+        # Sequence numbers continue across calls.
+        caption_store = CaptionStore(self._language)
+        self.store_captions_for_result(result, caption_store)
+        return list(caption_store)
 
-        # 20220921 We do not use this for now because this sample
-        # does not handle TranslationRecognitionResults.
-        #if not self._language :
-        #    return result.text
-        #if type(result) is speechsdk.TranslationRecognitionResult and self._language in result.Translations :
-        #    return result.Translations[self._language]
-        #else :
-        #    return None
+    def get_text_or_translation(self, result : RecognitionResult) -> Optional[str] :
+        # Each caption track gets results whose text is already in the track language.
+        # See RecognitionRecord.from_translation.
+        return result.text
 
-    def add_captions_for_final_result(self, result : speechsdk.RecognitionResult, text : str) -> None :
+    def add_captions_for_final_result(self, result : RecognitionResult, text : str) -> None :
         caption_starts_at = 0
         caption_lines : List[str] = []
+        (break_index, _) = self._break_index_cache.break_index(text)
         index = 0
         while (index < len(text)) :
             index = self.skip_skippable(text, index)
 
-            line_length = self.get_best_width(text, index)
+            line_length = break_index.best_width(index, self._max_width)
             caption_lines.append(text[index:index + line_length].strip())
             index += line_length
 
@@ -90,67 +204,119 @@ class CaptionHelper(object) :
                 caption_text = '\n'.join(caption_lines)
                 caption_lines.clear()
 
-                caption_sequence = len(self._captions) + 1
+                self._caption_count += 1
+                caption_sequence = self._caption_count
                 is_first_caption = 0 == caption_starts_at
 
-                caption_begin_and_end : Tuple[time, time]
+                caption_begin_and_end : Tuple[int, int]
                 if is_first_caption and is_last_caption :
                     caption_begin_and_end = self.get_full_caption_result_timing(result)
                 else :
                     caption_begin_and_end = self.get_partial_result_caption_timing(result, text, caption_text, caption_starts_at, index - caption_starts_at)
 
-                self._captions.append(Caption(self._language, caption_sequence, caption_begin_and_end[0], caption_begin_and_end[1], caption_text))
+                if self._caption_store is not None :
+                    self._caption_store.append(caption_sequence, caption_begin_and_end[0], caption_begin_and_end[1], caption_text)
+                else :
+                    self._captions.append(Caption(self._language, caption_sequence, caption_begin_and_end[0], caption_begin_and_end[1], caption_text))
                 
                 caption_starts_at = index
 
-    def get_best_width(self, text : str, start_index : int) -> int :
-        remaining = len(text) - start_index
-        best_width = remaining if remaining < self._max_width else self.find_best_width(self._first_pass_terminators, text, start_index)
-        if (best_width < 0) :
-            best_width = self.find_best_width(self._second_pass_terminators, text, start_index)
-        if best_width < 0 :
-            best_width = self._max_width
-        return best_width
-
-    def find_best_width(self, terminators : List[str], text : str, start_at : int) -> int :
-        remaining = len(text) - start_at
-        check_chars = min(remaining, self._max_width)
-        best_width = -1
-        for terminator in terminators :
-            index = text.rfind(terminator, start_at, start_at + check_chars)
-            width = index - start_at
-            if width > best_width :
-                best_width = width + len(terminator)
-        return best_width
-
     def skip_skippable(self, text : str, start_index : int) -> int :
         index = start_index
         while len(text) > index and ' ' == text[index] :
             index += 1
         return index
 
-    def get_full_caption_result_timing(self, result : speechsdk.RecognitionResult) -> Tuple[time, time] :
-        begin = helper.time_from_ticks(result.offset)
-        end = helper.time_from_ticks(result.offset + result.duration)
-        return (begin, end)
+    def get_full_caption_result_timing(self, result : RecognitionResult) -> Tuple[int, int] :
+        return (result.offset, result.offset + result.duration)
 
-    def get_partial_result_caption_timing(self, result : speechsdk.RecognitionResult, text : str, caption_text : str, caption_starts_at : int, caption_length : int) -> Tuple[time, time] :
-        (result_begin, result_end) = self.get_full_caption_result_timing(result)
-        result_duration = helper.subtract_times(result_end, result_begin)
+    def get_partial_result_caption_timing(self, result : RecognitionResult, text : str, caption_text : str, caption_starts_at : int, caption_length : int) -> Tuple[int, int] :
+        result_begin = result.offset
+        result_duration = result.duration
         text_length = len(text)
-        partial_begin = helper.add_time_and_timedelta(result_begin, result_duration * caption_starts_at / text_length)
-        partial_end = helper.add_time_and_timedelta(result_begin, result_duration * (caption_starts_at + caption_length) / text_length)
+        partial_begin = result_begin + result_duration * caption_starts_at // text_length
+        partial_end = result_begin + result_duration * (caption_starts_at + caption_length) // text_length
         return (partial_begin, partial_end)
 
-    def is_final_result(self, result : speechsdk.RecognitionResult) -> bool :
-        return speechsdk.ResultReason.RecognizedSpeech == result.reason or speechsdk.ResultReason.RecognizedIntent == result.reason or speechsdk.ResultReason.TranslatedSpeech == result.reason
+    def is_final_result(self, result : RecognitionResult) -> bool :
+        return reason_name(result.reason) in FINAL_RESULT_REASONS
 
     def lines_from_text(self, text : str) -> List[str] :
-        retval : List[str] = []
-        index = 0
+        return [text[start:end].strip() for (start, end) in self.line_spans_from_text(text)]
+
+    # Return the (start, end) index of each line in text, laying out only the lines from start_index on.
+    # start_index must be the start of a line in the layout of the full text.
+    def line_spans_from_text(self, text : str, start_index : int = 0) -> List[Tuple[int, int]] :
+        retval : List[Tuple[int, int]] = []
+        # Keep one character before start_index, because whether a character ends a clause can depend on the character before it.
+        base = max(start_index - 1, 0)
+        (break_index, base) = self._break_index_cache.break_index(text, base)
+        index = start_index
         while (index < len(text)) :
             index = self.skip_skippable(text, index)
-            line_length = self.get_best_width(text, index)
-            retval.append(text[index:index + line_length].strip())
+            line_length = break_index.best_width(index - base, self._max_width)
+            retval.append((index, index + line_length))
             index += line_length
         return retval
+
+    def get_max_width(self) -> int :
+        return self._max_width
+
+# Line layout state for real-time captions.
+# We keep only the last max_height recognized lines, because a caption never shows more than that.
+# Each Recognizing result usually extends the text of the previous one, so we keep the line layout
+# of the current result and lay out again only from the first line that the changed text can affect.
+class RealTimeCaptionLayout(object) :
+    def __init__(self, language : Optional[str], max_width : int, max_height : int, break_index_cache : Optional[line_breaker.BreakIndexCache] = None) :
+        self._caption_helper = CaptionHelper(language, max_width, max_height, [], break_index_cache)
+        self._max_width = self._caption_helper.get_max_width()
+        self._max_height = max_height
+        self._recognized_lines : Deque[str] = deque(maxlen=max_height)
+        self._partial_text = ""
+        self._partial_spans : List[Tuple[int, int]] = []
+
+    def clear_recognized_lines(self) -> None :
+        self._recognized_lines.clear()
+
+    def caption_text_from_result(self, text : str, is_recognized_result : bool) -> str :
+        spans = self.update_partial_layout(text)
+        lines = [text[start:end].strip() for (start, end) in spans[-self._max_height:]]
+
+        # Recognizing results can change with each new result, so we do not save previous Recognizing results.
+        # Recognized results are final, so we save them.
+        caption_lines : List[str] = []
+        if is_recognized_result :
+            self._recognized_lines.extend(lines)
+            caption_lines = list(self._recognized_lines)
+            self._partial_text = ""
+            self._partial_spans = []
+        else :
+            caption_lines = list(self._recognized_lines) + lines
+        return '\n'.join(caption_lines[-self._max_height:])
+
+    def update_partial_layout(self, text : str) -> List[Tuple[int, int]] :
+        common_length = common_prefix_length(self._partial_text, text)
+        # A line depends only on the text up to one character past its maximum width.
+        # Lines that end before the first changed character keep their layout.
+        reusable = bisect_right(self._partial_spans, common_length - self._max_width - 1, key=lambda span : span[0])
+        resume_at = 0
+        if reusable > 0 :
+            resume_at = self._partial_spans[reusable][0] if reusable < len(self._partial_spans) else self._partial_spans[-1][1]
+        del self._partial_spans[reusable:]
+        self._partial_spans.extend(self._caption_helper.line_spans_from_text(text, resume_at))
+        self._partial_text = text
+        return self._partial_spans
+
+def common_prefix_length(text_1 : str, text_2 : str) -> int :
+    if text_2.startswith(text_1) :
+        return len(text_1)
+    # Binary search, comparing slices so the comparisons run in native code.
+    low = 0
+    high = min(len(text_1), len(text_2))
+    while low < high :
+        middle = (low + high + 1) // 2
+        if text_1[:middle] == text_2[:middle] :
+            low = middle
+        else :
+            high = middle - 1
+    return low
@@ -0,0 +1,170 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# A caption index is a small binary file written next to a caption file. It lets a reader find the caption
+# shown at a point in time, or the captions in a time range, with a binary search, without reading the
+# caption file. The index file is:
+# - HEADER: magic bytes, format version, and the number of records.
+# - One RECORD per caption, sorted by begin time: begin and end in ticks, the largest end of this and all
+#   earlier records (so we can find captions that overlap a time even if they start much earlier),
+#   and the byte offset and byte length of the caption in the caption file.
+# The index can be read while it is being written, for example by a player backend that serves a live caption
+# file. The number of records in the header is updated each time the writer is flushed, after the records
+# themselves, so a reader never sees a record that is not complete. Call CaptionIndex.reload to see newer records.
+
+from bisect import bisect_left
+from mmap import mmap, ACCESS_READ
+from os import SEEK_END, replace
+from struct import Struct
+from typing import List, Optional
+
+INDEX_FILE_EXTENSION = ".idx"
+MAGIC = b"CAPIDX"
+VERSION = 1
+HEADER = Struct("<6sHQ")
+RECORD = Struct("<qqqQI")
+
+class CaptionIndexEntry(object) :
+    def __init__(self, begin : int, end : int, offset : int, length : int) :
+        self.begin = begin
+        self.end = end
+        self.offset = offset
+        self.length = length
+
+# Writes records as captions are written, so memory use does not grow with the caption file.
+# If captions arrive out of order, the records are sorted when the writer is closed. Until then, readers
+# see only the records up to the last flush before they arrived out of order.
+class CaptionIndexWriter(object) :
+    def __init__(self, index_file : str) :
+        self._index_file = index_file
+        self._file = open(index_file, mode = "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0))
+        # A reader can open the index as soon as it exists.
+        self._file.flush()
+        self._count = 0
+        self._max_end : Optional[int] = None
+        self._previous_begin : Optional[int] = None
+        self._sorted = True
+
+    def add(self, begin : int, end : int, offset : int, length : int) -> None :
+        if self._previous_begin is not None and begin < self._previous_begin :
+            self._sorted = False
+        self._previous_begin = begin
+        self._max_end = end if self._max_end is None or end > self._max_end else self._max_end
+        self._file.write(RECORD.pack(begin, end, self._max_end, offset, length))
+        self._count += 1
+
+    # Make the records added so far visible to readers. Flush the caption file first, so the records
+    # do not point past the end of it.
+    def flush(self) -> None :
+        if self._file is None or not self._sorted :
+            return
+        self._file.flush()
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, self._count))
+        self._file.seek(0, SEEK_END)
+        self._file.flush()
+
+    def close(self) -> None :
+        if self._file is None :
+            return
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, self._count))
+        self._file.close()
+        self._file = None
+        if not self._sorted :
+            self._sort()
+
+    def _sort(self) -> None :
+        with open(self._index_file, mode = "rb") as f :
+            f.seek(HEADER.size)
+            entries = [CaptionIndexEntry(begin, end, offset, length) for (begin, end, _, offset, length) in RECORD.iter_unpack(f.read(self._count * RECORD.size))]
+        entries.sort(key = lambda entry : entry.begin)
+        # Write the sorted index to a new file and swap it in, so a reader never sees a partial index.
+        temp_file = self._index_file + ".tmp"
+        with open(temp_file, mode = "wb") as f :
+            f.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+            max_end : Optional[int] = None
+            for entry in entries :
+                max_end = entry.end if max_end is None or entry.end > max_end else max_end
+                f.write(RECORD.pack(entry.begin, entry.end, max_end, entry.offset, entry.length))
+        replace(temp_file, self._index_file)
+
+# Lets bisect search the begin times in the memory-mapped index without unpacking every record.
+class _BeginTicks(object) :
+    def __init__(self, index : "CaptionIndex") :
+        self._index = index
+
+    def __len__(self) -> int :
+        return len(self._index)
+
+    def __getitem__(self, position : int) -> int :
+        return self._index.record(position)[0]
+
+class CaptionIndex(object) :
+    def __init__(self, index_file : str, caption_file : Optional[str] = None) :
+        self._index_file = index_file
+        self._file = open(index_file, mode = "rb")
+        self._map = mmap(self._file.fileno(), 0, access = ACCESS_READ)
+        self._count = self._count_from_header()
+        self._begins = _BeginTicks(self)
+        self._caption_file = caption_file
+
+    # Map the index again, to see the records written since it was opened or last reloaded.
+    def reload(self) -> None :
+        self._map.close()
+        self._map = mmap(self._file.fileno(), 0, access = ACCESS_READ)
+        self._count = self._count_from_header()
+
+    def _count_from_header(self) -> int :
+        (magic, version, count) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION :
+            raise RuntimeError("{} is not a caption index.".format(self._index_file))
+        return min(count, (len(self._map) - HEADER.size) // RECORD.size)
+
+    def __len__(self) -> int :
+        return self._count
+
+    def record(self, position : int) -> tuple :
+        return RECORD.unpack_from(self._map, HEADER.size + position * RECORD.size)
+
+    def entry(self, position : int) -> CaptionIndexEntry :
+        (begin, end, _, offset, length) = self.record(position)
+        return CaptionIndexEntry(begin, end, offset, length)
+
+    # Return the captions shown at ticks, that is, with begin <= ticks < end.
+    def entries_at(self, ticks : int) -> List[CaptionIndexEntry] :
+        return self.entries_between(ticks, ticks + 1)
+
+    # Return the captions shown at any time from begin up to, but not including, end, sorted by begin time.
+    def entries_between(self, begin : int, end : int) -> List[CaptionIndexEntry] :
+        retval : List[CaptionIndexEntry] = []
+        position = bisect_left(self._begins, end) - 1
+        # Walk back while some earlier caption could still be showing at begin.
+        while position >= 0 :
+            (entry_begin, entry_end, max_end, offset, length) = self.record(position)
+            if max_end <= begin :
+                break
+            if entry_end > begin :
+                retval.append(CaptionIndexEntry(entry_begin, entry_end, offset, length))
+            position -= 1
+        retval.reverse()
+        return retval
+
+    # Return the position of the first caption that begins at or after ticks.
+    def position_from_ticks(self, ticks : int) -> int :
+        return bisect_left(self._begins, ticks)
+
+    # Read the text of one caption from the caption file.
+    def caption_text(self, entry : CaptionIndexEntry) -> str :
+        if self._caption_file is None :
+            raise RuntimeError("No caption file was given for this caption index.")
+        with open(self._caption_file, mode = "rb") as f :
+            f.seek(entry.offset)
+            return f.read(entry.length).decode("utf-8")
+
+    def close(self) -> None :
+        self._map.close()
+        self._file.close()
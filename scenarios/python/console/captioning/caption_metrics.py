@@ -0,0 +1,214 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Measures how far real-time captions run behind the audio, and how much they change, so --threshold
+# and --delay can be tuned from data. Captions are measured when they are written, so results that never
+# become captions, because they were dropped or coalesced, are not measured. For each caption we record:
+# - Latency: the wall-clock time from the caption's begin time, which includes the delay, to when it is written.
+#   It is negative when the delay is long enough to hide the time recognition takes.
+#   The audio clock starts when recognition starts, so latency is only meaningful for live audio,
+#   such as the microphone or --stdin. Audio read from a file arrives faster than real time.
+#   In real-time mode a caption is written when the next result arrives. The last caption is written when
+#   the session ends, so it is not measured.
+# - Rewrites: how many partial captions for an utterance were written, and then replaced by the next caption,
+#   before its final caption. Captions are counted by sequence number.
+# We also count the results received, and the results that ended before the previous result, which
+# real-time mode drops.
+# The metrics are written to a file every interval_seconds, as JSON or in the Prometheus text format. See:
+# https://prometheus.io/docs/instrumenting/exposition_formats/
+
+from bisect import bisect_left
+from collections import deque
+from json import dumps
+from threading import Lock
+from time import monotonic
+from typing import Deque, Dict, List, Optional
+import caption_helper
+import helper
+
+DEFAULT_INTERVAL_SECONDS = 10
+# Percentiles are computed over the most recent samples, so they follow changes during a long session.
+RECENT_SAMPLES = 1000
+PERCENTILES = [50, 90, 99]
+LATENCY_BUCKETS_SECONDS = [-1.0, -0.5, 0.0, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0]
+REWRITE_BUCKETS = [0, 1, 2, 3, 5, 8, 13, 21, 34]
+
+class MetricsFormat(object) :
+    JSON = "json"
+    PROMETHEUS = "prometheus"
+
+class Histogram(object) :
+    def __init__(self, buckets : List[float]) :
+        self.buckets = buckets
+        # The last count is for values above the last bucket.
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._recent : Deque[float] = deque(maxlen = RECENT_SAMPLES)
+
+    def observe(self, value : float) -> None :
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self._recent.append(value)
+
+    # Return the cumulative count of values less than or equal to each bucket, as Prometheus expects.
+    def cumulative_counts(self) -> List[int] :
+        retval : List[int] = []
+        total = 0
+        for count in self.bucket_counts :
+            total += count
+            retval.append(total)
+        return retval
+
+    def percentile(self, percentile : float) -> Optional[float] :
+        if not self._recent :
+            return None
+        return helper.percentile_from_sorted(sorted(self._recent), percentile)
+
+    def to_dict(self) -> Dict :
+        retval = { "count" : self.count, "sum" : round(self.sum, 6) }
+        for percentile in PERCENTILES :
+            value = self.percentile(percentile)
+            retval["p{}".format(percentile)] = round(value, 6) if value is not None else None
+        retval["max"] = round(max(self._recent), 6) if self._recent else None
+        retval["buckets"] = dict(zip([str(bucket) for bucket in self.buckets] + ["+Inf"], self.cumulative_counts()))
+        return retval
+
+class CaptionMetrics(object) :
+    # delay and stable_partial_result_threshold are only reported with the metrics, to show what they were measured with.
+    def __init__(self, metrics_file : str, metrics_format : str, interval_seconds : float, language : str, delay : int, stable_partial_result_threshold : Optional[str]) :
+        self._metrics_file = metrics_file
+        self._metrics_format = metrics_format
+        self._interval_seconds = interval_seconds
+        self._language = language
+        self._delay_seconds = delay / helper.TICKS_PER_SECOND
+        self._stable_partial_result_threshold = stable_partial_result_threshold
+        # Results arrive on SDK threads, and poll() is called from the main thread.
+        self._lock = Lock()
+        self._start : Optional[float] = None
+        self._last_dump = monotonic()
+        self._latency = { "partial" : Histogram(LATENCY_BUCKETS_SECONDS), "final" : Histogram(LATENCY_BUCKETS_SECONDS) }
+        self._rewrites = Histogram(REWRITE_BUCKETS)
+        # The sequence number of the first caption of the current utterance.
+        self._utterance_sequence : Optional[int] = None
+        self._results = { "partial" : 0, "final" : 0 }
+        self._dropped_results = 0
+        self._coalesced_results = 0
+
+    # Call when --adaptiveDelay changes the delay.
+    def set_delay(self, delay : int) -> None :
+        with self._lock :
+            self._delay_seconds = delay / helper.TICKS_PER_SECOND
+
+    # Set how many partial results were replaced by newer results before they were captioned. See partial_coalescer.py.
+    def set_coalesced_results(self, coalesced_results : int) -> None :
+        with self._lock :
+            self._coalesced_results = coalesced_results
+
+    # Call when the audio starts.
+    def start(self) -> None :
+        with self._lock :
+            self._start = monotonic()
+
+    def add_result(self, is_final_result : bool, dropped : bool) -> None :
+        with self._lock :
+            self._results["final" if is_final_result else "partial"] += 1
+            if dropped :
+                self._dropped_results += 1
+
+    # Call when caption is written. is_final is True if it is the caption of a Recognized result.
+    def add_caption(self, caption : caption_helper.Caption, is_final : bool) -> None :
+        now = monotonic()
+        with self._lock :
+            if self._start is not None :
+                self._latency["final" if is_final else "partial"].observe(now - self._start - caption.begin / helper.TICKS_PER_SECOND)
+            if self._utterance_sequence is None :
+                self._utterance_sequence = caption.sequence
+            if is_final :
+                self._rewrites.observe(caption.sequence - self._utterance_sequence)
+                self._utterance_sequence = None
+
+    # Write the metrics if interval_seconds have passed since they were last written.
+    def poll(self) -> None :
+        if monotonic() - self._last_dump >= self._interval_seconds :
+            self.dump()
+
+    def dump(self) -> None :
+        with self._lock :
+            text = self.prometheus_text() if MetricsFormat.PROMETHEUS == self._metrics_format else dumps(self.to_dict(), indent = 2) + "\n"
+            self._last_dump = monotonic()
+        helper.write_file_atomically(self._metrics_file, text)
+
+    # Call only while holding _lock.
+    def to_dict(self) -> Dict :
+        return {
+            "language" : self._language,
+            "elapsed_seconds" : round(monotonic() - self._start, 3) if self._start is not None else None,
+            "delay_seconds" : self._delay_seconds,
+            "stable_partial_result_threshold" : self._stable_partial_result_threshold,
+            "results" : dict(self._results),
+            "dropped_results" : self._dropped_results,
+            "coalesced_results" : self._coalesced_results,
+            "latency_seconds" : { kind : histogram.to_dict() for (kind, histogram) in self._latency.items() },
+            "rewrites" : self._rewrites.to_dict(),
+        }
+
+    # Call only while holding _lock.
+    def prometheus_text(self) -> str :
+        language = 'language="{}"'.format(self._language)
+        lines = [
+            "# HELP caption_latency_seconds Wall-clock time from the begin time of a caption, with the delay, to when it is written.",
+            "# TYPE caption_latency_seconds histogram",
+        ]
+        for (kind, histogram) in self._latency.items() :
+            labels = '{},kind="{}"'.format(language, kind)
+            lines += histogram_lines("caption_latency_seconds", labels, histogram)
+        lines += [
+            "# HELP caption_recent_latency_seconds Latency percentiles over the most recent captions.",
+            "# TYPE caption_recent_latency_seconds gauge",
+        ]
+        for (kind, histogram) in self._latency.items() :
+            for percentile in PERCENTILES :
+                value = histogram.percentile(percentile)
+                if value is not None :
+                    lines.append('caption_recent_latency_seconds{{{},kind="{}",quantile="{}"}} {}'.format(language, kind, percentile / 100, round(value, 6)))
+        lines += [
+            "# HELP caption_rewrites Partial captions written for an utterance before its final caption.",
+            "# TYPE caption_rewrites histogram",
+        ]
+        lines += histogram_lines("caption_rewrites", language, self._rewrites)
+        lines += [
+            "# HELP caption_results_total Results received.",
+            "# TYPE caption_results_total counter",
+        ]
+        for (kind, count) in self._results.items() :
+            lines.append('caption_results_total{{{},kind="{}"}} {}'.format(language, kind, count))
+        lines += [
+            "# HELP caption_dropped_results_total Results dropped because they ended before the previous result.",
+            "# TYPE caption_dropped_results_total counter",
+            "caption_dropped_results_total{{{}}} {}".format(language, self._dropped_results),
+            "# HELP caption_coalesced_results_total Partial results replaced by a newer result before they were captioned.",
+            "# TYPE caption_coalesced_results_total counter",
+            "caption_coalesced_results_total{{{}}} {}".format(language, self._coalesced_results),
+        ]
+        return "\n".join(lines) + "\n"
+
+def histogram_lines(name : str, labels : str, histogram : Histogram) -> List[str] :
+    retval : List[str] = []
+    for (bucket, count) in zip([str(bucket) for bucket in histogram.buckets] + ["+Inf"], histogram.cumulative_counts()) :
+        retval.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, bucket, count))
+    retval.append("{}_sum{{{}}} {}".format(name, labels, round(histogram.sum, 6)))
+    retval.append("{}_count{{{}}} {}".format(name, labels, histogram.count))
+    return retval
+
+def caption_metrics_from_user_config(user_config : helper.Read_Only_Dict) -> CaptionMetrics :
+    return CaptionMetrics(
+        metrics_file = user_config["metrics_file"],
+        metrics_format = user_config["metrics_format"],
+        interval_seconds = user_config["metrics_interval_seconds"],
+        language = user_config["language"],
+        delay = user_config["delay"],
+        stable_partial_result_threshold = user_config["stable_partial_result_threshold"])
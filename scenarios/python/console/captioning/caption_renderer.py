@@ -0,0 +1,214 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Turns recognition results into timed, laid-out captions. This module, and the modules it uses, do not
+# import the Speech SDK, so captions can be rendered again from a result cache (see result_cache.py)
+# without it. Results can be SDK results or caption_helper.RecognitionRecords.
+
+from json import dumps
+from os import linesep
+from typing import Any, List, Optional, Sequence
+import caption_helper
+import helper
+import line_breaker
+import user_config_helper
+
+class CaptionRenderer(object) :
+    # Uses these user_config keys: language, captioning_mode, stream_offline_captions, max_line_length, lines,
+    # delay, remain_time, and caption_format.
+    # Pass break_index_cache to share break analysis with the renderers of other layouts in the same language.
+    def __init__(self, user_config : helper.Read_Only_Dict, break_index_cache : Optional[line_breaker.BreakIndexCache] = None) :
+        self._user_config = user_config
+        self._srt_sequence_number = 1
+        self._previous_caption : Optional[caption_helper.Caption] = None
+        self._previous_end_time : Optional[int] = None
+        self._previous_result_is_recognized = False
+        self._real_time_layout = caption_helper.RealTimeCaptionLayout(self._user_config["language"], self._user_config["max_line_length"], self._user_config["lines"], break_index_cache)
+        self._offline_caption_helper = caption_helper.CaptionHelper(self._user_config["language"], self._user_config["max_line_length"], self._user_config["lines"], [], break_index_cache)
+        # In offline mode, we lay out each result as it arrives, and keep the captions until there are no more results.
+        self._offline_captions = caption_helper.CaptionStore(self._user_config["language"])
+        self._previous_offline_caption : Optional[caption_helper.Caption] = None
+        # How many real-time results were dropped because they ended before the previous result.
+        self.dropped_results = 0
+        # The delay of real-time captions, in ticks, and the delay to use from the next utterance on. See set_delay.
+        self._delay = self._user_config["delay"]
+        self._next_delay : Optional[int] = None
+
+    def get_timestamp(self, start : int, end : int) -> str :
+        # SRT format requires ',' as decimal separator rather than '.'.
+        decimal_separator = "," if user_config_helper.CaptionFormat.SRT == self._user_config["caption_format"] else "."
+        return "{} --> {}".format(helper.timestamp_from_ticks(start, decimal_separator), helper.timestamp_from_ticks(end, decimal_separator))
+
+    def string_from_caption(self, caption : caption_helper.Caption) -> str :
+        if user_config_helper.CaptionFormat.JSON == self._user_config["caption_format"] :
+            # Sequence numbers start at 1, so every cue but the first follows another one.
+            separator = "," + linesep if caption.sequence > 1 else ""
+            return separator + dumps({
+                "sequence" : caption.sequence,
+                "start" : caption.begin / helper.TICKS_PER_SECOND,
+                "end" : caption.end / helper.TICKS_PER_SECOND,
+                "text" : caption.text,
+            }, ensure_ascii = False)
+        retval = ""
+        if user_config_helper.CaptionFormat.SRT == self._user_config["caption_format"] :
+            retval += str(caption.sequence) + linesep
+        retval += self.get_timestamp(caption.begin, caption.end) + linesep
+        retval += caption.text + linesep + linesep
+        return retval
+
+    # The text at the start of a caption file, if the format has one.
+    def file_header(self) -> str :
+        if user_config_helper.CaptionFormat.JSON == self._user_config["caption_format"] :
+            return "[" + linesep
+        return "WEBVTT{}{}".format(linesep, linesep) if user_config_helper.CaptionFormat.WEBVTT == self._user_config["caption_format"] else ""
+
+    # The text at the end of a caption file, if the format has one.
+    def file_footer(self) -> str :
+        return linesep + "]" + linesep if user_config_helper.CaptionFormat.JSON == self._user_config["caption_format"] else ""
+
+    # The caption for the most recent real-time result. It is not complete until the next result arrives.
+    def current_caption(self) -> Optional[caption_helper.Caption] :
+        return self._previous_caption
+
+    # True if the current caption is for a Recognized result.
+    def current_caption_is_final(self) -> bool :
+        return self._previous_result_is_recognized
+
+    # Return the captions that this result completes. is_final_result is False for Recognizing results,
+    # which only real-time mode uses.
+    def captions_from_result(self, result : Any, is_final_result : bool) -> List[caption_helper.Caption] :
+        if user_config_helper.CaptioningMode.REALTIME == self._user_config["captioning_mode"] :
+            caption = self.caption_from_real_time_result(result, is_final_result)
+            return [caption] if caption is not None else []
+        elif not is_final_result :
+            return []
+        elif self._user_config["stream_offline_captions"] :
+            return self.captions_from_offline_result(result)
+        else :
+            self._offline_caption_helper.store_captions_for_result(result, self._offline_captions)
+            return []
+
+    # Return the captions that are left when there are no more results.
+    def final_captions(self) -> Sequence[caption_helper.Caption] :
+        retval : Sequence[caption_helper.Caption] = []
+        if user_config_helper.CaptioningMode.OFFLINE == self._user_config["captioning_mode"] :
+            if self._user_config["stream_offline_captions"] :
+                # Show the last held-back caption.
+                if self._previous_offline_caption is not None :
+                    self._previous_offline_caption.end += self._user_config["remain_time"]
+                    retval = [self._previous_offline_caption]
+            else :
+                retval = self.captions_from_offline_results()
+        elif user_config_helper.CaptioningMode.REALTIME == self._user_config["captioning_mode"] :
+            # Show the last "previous" caption, which is actually the last caption.
+            if self._previous_caption is not None :
+                self._previous_caption.end += self._user_config["remain_time"]
+                retval = [self._previous_caption]
+        return retval
+
+    # Use delay, in ticks, for real-time captions from the next utterance on, so the captions of one utterance
+    # keep the same delay. See delay_controller.py.
+    def set_delay(self, delay : int) -> None :
+        self._next_delay = delay
+
+    # Apply the delay from set_delay to the utterance whose first result starts at start_time.
+    def apply_next_delay(self, start_time : int) -> None :
+        delay = self._next_delay
+        self._next_delay = None
+        if self._previous_end_time is not None and delay < self._delay :
+            # Reduce the delay by no more than the silence before this utterance, so no caption begins
+            # before the previous caption would have ended.
+            delay = max(delay, self._delay - (start_time - self._previous_end_time))
+        self._delay = delay
+
+    def adjust_real_time_caption_text(self, text : str, is_recognized_result : bool) -> str :
+        # Split the caption text into multiple lines based on max_line_length and lines.
+        return self._real_time_layout.caption_text_from_result(text, is_recognized_result)
+
+    # Return the previous caption, which is now complete, if there is one.
+    def caption_from_real_time_result(self, result : Any, is_recognized_result : bool) -> Optional[caption_helper.Caption] :
+        retval : Optional[caption_helper.Caption] = None
+
+        start_time = result.offset
+        end_time = result.offset + result.duration
+
+        # If the end timestamp for the previous result is later
+        # than the end timestamp for this result, drop the result.
+        # This sometimes happens when we receive a lot of Recognizing results close together.
+        if self._previous_end_time is not None and self._previous_end_time > end_time :
+            self.dropped_results += 1
+        else :
+            if self._next_delay is not None and (self._previous_caption is None or self._previous_result_is_recognized) :
+                self.apply_next_delay(start_time)
+
+            # Record the end timestamp for this result.
+            self._previous_end_time = end_time
+
+            # Convert the SpeechRecognitionResult to a caption.
+            # We are not ready to set the text for this caption.
+            # First we need to determine whether to clear _recognizedLines.
+            caption = caption_helper.Caption(self._user_config["language"], self._srt_sequence_number, start_time + self._delay, end_time + self._delay, "")
+            # Increment the sequence number.
+            self._srt_sequence_number += 1
+
+            # If we have a previous caption...
+            if self._previous_caption is not None :
+                # If the previous result was type Recognized...
+                if self._previous_result_is_recognized :
+                    # Set the end timestamp for the previous caption to the earliest of:
+                    # - The end timestamp for the previous caption plus the remain time.
+                    # - The start timestamp for the current caption.
+                    previous_end = self._previous_caption.end + self._user_config["remain_time"]
+                    self._previous_caption.end = previous_end if previous_end < caption.begin else caption.begin
+                    # If the gap between the original end timestamp for the previous caption
+                    # and the start timestamp for the current caption is larger than remainTime,
+                    # clear the cached recognized lines.
+                    # Note this needs to be done before we call AdjustRealTimeCaptionText
+                    # for the current caption, because it uses _recognizedLines.
+                    if previous_end < caption.begin :
+                        self._real_time_layout.clear_recognized_lines()
+                # If the previous result was type Recognizing, simply set the start timestamp
+                # for the current caption to the end timestamp for the previous caption.
+                # Note this presumes there will not be a large gap between Recognizing results,
+                # because such a gap would cause the previous Recognizing result to be succeeded
+                # by a Recognized result.
+                else :
+                    caption.begin = self._previous_caption.end
+
+                retval = self._previous_caption
+
+            # Break the caption text into lines if needed.
+            caption.text = self.adjust_real_time_caption_text(result.text, is_recognized_result)
+            # Save the current caption as the previous caption.
+            self._previous_caption = caption
+            # Save the result type as the previous result type.
+            self._previous_result_is_recognized = is_recognized_result
+
+        return retval
+
+    def captions_from_offline_results(self) -> caption_helper.CaptionStore :
+        captions = self._offline_captions
+        self._offline_captions = caption_helper.CaptionStore(self._user_config["language"])
+        # In offline mode, all captions come from RecognitionResults of type Recognized.
+        # Set the end timestamp for each caption to the earliest of:
+        # - The end timestamp for this caption plus the remain time.
+        # - The start timestamp for the next caption.
+        captions.extend_ends(self._user_config["remain_time"])
+        return captions
+
+    def captions_from_offline_result(self, result : Any) -> List[caption_helper.Caption] :
+        # In streaming offline mode, we hold back only the most recent caption,
+        # because we cannot set its end timestamp until we know the start timestamp of the caption after it.
+        # Set the end timestamp for each caption to the earliest of:
+        # - The end timestamp for this caption plus the remain time.
+        # - The start timestamp for the next caption.
+        retval : List[caption_helper.Caption] = []
+        for caption in self._offline_caption_helper.take_captions_for_result(result) :
+            if self._previous_offline_caption is not None :
+                end = self._previous_offline_caption.end + self._user_config["remain_time"]
+                self._previous_offline_caption.end = end if end < caption.begin else caption.begin
+                retval.append(self._previous_offline_caption)
+            self._previous_offline_caption = caption
+        return retval
@@ -0,0 +1,168 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Broadcasts real-time captions to viewers with Server-Sent Events. See:
+# https://html.spec.whatwg.org/multipage/server-sent-events.html
+# A viewer connects to /captions and receives:
+# - event: snapshot, data: {"language", "lines"}. The full caption for a language. Sent when the viewer
+#   connects, and when the viewer falls behind.
+# - event: delta, data: {"language", "start", "lines"}. The caption lines from index start on changed.
+#   The viewer replaces its lines from start on with lines.
+# Each viewer has a bounded queue. The recognizer callback thread only adds to the queues and never waits
+# for a viewer. If a viewer's queue is full, we drop what is queued for it and send it a snapshot instead.
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from typing import Dict, List, Optional
+
+DEFAULT_CLIENT_QUEUE_SIZE = 256
+KEEP_ALIVE_SECONDS = 15
+
+VIEWER_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Captions</title></head>
+<body style="background:#000;color:#fff;font:2em sans-serif">
+<div id="captions"></div>
+<script>
+const captions = {};
+function show() {
+    document.getElementById("captions").innerHTML = Object.keys(captions).map(language =>
+        "<p lang='" + language + "'>" + captions[language].map(line => line.replace(/&/g, "&amp;").replace(/</g, "&lt;")).join("<br>") + "</p>").join("");
+}
+const source = new EventSource("/captions");
+source.addEventListener("snapshot", e => { const data = JSON.parse(e.data); captions[data.language] = data.lines; show(); });
+source.addEventListener("delta", e => { const data = JSON.parse(e.data); captions[data.language] = (captions[data.language] || []).slice(0, data.start).concat(data.lines); show(); });
+</script>
+</body></html>
+"""
+
+def event_from_data(event : str, event_id : int, data : dict) -> bytes :
+    return "event: {}\nid: {}\ndata: {}\n\n".format(event, event_id, dumps(data, ensure_ascii = False)).encode("utf-8")
+
+class CaptionClient(object) :
+    def __init__(self, queue_size : int) :
+        # Each item is an encoded event, or None to tell the client to disconnect.
+        self.queue : Queue = Queue(maxsize = queue_size)
+
+class CaptionServer(object) :
+    def __init__(self, host : str, port : int, queue_size : int = DEFAULT_CLIENT_QUEUE_SIZE) :
+        self._queue_size = queue_size
+        # Guards _clients, _lines and _event_id, so each client gets events in the order they were published.
+        self._lock = Lock()
+        self._clients : List[CaptionClient] = []
+        # The lines of the current caption for each language.
+        self._lines : Dict[str, List[str]] = {}
+        self._event_id = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = Thread(target = self._server.serve_forever, daemon = True)
+        self._thread.start()
+
+    def address(self) -> str :
+        (host, port) = self._server.server_address[:2]
+        return "http://{}:{}/".format(host, port)
+
+    # Called from the recognizer callback thread. Sends the lines of text that changed since the last
+    # caption for this language.
+    def publish(self, language : str, text : str) -> None :
+        lines = text.split("\n") if text else []
+        with self._lock :
+            previous = self._lines.get(language, [])
+            start = 0
+            while start < len(previous) and start < len(lines) and previous[start] == lines[start] :
+                start += 1
+            if start == len(previous) and start == len(lines) :
+                return
+            self._lines[language] = lines
+            self._event_id += 1
+            event = event_from_data("delta", self._event_id, { "language" : language, "start" : start, "lines" : lines[start:] })
+            for client in self._clients :
+                try :
+                    client.queue.put_nowait(event)
+                except Full :
+                    # The client is too far behind for deltas, so send it the current state instead.
+                    self._drain(client)
+                    for snapshot in self._snapshots() :
+                        client.queue.put_nowait(snapshot)
+
+    def close(self) -> None :
+        with self._lock :
+            for client in self._clients :
+                self._drain(client)
+                client.queue.put_nowait(None)
+            self._clients.clear()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _subscribe(self) -> CaptionClient :
+        client = CaptionClient(max(self._queue_size, len(self._lines) + 1))
+        with self._lock :
+            for snapshot in self._snapshots() :
+                client.queue.put_nowait(snapshot)
+            self._clients.append(client)
+        return client
+
+    def _unsubscribe(self, client : CaptionClient) -> None :
+        with self._lock :
+            if client in self._clients :
+                self._clients.remove(client)
+
+    # Call only while holding _lock.
+    def _snapshots(self) -> List[bytes] :
+        return [event_from_data("snapshot", self._event_id, { "language" : language, "lines" : lines }) for (language, lines) in self._lines.items()]
+
+    @staticmethod
+    def _drain(client : CaptionClient) -> None :
+        try :
+            while True :
+                client.queue.get_nowait()
+        except Empty :
+            pass
+
+    def _handler_class(self) -> type :
+        server = self
+
+        class CaptionRequestHandler(BaseHTTPRequestHandler) :
+            def do_GET(self) -> None :
+                if "/" == self.path :
+                    body = VIEWER_PAGE.encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif "/captions" == self.path :
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+                    self.send_header("Cache-Control", "no-cache")
+                    self.end_headers()
+                    self.stream_events(server._subscribe())
+                else :
+                    self.send_error(404)
+
+            # Runs on this client's own thread, so a slow client only holds up itself.
+            def stream_events(self, client : CaptionClient) -> None :
+                try :
+                    while True :
+                        try :
+                            event : Optional[bytes] = client.queue.get(timeout = KEEP_ALIVE_SECONDS)
+                        except Empty :
+                            # A comment line keeps proxies from closing an idle connection.
+                            event = b": keep-alive\n\n"
+                        if event is None :
+                            break
+                        self.wfile.write(event)
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError) :
+                    pass
+                finally :
+                    server._unsubscribe(client)
+
+            def log_message(self, format : str, *args) -> None :
+                # Do not mix request logs with the captions on the console.
+                pass
+
+        return CaptionRequestHandler
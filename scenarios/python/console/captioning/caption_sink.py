@@ -0,0 +1,173 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+from io import DEFAULT_BUFFER_SIZE
+from os import fsync, replace
+from threading import Lock
+from time import monotonic
+from typing import Optional, TextIO
+import caption_helper
+import caption_index
+import helper
+import output_rotation
+
+DEFAULT_FLUSH_BYTES = 64 * 1024
+DEFAULT_FLUSH_INTERVAL_MILLISECONDS = 1000
+
+# Owns the output file for a captioning session. The file is opened once and kept open,
+# rather than being reopened for every caption. Buffered text is flushed when either
+# flush_bytes have been written since the last flush or flush_interval_seconds have passed.
+# If fsync_interval_seconds is set, the file is also synced to disk at most that often.
+# If index_file is set, the sink also writes a caption index (see caption_index.py) for the output file.
+# If rotation is set, the sink starts a new output file, and index file, when rotation says to. See output_rotation.py.
+# If console_label is set, each line the sink shows on the console starts with it. See console_label_from_user_config.
+class CaptionSink(object) :
+    def __init__(self, output_file : Optional[str], suppress_console_output : bool, flush_bytes : int, flush_interval_seconds : float, fsync_interval_seconds : Optional[float], index_file : Optional[str] = None, rotation : Optional[output_rotation.OutputRotation] = None, console_label : Optional[str] = None) :
+        self._output_file = output_file
+        self._console_label = console_label
+        self._index_file = index_file
+        self._rotation = rotation
+        self._suppress_console_output = suppress_console_output
+        self._flush_bytes = flush_bytes
+        self._flush_interval_seconds = flush_interval_seconds
+        self._fsync_interval_seconds = fsync_interval_seconds
+        # Recognizer events arrive on SDK threads, so serialize access to the file.
+        self._lock = Lock()
+        self._file : Optional[TextIO] = None
+        if output_file is not None :
+            # Opening with mode "w" replaces any output from a previous run.
+            self._file = open(output_file, mode = "w", newline = "", encoding = "utf-8", buffering = max(flush_bytes, DEFAULT_BUFFER_SIZE))
+        self._index_writer : Optional[caption_index.CaptionIndexWriter] = None
+        if output_file is not None and index_file is not None :
+            self._index_writer = caption_index.CaptionIndexWriter(index_file)
+        # The bytes written to the current output file.
+        self._bytes_written = 0
+        self._pending_bytes = 0
+        self._last_flush = monotonic()
+        self._last_fsync = self._last_flush
+        # Written at the start of each output file.
+        self._header = ""
+        # When the current output file was opened, how many captions it has, and the span of their times, in ticks.
+        self._opened = self._last_flush
+        self._captions = 0
+        self._start : Optional[int] = None
+        self._end : Optional[int] = None
+
+    # Write the text at the start of the output file. With rotation, each new file starts with it too.
+    def write_header(self, text : str) -> None :
+        self._header = text
+        self.write(text)
+
+    # If text is the serialized form of caption, pass caption too, so the sink can add it to the caption index.
+    def write(self, text : str, caption : Optional[caption_helper.Caption] = None) -> None :
+        if not self._suppress_console_output :
+            print(labeled_text(text, self._console_label), end = "", flush = True)
+        if self._file is None :
+            return
+        with self._lock :
+            if caption is not None :
+                # Rotate only between captions, so each file is complete.
+                self._rotate_if_due(monotonic())
+                self._captions += 1
+                self._start = caption.begin if self._start is None else min(self._start, caption.begin)
+                self._end = caption.end if self._end is None else max(self._end, caption.end)
+            self._file.write(text)
+            size = len(text.encode("utf-8"))
+            if caption is not None and self._index_writer is not None :
+                self._index_writer.add(caption.begin, caption.end, self._bytes_written, size)
+            self._bytes_written += size
+            self._pending_bytes += size
+            self._flush_if_due(monotonic())
+
+    # Called periodically by the owner so buffered text does not go stale when no captions are being written.
+    def poll(self) -> None :
+        if self._file is None :
+            return
+        with self._lock :
+            self._rotate_if_due(monotonic())
+            self._flush_if_due(monotonic())
+
+    def close(self) -> None :
+        if self._file is None :
+            return
+        with self._lock :
+            self._close_file()
+            if self._rotation is not None :
+                self._rotation.close(self._start, self._end, self._captions, self._bytes_written, self._index_file if self._index_writer is not None else None)
+            self._index_writer = None
+
+    # Call only while holding _lock.
+    def _close_file(self) -> None :
+        self._file.flush()
+        if self._fsync_interval_seconds is not None :
+            fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        if self._index_writer is not None :
+            self._index_writer.close()
+
+    # Call only while holding _lock. An empty file is never rotated.
+    def _rotate_if_due(self, now : float) -> None :
+        if self._rotation is None or 0 == self._captions or not self._rotation.is_due(self._bytes_written, self._opened, now) :
+            return
+        self._close_file()
+        file_name = self._rotation.next_file_name()
+        replace(self._output_file, file_name)
+        index_file : Optional[str] = None
+        if self._index_writer is not None :
+            index_file = file_name + caption_index.INDEX_FILE_EXTENSION
+            replace(self._index_file, index_file)
+            self._index_writer = caption_index.CaptionIndexWriter(self._index_file)
+        self._rotation.add_file(file_name, self._start, self._end, self._captions, self._bytes_written, index_file)
+        self._file = open(self._output_file, mode = "w", newline = "", encoding = "utf-8", buffering = max(self._flush_bytes, DEFAULT_BUFFER_SIZE))
+        self._file.write(self._header)
+        self._bytes_written = len(self._header.encode("utf-8"))
+        self._pending_bytes = self._bytes_written
+        self._opened = now
+        self._captions = 0
+        self._start = None
+        self._end = None
+
+    def _flush_if_due(self, now : float) -> None :
+        if self._pending_bytes > 0 and (self._pending_bytes >= self._flush_bytes or now - self._last_flush >= self._flush_interval_seconds) :
+            self._file.flush()
+            # After the caption file, so readers of the index find every caption it lists.
+            if self._index_writer is not None :
+                self._index_writer.flush()
+            self._pending_bytes = 0
+            self._last_flush = now
+        if self._fsync_interval_seconds is not None and now - self._last_fsync >= self._fsync_interval_seconds :
+            self._file.flush()
+            fsync(self._file.fileno())
+            if self._index_writer is not None :
+                self._index_writer.flush()
+            self._last_fsync = now
+
+# Prefix each line of text that is not blank with label.
+def labeled_text(text : str, label : Optional[str]) -> str :
+    if label is None :
+        return text
+    return "".join(line if "" == line.strip() else label + line for line in text.splitlines(keepends = True))
+
+# With --translate, every language track shows its captions on the console, so label them with their language.
+def console_label_from_user_config(user_config : helper.Read_Only_Dict) -> Optional[str] :
+    if len(user_config["target_languages"]) > 0 :
+        return "[{}] ".format(user_config["language"])
+    return None
+
+def caption_sink_from_user_config(user_config : helper.Read_Only_Dict) -> CaptionSink :
+    if (user_config["rotate_bytes"] is not None or user_config["rotate_interval_seconds"] is not None) and "json" == user_config["caption_format"] :
+        # A JSON file is one array, so it cannot be split between captions without rewriting it.
+        raise RuntimeError("--rotateBytes and --rotateInterval are not valid with the json format.")
+    fsync_interval = user_config["fsync_interval"]
+    return CaptionSink(
+        output_file = user_config["output_file"],
+        suppress_console_output = user_config["suppress_console_output"],
+        flush_bytes = user_config["flush_bytes"],
+        flush_interval_seconds = user_config["flush_interval"].total_seconds(),
+        fsync_interval_seconds = fsync_interval.total_seconds() if fsync_interval is not None else None,
+        index_file = user_config["output_file"] + caption_index.INDEX_FILE_EXTENSION if user_config["write_caption_index"] and user_config["output_file"] is not None else None,
+        rotation = output_rotation.output_rotation_from_user_config(user_config),
+        console_label = console_label_from_user_config(user_config))
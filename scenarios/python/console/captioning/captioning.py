@@ -11,18 +11,32 @@
 # - Install gstreamer:
 # https://docs.microsoft.com/azure/cognitive-services/speech-service/how-to-use-codec-compressed-audio-input-streams
 
-from datetime import datetime, time, timezone
-from itertools import groupby, pairwise
-from os import linesep, remove
-from os.path import exists
-from pathlib import Path
-from sys import argv
-from time import sleep
-from typing import Any, List, Optional
-import wave
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from os import linesep
+from os.path import join
+from sys import argv, exit, stdin
+from threading import Event
+from typing import Any, List, Optional, Sequence
 import azure.cognitiveservices.speech as speechsdk # type: ignore
+import audio_helper
 import caption_helper
+import caption_metrics
+import caption_renderer
+import caption_server
+import batch_helper
+import caption_sink
+import channel_helper
+import checkpoint
+import delay_controller
+import event_recording
 import helper
+import hls_sink
+import line_breaker
+import partial_coalescer
+import push_stream_helper
+import result_cache
+import segment_helper
 import user_config_helper
 
 USAGE = """Usage: python captioning.py [...]
@@ -42,8 +56,29 @@ USAGE = """Usage: python captioning.py [...]
                                      Default value is en-US.
                                      Examples: en-US, ja-JP
 
+  TRANSLATION
+    --translate ""LANG1;LANG2""      Also translate the speech into each target language, in the same recognition session,
+                                     and write captions for each language to its own file. The captions for LANG1 are written
+                                     to FILE with .LANG1 added before the extension, for example captions.fr.vtt.
+                                     Use the target language codes the Speech service supports for translation.
+                                     On the console, each line starts with its language, for example [fr].
+                                     Example: ""fr;de;zh-Hans""
+
   INPUT
     --input FILE                     Input audio from file (default input is the microphone.)
+    --stdin                          Input raw 16-bit mono PCM audio from stdin, as it arrives.
+                                     Example: ffmpeg -i video.mp4 -ac 1 -ar 16000 -f s16le - | python captioning.py --stdin
+    --ffmpeg SOURCE                  Run ffmpeg to decode the audio from SOURCE, which can be any file or URL ffmpeg reads,
+                                     and input the audio as ffmpeg decodes it. Requires ffmpeg on the PATH.
+    --sampleRate RATE                The sample rate of the audio from --stdin, or the rate ffmpeg converts to with --ffmpeg.
+                                     Default is 16000.
+    --batch PATH                     Caption every audio file in directory PATH, or every audio file listed in manifest file PATH,
+                                     one path per line. Relative paths in a manifest are relative to the manifest.
+                                     Overrides --input and --output. Console output is limited to a summary line per file.
+    --concurrency COUNT              How many files to caption at the same time with --batch.
+                                     Minimum is 1. Default is 4.
+    --outputDir DIR                  Write each caption file from --batch to DIR (default is next to each input file.)
+                                     Each caption file has the name of its input file, with extension .vtt or .srt.
     --format FORMAT                  Use compressed audio format.
                                      If this is not present, uncompressed format (wav) is assumed.
                                      Valid only with --file.
@@ -54,6 +89,27 @@ USAGE = """Usage: python captioning.py [...]
                                      Overrides --realTime.
     --realTime                       Output real-time results.
                                      Default output mode is offline.
+    --parallel COUNT                 Split the --input WAV file at silences and recognize COUNT segments at the same time,
+                                     each in its own session. The results are merged in order before captions are made.
+                                     Valid only in offline mode, with an uncompressed --input file.
+    --segmentLength SECONDS          With --parallel, cut segments of about SECONDS each, rather than one segment per session.
+    --serve PORT                     Also broadcast real-time captions to viewers at http://localhost:PORT/ with Server-Sent Events.
+                                     Viewers get only the caption lines that changed. See caption_server.py.
+                                     Valid only in real-time mode.
+    --serveHost HOST                 With --serve, listen on HOST rather than localhost.
+    --channels FILE                  Run every live caption channel defined in JSON file FILE in this process, until all of them stop.
+                                     Each channel starts from the other options and overrides some of them. See channel_helper.py.
+                                     Console output is limited to channel health.
+                                     Not valid with --batch, --stdin, --serve or --parallel.
+    --dispatchThreads COUNT          With --channels, how many threads make captions for all channels.
+                                     Minimum is 1. Default is 4.
+    --health FILE                    With --channels, also write the health of each channel, and the memory of the process,
+                                     to FILE as JSON.
+    --healthInterval SECONDS         With --channels, how often to report health.
+                                     Default is 30.
+    --stream                         Write each offline caption as soon as the caption after it is recognized,
+                                     rather than writing all captions when recognition finishes.
+                                     Valid only in offline mode.
 
   ACCURACY
     --phrases ""PHRASE1;PHRASE2""    Example: ""Constoso;Jessie;Rehaan""
@@ -61,14 +117,90 @@ USAGE = """Usage: python captioning.py [...]
   OUTPUT
     --output FILE                    Output captions to FILE.
     --srt                            Output captions in SubRip Text format (default format is WebVTT.)
+    --formats ""FORMAT1;FORMAT2""    Output captions in each FORMAT, in the same session. The captions in FORMAT1 are written to FILE,
+                                     and the captions in each other FORMAT to FILE with the extension replaced by FORMAT,
+                                     for example captions.srt. Overrides --srt. Requires --output. Not valid with --hls.
+                                     Valid values: vtt, srt, json (a JSON array of cues, with times in seconds.)
+                                     Example: ""vtt;srt;json""
+    --layouts ""NAME=LENGTHxLINES;...""
+                                     Also lay out the captions with at most LENGTH characters per line and LINES lines,
+                                     in the same session, for each layout NAME, and write them to FILE with .NAME added
+                                     before the extension, in each format of --formats. Layouts share line break analysis.
+                                     Requires --output. Not valid with --hls.
+                                     Example: ""tv=37x2;mobile=20x3""
     --maxLineLength LENGTH           Set the maximum number of characters per line for a caption to LENGTH.
-                                     Minimum is 20. Default is 37 (30 for Chinese).
+                                     Minimum is 20. Default is 37 (30 for Chinese and Japanese).
     --lines LINES                    Set the number of lines for a caption to LINES.
                                      Minimum is 1. Default is 2.
     --delay MILLISECONDS             How many MILLISECONDS to delay the appearance of each caption.
                                      Minimum is 0. Default is 1000.
+    --adaptiveDelay                  Choose the delay from how the recognizer behaves, starting from --delay. After each utterance,
+                                     use the lowest delay at which at most --targetRevisionRate of recent partial results were revised,
+                                     and of final results arrived, after their captions would be shown. The new delay applies from
+                                     the next utterance, and is written to the console. See delay_controller.py.
+                                     Valid only in real-time mode, with live audio.
+    --minDelay MILLISECONDS          With --adaptiveDelay, the lowest delay.
+                                     Default is 0.
+    --maxDelay MILLISECONDS          With --adaptiveDelay, the highest delay.
+                                     Default is 5000.
+    --targetRevisionRate RATE        With --adaptiveDelay, the share of results, from 0 to 1, that may arrive too late.
+                                     Default is 0.05.
+    --maxPartialRate RATE            Caption at most RATE partial results per second. A partial result that arrives sooner is held,
+                                     and dropped if a newer result arrives before it is due. Final results are never held.
+                                     See partial_coalescer.py. Valid only in real-time mode.
+                                     Default is to caption every partial result.
     --remainTime MILLISECONDS        How many MILLISECONDS a caption should remain on screen if it is not replaced by another.
                                      Minimum is 0. Default is 1000.
+    --flushBytes BYTES               Flush buffered output to FILE after BYTES have been written.
+                                     Minimum is 1. Default is 65536.
+    --flushInterval MILLISECONDS     Flush buffered output to FILE at least every MILLISECONDS while captions are being written.
+                                     Minimum is 0. Default is 1000.
+    --fsyncInterval MILLISECONDS     Also sync FILE to disk at most every MILLISECONDS, and when the session finishes.
+                                     Default is not to sync.
+    --index                          Also write a caption index to FILE.idx, so players can look up the caption at a given time
+                                     without parsing FILE. See caption_index.py.
+    --rotateBytes BYTES              Start a new FILE when FILE reaches BYTES, and rename the old one to FILE with a number added
+                                     before the extension, for example captions.00001.vtt. Each file starts with the file header.
+                                     The files, with the span of caption time in each, are listed in FILE.manifest.json.
+                                     See output_rotation.py. Not valid with the json format.
+    --rotateInterval SECONDS         Also start a new FILE every SECONDS, as with --rotateBytes.
+    --compressRotated                With --rotateBytes or --rotateInterval, gzip each renamed file in the background.
+    --hls DIR                        Write captions to DIR as WebVTT segments with an HLS playlist, captions.m3u8, for live streams.
+                                     Cues that span segments are split. Old segments are deleted. Overrides --output.
+                                     With --translate, captions for each target language go to DIR/LANG.
+                                     Not valid with --srt.
+    --hlsSegmentLength SECONDS       With --hls, the duration of each segment.
+                                     Default is 6.
+    --hlsWindow COUNT                With --hls, how many segments the playlist lists.
+                                     Minimum is 3. Default is 5.
+    --mpegtsOffset TIMESTAMP         With --hls, the MPEG-TS timestamp (90 kHz clock) of the media at which the audio starts.
+                                     Default is 0.
+    --cache FILE                     Also save the recognition results to FILE as JSON Lines, so the captions can be rendered
+                                     again with other OUTPUT options and no service calls. See rerender.py.
+                                     With --batch, FILE is a directory, and the results for each input file are saved
+                                     to DIR/NAME.jsonl.
+    --cachePartials                  With --cache, also save partial results. Needed to render real-time captions again.
+                                     Valid only in real-time mode.
+    --metrics FILE                   Also measure how far real-time captions run behind live audio, how often each caption is
+                                     rewritten before it is final, and how many results are dropped, and write the metrics
+                                     to FILE. See caption_metrics.py. Valid only in real-time mode, for the recognition language.
+    --metricsFormat FORMAT           With --metrics, the format of FILE.
+                                     Valid values: json, prometheus
+                                     Default is json.
+    --metricsInterval SECONDS        With --metrics, how often to write FILE.
+                                     Default is 10.
+    --record FILE                    Also record the recognizer events of the session, with the time each arrived, to FILE,
+                                     so replay.py can play them back without audio or the Speech service.
+                                     See event_recording.py. Not valid with --parallel.
+    --checkpoint FILE                Also save the final results to FILE every --checkpointInterval seconds and when the
+                                     session ends, so an interrupted session can continue with --resume. See checkpoint.py.
+                                     Valid only in offline mode, with an uncompressed --input file. Not valid with --parallel.
+                                     With --batch, FILE is a directory, and the checkpoint for each input file is saved
+                                     to DIR/NAME.checkpoint.jsonl.
+    --checkpointInterval SECONDS     With --checkpoint, how often to write FILE.
+                                     Default is 60.
+    --resume                         With --checkpoint, if FILE exists, caption the results saved in it, and recognize the
+                                     input from the end of the last of them rather than from the start.
     --quiet                          Suppress console output, except errors.
     --profanity OPTION               Valid values: raw, remove, mask
                                      Default is mask.
@@ -76,144 +208,217 @@ USAGE = """Usage: python captioning.py [...]
                                      Default is 3.
 """
 
+# recognize_continuous polls the sinks, metrics and checkpoint at least this often, and more often if one of
+# their intervals is shorter, but not more often than MIN_POLL_INTERVAL_SECONDS.
+POLL_INTERVAL_SECONDS = 1.0
+MIN_POLL_INTERVAL_SECONDS = 0.01
+
 class Captioning(object) :
-    def __init__(self) :
-        self._user_config = user_config_helper.user_config_from_args(USAGE)
-        self._srt_sequence_number = 1
-        self._previous_caption : Optional[caption_helper.Caption] = None
-        self._previous_end_time : Optional[time] = None
-        self._previous_result_is_recognized = False
-        self._recognized_lines : List[str] = []
-        self._offline_results : List[speechsdk.SpeechRecognitionResult] = []
-
-    def get_timestamp(self, start : time, end : time) -> str :
-        time_format = ""
-        if self._user_config["use_sub_rip_text_caption_format"] :
-            # SRT format requires ',' as decimal separator rather than '.'.
-            time_format = "%H:%M:%S,%f"
-        else :
-            time_format = "%H:%M:%S.%f"
-        # Truncate microseconds to milliseconds.
-        return "{} --> {}".format(start.strftime(time_format)[:-3], end.strftime(time_format)[:-3])
-
-    def string_from_caption(self, caption : caption_helper.Caption) -> str :
-        retval = ""
-        if self._user_config["use_sub_rip_text_caption_format"] :
-            retval += str(caption.sequence) + linesep
-        retval += self.get_timestamp(caption.begin, caption.end) + linesep
-        retval += caption.text + linesep + linesep
+    # If dispatcher is set, the recognizer callbacks pass the caption work to it rather than doing it themselves.
+    # See channel_helper.py.
+    # If break_index_cache is set, this Captioning shares line break analysis with others in the same language.
+    def __init__(self, user_config : helper.Read_Only_Dict, dispatcher : Optional[channel_helper.ChannelDispatcher] = None, break_index_cache : Optional[line_breaker.BreakIndexCache] = None) :
+        self._user_config = user_config
+        self._dispatcher = dispatcher
+        self._break_index_cache = break_index_cache if break_index_cache is not None else line_breaker.BreakIndexCache(line_breaker.rules_from_language(user_config["language"]))
+        self._renderer = caption_renderer.CaptionRenderer(user_config, self._break_index_cache)
+        self._sink : Optional[caption_sink.CaptionSink] = None
+        # Shared by all caption tracks.
+        self._server : Optional[caption_server.CaptionServer] = None
+        # Used to report how much audio the session processed.
+        self._audio_duration_ticks : Optional[int] = None
+        self._last_result_end_ticks = 0
+        # Set with --stdin or --ffmpeg.
+        self._push_audio_feeder : Optional[push_stream_helper.PushAudioFeeder] = None
+        self._ffmpeg : Optional[push_stream_helper.FfmpegProcess] = None
+        # Set with --cache. Only the Captioning that runs the recognition session writes the cache.
+        self._cache_writer : Optional[result_cache.ResultCacheWriter] = None
+        # Set with --metrics. Only the Captioning that runs the recognition session records metrics.
+        self._metrics : Optional[caption_metrics.CaptionMetrics] = None
+        # Set with --record.
+        self._event_recorder : Optional[event_recording.EventRecorder] = None
+        # Set with --checkpoint. Only the Captioning that runs the recognition session writes the checkpoint.
+        self._checkpoint : Optional[checkpoint.Checkpoint] = None
+        # Set with --resume: the results from the checkpoint, and where in the input recognition starts, in ticks.
+        self._resumed_records : List[caption_helper.RecognitionRecord] = []
+        self._resume_offset_ticks = 0
+        # Set with --adaptiveDelay. Only the Captioning that runs the recognition session has one, and it sets the delay of every track.
+        self._delay_controller : Optional[delay_controller.DelayController] = None
+        # Set with --maxPartialRate. Only the Captioning that runs the recognition session has one.
+        self._coalescer : Optional[partial_coalescer.PartialCoalescer] = None
+        # With --translate, this Captioning runs the recognition session and captions the recognition language.
+        # It passes each result on to one Captioning per target language, each with the line rules
+        # and output file for its language.
+        self._translation_tracks : List[Captioning] = []
+        if self.runs_session() :
+            for language in self._user_config["target_languages"] :
+                self._translation_tracks.append(Captioning(helper.Read_Only_Dict(dict(self._user_config,
+                    language = language,
+                    target_language = language,
+                    output_file = helper.output_file_from_language(self._user_config["output_file"], language),
+                    hls_directory = join(self._user_config["hls_directory"], language) if self._user_config["hls_directory"] is not None else None,
+                ))))
+        # With --formats or --layouts, this Captioning also passes each result on to one Captioning for each other
+        # combination of layout and format, each writing its own file. They share our line break analysis.
+        self._variant_tracks : List[Captioning] = []
+        if self._user_config["caption_variant"] is None :
+            for (variant, caption_format, max_line_length, lines) in helper.caption_variants(self._user_config) :
+                self._variant_tracks.append(Captioning(helper.Read_Only_Dict(dict(self._user_config,
+                    caption_variant = variant,
+                    caption_format = caption_format,
+                    max_line_length = max_line_length,
+                    lines = lines,
+                    output_file = helper.output_file_from_variant(self._user_config["output_file"], variant),
+                    # The console shows the captions of this Captioning only.
+                    suppress_console_output = True,
+                )), break_index_cache=self._break_index_cache))
+
+    # True for the Captioning that runs the recognition session, rather than a track it passes results to.
+    def runs_session(self) -> bool :
+        return self._user_config["target_language"] is None and self._user_config["caption_variant"] is None
+
+    # Tracks in the same language are next to each other, so they can share line break analysis.
+    def tracks(self) -> List["Captioning"] :
+        retval = [self] + self._variant_tracks
+        for track in self._translation_tracks :
+            retval += track.tracks()
         return retval
 
-    def adjust_real_time_caption_text(self, text : str, is_recognized_result : bool) -> str :
-        # Split the caption text into multiple lines based on max_line_length and lines.
-        temp_caption_helper = caption_helper.CaptionHelper(self._user_config["language"], self._user_config["max_line_length"], self._user_config["lines"], [])
-        lines = temp_caption_helper.lines_from_text(text)
-
-        # Recognizing results can change with each new result, so we do not save previous Recognizing results.
-        # Recognized results are final, so we save them in a member value.
-        recognizing_lines : List[str] = []
-        if is_recognized_result :
-            self._recognized_lines = self._recognized_lines + lines
-        else :
-            recognizing_lines = lines
-        
-        caption_lines = self._recognized_lines + recognizing_lines
-        return '\n'.join(caption_lines[-self._user_config["lines"]:])
-
-    def caption_from_real_time_result(self, result : speechsdk.SpeechRecognitionResult, is_recognized_result : bool) -> Optional[str] :
-        retval : Optional[str] = None
-
-        start_time = helper.time_from_ticks(result.offset)
-        end_time = helper.time_from_ticks(result.offset + result.duration)
-        
-        # If the end timestamp for the previous result is later
-        # than the end timestamp for this result, drop the result.
-        # This sometimes happens when we receive a lot of Recognizing results close together.
-        if self._previous_end_time is not None and self._previous_end_time > end_time :
-            pass
-        else :
-            # Record the end timestamp for this result.
-            self._previous_end_time = end_time
-            
-            # Convert the SpeechRecognitionResult to a caption.
-            # We are not ready to set the text for this caption.
-            # First we need to determine whether to clear _recognizedLines.
-            caption = caption_helper.Caption(self._user_config["language"], self._srt_sequence_number, helper.add_time_and_timedelta(start_time, self._user_config["delay"]), helper.add_time_and_timedelta(end_time, self._user_config["delay"]), "")
-            # Increment the sequence number.
-            self._srt_sequence_number += 1
-
-            # If we have a previous caption...
-            if self._previous_caption is not None :
-                # If the previous result was type Recognized...
-                if self._previous_result_is_recognized :
-                    # Set the end timestamp for the previous caption to the earliest of:
-                    # - The end timestamp for the previous caption plus the remain time.
-                    # - The start timestamp for the current caption.
-                    previous_end = helper.add_time_and_timedelta(self._previous_caption.end, self._user_config["remain_time"])
-                    self._previous_caption.end = previous_end if previous_end < caption.begin else caption.begin
-                    # If the gap between the original end timestamp for the previous caption
-                    # and the start timestamp for the current caption is larger than remainTime,
-                    # clear the cached recognized lines.
-                    # Note this needs to be done before we call AdjustRealTimeCaptionText
-                    # for the current caption, because it uses _recognizedLines.
-                    if previous_end < caption.begin :
-                        self._recognized_lines.clear()
-                # If the previous result was type Recognizing, simply set the start timestamp
-                # for the current caption to the end timestamp for the previous caption.
-                # Note this presumes there will not be a large gap between Recognizing results,
-                # because such a gap would cause the previous Recognizing result to be succeeded
-                # by a Recognized result.
-                else :
-                    caption.begin = self._previous_caption.end
-
-                retval = self.string_from_caption(self._previous_caption)
-
-            # Break the caption text into lines if needed.
-            caption.text = self.adjust_real_time_caption_text(result.text, is_recognized_result)
-            # Save the current caption as the previous caption.
-            self._previous_caption = caption
-            # Save the result type as the previous result type.
-            self._previous_result_is_recognized = is_recognized_result
+    # Return the result, with its text in the language of this caption track.
+    def result_for_track(self, result : speechsdk.RecognitionResult) -> speechsdk.RecognitionResult :
+        if self._user_config["target_language"] is None :
+            return result
+        return caption_helper.RecognitionRecord.from_translation(result, self._user_config["target_language"])
 
-        return retval
+    def write_caption(self, caption : caption_helper.Caption) -> None :
+        self._sink.write(text=self._renderer.string_from_caption(caption), caption=caption)
 
-    def captions_from_offline_results(self) -> List[caption_helper.Caption] :
-        captions = caption_helper.get_captions(self._user_config["language"], self._user_config["max_line_length"], self._user_config["lines"], list(self._offline_results))
-        # Save the last caption.
-        last_caption = captions[-1]
-        last_caption.end = helper.add_time_and_timedelta(last_caption.end, self._user_config["remain_time"])
-        # In offline mode, all captions come from RecognitionResults of type Recognized.
-        # Set the end timestamp for each caption to the earliest of:
-        # - The end timestamp for this caption plus the remain time.
-        # - The start timestamp for the next caption.
-        captions_2 : List[caption_helper.Caption] = []
-        for (caption_1, caption_2) in pairwise(captions) :
-            end = helper.add_time_and_timedelta(caption_1.end, self._user_config["remain_time"])
-            caption_1.end = end if end < caption_2.begin else caption_2.begin
-            captions_2.append(caption_1)
-        # Re-add the last caption.
-        captions_2.append(last_caption)
-        return captions_2
+    def write_captions(self, captions : Sequence[caption_helper.Caption]) -> None :
+        for caption in captions :
+            self.write_caption(caption)
 
     def finish(self) -> None :
-        if user_config_helper.CaptioningMode.OFFLINE == self._user_config["captioning_mode"] :
-            for caption in self.captions_from_offline_results() :
-                helper.write_to_console_or_file(text=self.string_from_caption(caption), user_config=self._user_config)
-        elif user_config_helper.CaptioningMode.REALTIME == self._user_config["captioning_mode"] :
-            # Show the last "previous" caption, which is actually the last caption.
-            if self._previous_caption is not None :
-                self._previous_caption.end = helper.add_time_and_timedelta(self._previous_caption.end, self._user_config["remain_time"])
-                helper.write_to_console_or_file(text=self.string_from_caption(self._previous_caption), user_config=self._user_config)
+        if self._push_audio_feeder is not None :
+            self._push_audio_feeder.close()
+            self._audio_duration_ticks = self._push_audio_feeder.pcm_format.ticks_from_bytes(self._push_audio_feeder.bytes_pushed)
+        if self._ffmpeg is not None :
+            self._ffmpeg.close()
+        if self._cache_writer is not None :
+            self._cache_writer.close()
+        if self._event_recorder is not None :
+            self._event_recorder.close()
+        self.write_captions(self._renderer.final_captions())
+        if self._renderer.file_footer() :
+            self._sink.write(text=self._renderer.file_footer())
+        self._sink.close()
+        if self._metrics is not None :
+            self._metrics.dump()
+        for track in self._variant_tracks + self._translation_tracks :
+            track.finish()
+        if self._server is not None and self.runs_session() :
+            self._server.close()
 
     def initialize(self) :
-        if self._user_config["output_file"] is not None and exists(self._user_config["output_file"]) :
-            remove(self._user_config["output_file"])
-        if not self._user_config["use_sub_rip_text_caption_format"] :
-            helper.write_to_console_or_file(text="WEBVTT{}{}".format(linesep, linesep), user_config=self._user_config)
+        if self._variant_tracks and (self._user_config["output_file"] is None or self._user_config["hls_directory"] is not None) :
+            raise RuntimeError("--formats and --layouts require --output, and are not valid with --hls.{}{}".format(linesep, USAGE))
+        if self._user_config["hls_directory"] is not None :
+            if user_config_helper.CaptionFormat.WEBVTT != self._user_config["caption_format"] :
+                raise RuntimeError("--hls is valid only with WebVTT captions.{}{}".format(linesep, USAGE))
+            # In real-time mode, segments are published as time passes, even if no captions arrive.
+            self._sink = hls_sink.hls_sink_from_user_config(self._user_config, live=user_config_helper.CaptioningMode.REALTIME == self._user_config["captioning_mode"])
+        else :
+            self._sink = caption_sink.caption_sink_from_user_config(self._user_config)
+        if self._renderer.file_header() :
+            self._sink.write_header(self._renderer.file_header())
+        if self._user_config["serve_port"] is not None and self.runs_session() :
+            if user_config_helper.CaptioningMode.REALTIME != self._user_config["captioning_mode"] :
+                raise RuntimeError("--serve is valid only in real-time mode.{}{}".format(linesep, USAGE))
+            self._server = caption_server.CaptionServer(self._user_config["serve_host"], self._user_config["serve_port"])
+            helper.write_to_console(text="Serving captions at {}{}".format(self._server.address(), linesep), user_config=self._user_config)
+        if self._user_config["cache_file"] is not None and self.runs_session() :
+            if self._user_config["cache_partial_results"] and user_config_helper.CaptioningMode.REALTIME != self._user_config["captioning_mode"] :
+                raise RuntimeError("--cachePartials is valid only in real-time mode.{}{}".format(linesep, USAGE))
+            self._cache_writer = result_cache.ResultCacheWriter(self._user_config["cache_file"], self._user_config["language"])
+        if self._user_config["metrics_file"] is not None and self.runs_session() :
+            if user_config_helper.CaptioningMode.REALTIME != self._user_config["captioning_mode"] :
+                raise RuntimeError("--metrics is valid only in real-time mode.{}{}".format(linesep, USAGE))
+            self._metrics = caption_metrics.caption_metrics_from_user_config(self._user_config)
+        if self._user_config["adaptive_delay"] and self.runs_session() :
+            if user_config_helper.CaptioningMode.REALTIME != self._user_config["captioning_mode"] :
+                raise RuntimeError("--adaptiveDelay is valid only in real-time mode.{}{}".format(linesep, USAGE))
+            self._delay_controller = delay_controller.delay_controller_from_user_config(self._user_config)
+        if self._user_config["max_partial_rate"] is not None and self.runs_session() :
+            if user_config_helper.CaptioningMode.REALTIME != self._user_config["captioning_mode"] :
+                raise RuntimeError("--maxPartialRate is valid only in real-time mode.{}{}".format(linesep, USAGE))
+            self._coalescer = partial_coalescer.PartialCoalescer(self._user_config["max_partial_rate"], self.dispatch_result)
+        if self._user_config["recording_file"] is not None and self.runs_session() :
+            if self._user_config["parallel_sessions"] is not None :
+                raise RuntimeError("--record is not valid with --parallel.{}{}".format(linesep, USAGE))
+            # Save the settings that change which events the recognizer sends, so sweep.py can compare recordings.
+            self._event_recorder = event_recording.EventRecorder(self._user_config["recording_file"], {
+                "language" : self._user_config["language"],
+                "stable_partial_result_threshold" : self._user_config["stable_partial_result_threshold"],
+            })
+        if self._user_config["checkpoint_file"] is not None and self.runs_session() :
+            self.initialize_checkpoint()
+        for track in self._variant_tracks :
+            if track._user_config["output_file"] in [other._user_config["output_file"] for other in [self] + self._variant_tracks if other is not track] :
+                raise RuntimeError("--formats and --layouts would write {} twice. Use an --output extension that matches the first format.{}{}".format(track._user_config["output_file"], linesep, USAGE))
+            track.initialize()
+        for track in self._translation_tracks :
+            track._server = self._server
+            track.initialize()
         return
 
+    def initialize_checkpoint(self) -> None :
+        if self._user_config["input_file"] is None or self._user_config["use_compressed_audio"] or self._user_config["parallel_sessions"] is not None or user_config_helper.CaptioningMode.OFFLINE != self._user_config["captioning_mode"] :
+            raise RuntimeError("--checkpoint is valid only in offline mode, with an uncompressed --input file, and not with --parallel.{}{}".format(linesep, USAGE))
+        if self._user_config["resume"] and self._event_recorder is not None :
+            # The recording would start partway through the input.
+            raise RuntimeError("--record is not valid with --resume.{}{}".format(linesep, USAGE))
+
+    # Start the checkpoint for the input, whose WAV header the audio callback has read. With --resume, read the results
+    # from the checkpoint, and skip the audio they cover.
+    def start_checkpoint(self, callback : audio_helper.BinaryFileReaderCallback) -> None :
+        header = callback.wav_header
+        if self._user_config["resume"] :
+            self._resumed_records = checkpoint.records_from_checkpoint(self._user_config["checkpoint_file"], self._user_config["language"], header.data_size)
+            resume_bytes = header.bytes_from_ticks(checkpoint.resume_offset_from_records(self._resumed_records))
+            # Start the new results where the audio we skip ends, which is at most one block before the last result ends.
+            self._resume_offset_ticks = header.ticks_from_bytes(resume_bytes)
+            callback.seek_data(resume_bytes)
+        self._checkpoint = checkpoint.Checkpoint(self._user_config["checkpoint_file"], self._user_config["input_file"], self._user_config["language"], header.data_size, self._user_config["checkpoint_interval_seconds"])
+        self.caption_resumed_records()
+
+    # Caption the results from the checkpoint, as if the recognizer had just sent them.
+    def caption_resumed_records(self) -> None :
+        if self._resumed_records :
+            helper.write_to_console(text="Resuming at {} after {} results from {}.{}".format(helper.timestamp_from_ticks(self._resume_offset_ticks), len(self._resumed_records), self._user_config["checkpoint_file"], linesep), user_config=self._user_config)
+        for record in self._resumed_records :
+            self._last_result_end_ticks = max(self._last_result_end_ticks, record.offset + record.duration)
+            self.cache_result(record, True)
+            self._checkpoint.add_result(record)
+            for track in self.tracks() :
+                track.add_result(record, True)
+        self._resumed_records = []
+
     def audio_config_from_user_config(self) -> helper.Read_Only_Dict :
-        if self._user_config["input_file"] is None :
+        if self._user_config["use_stdin"] or self._user_config["ffmpeg_source"] is not None :
+            pcm_format = push_stream_helper.pcm_format_from_user_config(self._user_config)
+            source = stdin.buffer
+            if self._user_config["ffmpeg_source"] is not None :
+                self._ffmpeg = push_stream_helper.FfmpegProcess(self._user_config["ffmpeg_source"], pcm_format.samples_per_second)
+                source = self._ffmpeg.stdout
+            self._push_audio_feeder = push_stream_helper.PushAudioFeeder(source, pcm_format)
+            # Start reading now, so the audio that arrives while we connect is buffered rather than lost.
+            self._push_audio_feeder.start()
+            return helper.Read_Only_Dict({
+                "audio_config" : speechsdk.audio.AudioConfig(stream=self._push_audio_feeder.stream),
+                "audio_stream_format" : None,
+                "pull_input_audio_stream_callback" : None,
+                "pull_input_audio_stream" : None
+            })
+        elif self._user_config["input_file"] is None :
             return helper.Read_Only_Dict({
                 "audio_config" : speechsdk.AudioConfig(use_default_microphone=True),
                 "audio_stream_format" : None,
@@ -222,13 +427,18 @@ class Captioning(object) :
             });
         else :
             audio_stream_format = None
+            callback = None
             if not self._user_config["use_compressed_audio"] :
-                reader = wave.open(self._user_config["input_file"], mode=None)
-                audio_stream_format = speechsdk.audio.AudioStreamFormat(samples_per_second=reader.getframerate(), bits_per_sample=reader.getsampwidth() * 8, channels=reader.getnchannels())
-                reader.close()
+                # The callback reads the WAV header from the same file handle it uses for the audio data.
+                callback = audio_helper.BinaryFileReaderCallback(filename=self._user_config["input_file"], read_wav_header=True)
+                if self._user_config["checkpoint_file"] is not None and self.runs_session() :
+                    # With --resume, the callback skips the audio that the checkpoint has results for.
+                    self.start_checkpoint(callback)
+                audio_stream_format = audio_helper.audio_stream_format_from_wav_header(callback.wav_header)
+                self._audio_duration_ticks = callback.wav_header.ticks_from_bytes(callback.wav_header.data_size)
             else :
-                audio_stream_format = speechsdk.audio.AudioStreamFormat(compressed_stream_format=self._user_config["compressed_audio_format"])
-            callback = helper.BinaryFileReaderCallback(filename=self._user_config["input_file"])
+                audio_stream_format = speechsdk.audio.AudioStreamFormat(compressed_stream_format=speechsdk.AudioStreamContainerFormat[self._user_config["compressed_audio_format"]])
+                callback = audio_helper.BinaryFileReaderCallback(filename=self._user_config["input_file"])
             stream = speechsdk.audio.PullAudioInputStream(pull_stream_callback=callback, stream_format=audio_stream_format)
             # We return the BinaryFileReaderCallback, AudioStreamFormat, and PullAudioInputStream
             # because we need to keep them in scope until they are actually used.
@@ -241,9 +451,14 @@ class Captioning(object) :
 
     def speech_config_from_user_config(self) -> speechsdk.SpeechConfig :
         speech_config = None
-        speech_config = speechsdk.SpeechConfig(subscription=self._user_config["subscription_key"], region=self._user_config["region"])
+        if len(self._user_config["target_languages"]) > 0 :
+            speech_config = speechsdk.translation.SpeechTranslationConfig(subscription=self._user_config["subscription_key"], region=self._user_config["region"])
+            for language in self._user_config["target_languages"] :
+                speech_config.add_target_language(language)
+        else :
+            speech_config = speechsdk.SpeechConfig(subscription=self._user_config["subscription_key"], region=self._user_config["region"])
 
-        speech_config.set_profanity(self._user_config["profanity_option"])
+        speech_config.set_profanity(speechsdk.ProfanityOption[self._user_config["profanity_option"]])
 
         if self._user_config["stable_partial_result_threshold"] is not None :
             speech_config.set_property(property_id=speechsdk.PropertyId.SpeechServiceResponse_StablePartialResultThreshold, value=self._user_config["stable_partial_result_threshold"])
@@ -253,16 +468,26 @@ class Captioning(object) :
         
         return speech_config
 
-    def speech_recognizer_from_user_config(self) -> helper.Read_Only_Dict :
-        audio_config_data = self.audio_config_from_user_config()
+    def speech_recognizer_from_audio_config(self, audio_config : speechsdk.audio.AudioConfig) -> speechsdk.Recognizer :
         speech_config = self.speech_config_from_user_config()
-        speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config_data["audio_config"])
+        speech_recognizer = None
+        if len(self._user_config["target_languages"]) > 0 :
+            # One TranslationRecognizer session returns the recognized text and all of its translations.
+            speech_recognizer = speechsdk.translation.TranslationRecognizer(translation_config=speech_config, audio_config=audio_config)
+        else :
+            speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
 
         if len(self._user_config["phrases"]) > 0 :
             grammar = speechsdk.PhraseListGrammar.from_recognizer(recognizer=speech_recognizer)
             for phrase in self._user_config["phrases"] :
                 grammar.addPhrase(phrase)
 
+        return speech_recognizer
+
+    def speech_recognizer_from_user_config(self) -> helper.Read_Only_Dict :
+        audio_config_data = self.audio_config_from_user_config()
+        speech_recognizer = self.speech_recognizer_from_audio_config(audio_config_data["audio_config"])
+
         return helper.Read_Only_Dict({
             "speech_recognizer" : speech_recognizer,
             "audio_stream_format" : audio_config_data["audio_stream_format"],
@@ -270,37 +495,107 @@ class Captioning(object) :
             "pull_input_audio_stream" : audio_config_data["pull_input_audio_stream"],
         })
 
-    def recognize_continuous(self, speech_recognizer : speechsdk.SpeechRecognizer, format : speechsdk.audio.AudioStreamFormat, callback : helper.BinaryFileReaderCallback, stream : speechsdk.audio.PullAudioInputStream) :
-        done = False
-        def recognizing_handler(e : speechsdk.SpeechRecognitionEventArgs) :
-            if speechsdk.ResultReason.RecognizingSpeech == e.result.reason and len(e.result.text) > 0 :
-                # This seems to be the only way we can get information about
-                # exceptions raised inside an event handler.
-                try :
-                    caption = self.caption_from_real_time_result(e.result, False)
-                    if caption is not None :
-                        helper.write_to_console_or_file(text=caption, user_config=self._user_config)
-                except Exception as ex :
-                    print('Exception in recognizing_handler: {}'.format(ex))
-            elif speechsdk.ResultReason.NoMatch == e.result.reason :
+    # Save the result, with its translations, to the result cache, if there is one.
+    def cache_result(self, result : speechsdk.RecognitionResult, is_final_result : bool) -> None :
+        if self._cache_writer is not None and (is_final_result or self._user_config["cache_partial_results"]) :
+            self._cache_writer.write(result)
+
+    # Write the captions that this result completes, and show the current caption to viewers.
+    def add_result(self, result : speechsdk.RecognitionResult, is_final_result : bool) -> None :
+        result = self.result_for_track(result)
+        if 0 == len(result.text) :
+            return
+        dropped_results = self._renderer.dropped_results
+        # Metrics are only kept in real-time mode, where this result completes the current caption, if any.
+        is_final_caption = self._renderer.current_caption_is_final()
+        captions = self._renderer.captions_from_result(result, is_final_result)
+        self.write_captions(captions)
+        if self._metrics is not None :
+            self._metrics.add_result(is_final_result, self._renderer.dropped_results > dropped_results)
+            for caption in captions :
+                self._metrics.add_caption(caption, is_final_caption)
+        if self._server is not None and self._renderer.current_caption() is not None :
+            self._server.publish(self._user_config["language"], self._renderer.current_caption().text)
+
+    # Cache the result and caption it in every track.
+    def handle_result(self, result : speechsdk.RecognitionResult, is_final_result : bool) -> None :
+        # This seems to be the only way we can get information about
+        # exceptions raised inside an event handler.
+        try :
+            self.cache_result(result, is_final_result)
+            if self._checkpoint is not None and is_final_result :
+                self._checkpoint.add_result(result)
+            for track in self.tracks() :
+                track.add_result(result, is_final_result)
+            if self._coalescer is not None and self._metrics is not None :
+                self._metrics.set_coalesced_results(self._coalescer.coalesced_results)
+        except Exception as ex :
+            print('Exception in {}: {}'.format("recognized_handler" if is_final_result else "recognizing_handler", ex))
+
+    # The delay controller sees every result, before the coalescer replaces any. A new delay is applied in order
+    # with the results that are already dispatched.
+    def adapt_delay(self, result : speechsdk.RecognitionResult, is_final_result : bool) -> None :
+        try :
+            delay = self._delay_controller.add_result(result, is_final_result)
+            if delay is None :
+                return
+            if self._dispatcher is None :
+                self.set_delay(delay)
+            else :
+                self._dispatcher.submit(lambda : self.set_delay(delay))
+        except Exception as ex :
+            print('Exception in adapt_delay: {}'.format(ex))
+
+    def set_delay(self, delay : int) -> None :
+        for track in self.tracks() :
+            track._renderer.set_delay(delay)
+        if self._metrics is not None :
+            self._metrics.set_delay(delay)
+
+    # Pass the result on to be captioned, through the coalescer if there is one.
+    def coalesce_result(self, result : speechsdk.RecognitionResult, is_final_result : bool) -> None :
+        if self._delay_controller is not None :
+            self.adapt_delay(result, is_final_result)
+        if self._coalescer is None :
+            self.dispatch_result(result, is_final_result)
+        else :
+            self._coalescer.add_result(result, is_final_result)
+
+    def dispatch_result(self, result : speechsdk.RecognitionResult, is_final_result : bool) -> None :
+        if self._dispatcher is None :
+            self.handle_result(result, is_final_result)
+        else :
+            self._dispatcher.submit(lambda : self.handle_result(result, is_final_result))
+
+    # With --resume, the recognizer starts partway through the input, so move its results to where they are in the input.
+    def rebase_result(self, result : caption_helper.RecognitionResult) -> caption_helper.RecognitionResult :
+        if 0 == self._resume_offset_ticks :
+            return result
+        return caption_helper.RecognitionRecord.from_result(result, self._resume_offset_ticks)
+
+    def recognize_continuous(self, speech_recognizer : speechsdk.Recognizer, format : speechsdk.audio.AudioStreamFormat, callback : audio_helper.BinaryFileReaderCallback, stream : speechsdk.audio.PullAudioInputStream) :
+        # Set by the stopped and canceled handlers, so we stop as soon as the session does.
+        done = Event()
+        # Set if the session is canceled with an error. We raise it once the session is cleaned up, so callers
+        # such as --batch and --channels report the session as failed.
+        cancellation_error : Optional[str] = None
+        def recognizing_handler(e : speechsdk.RecognitionEventArgs) :
+            # Compare reason names, so the handlers also accept recorded results. See event_recording.py.
+            if caption_helper.reason_name(e.result.reason) in caption_helper.PARTIAL_RESULT_REASONS and len(e.result.text) > 0 :
+                self.coalesce_result(e.result, False)
+            elif "NoMatch" == caption_helper.reason_name(e.result.reason) :
                 helper.write_to_console(text="NOMATCH: Speech could not be recognized.{}".format(linesep), user_config=self._user_config)
 
-        def recognized_handler(e : speechsdk.SpeechRecognitionEventArgs) :
-            if speechsdk.ResultReason.RecognizedSpeech == e.result.reason and len(e.result.text) > 0 :
-                try :
-                    if user_config_helper.CaptioningMode.OFFLINE == self._user_config["captioning_mode"] :
-                        self._offline_results.append(e.result)
-                    else :
-                        caption = self.caption_from_real_time_result(e.result, True)
-                        if caption is not None :
-                            helper.write_to_console_or_file(text=caption, user_config=self._user_config)
-                except Exception as ex :
-                    print('Exception in recognized_handler: {}'.format(ex))
-            elif speechsdk.ResultReason.NoMatch == e.result.reason :
+        def recognized_handler(e : speechsdk.RecognitionEventArgs) :
+            if caption_helper.reason_name(e.result.reason) in caption_helper.FINAL_RESULT_REASONS and len(e.result.text) > 0 :
+                result = self.rebase_result(e.result)
+                self._last_result_end_ticks = max(self._last_result_end_ticks, result.offset + result.duration)
+                self.coalesce_result(result, True)
+            elif "NoMatch" == caption_helper.reason_name(e.result.reason) :
                 helper.write_to_console(text="NOMATCH: Speech could not be recognized.{}".format(linesep), user_config=self._user_config)
 
         def canceled_handler(e : speechsdk.SpeechRecognitionCanceledEventArgs) :
-            nonlocal done
+            nonlocal cancellation_error
             # Notes:
             # SpeechRecognitionCanceledEventArgs inherits the result property from SpeechRecognitionEventArgs. See:
             # https://docs.microsoft.com/python/api/azure-cognitiveservices-speech/azure.cognitiveservices.speech.speechrecognitioncanceledeventargs
@@ -311,22 +606,20 @@ class Captioning(object) :
             # e.result.reason is ResultReason.Canceled. To get the cancellation reason, see e.cancellation_details.reason.
             if speechsdk.CancellationReason.EndOfStream == e.cancellation_details.reason :
                 helper.write_to_console(text="End of stream reached.{}".format(linesep), user_config=self._user_config)
-                done = True
+                done.set()
             elif speechsdk.CancellationReason.CancelledByUser == e.cancellation_details.reason :
                 helper.write_to_console(text="User canceled request.{}".format(linesep), user_config=self._user_config)
-                done = True
+                done.set()
             elif speechsdk.CancellationReason.Error == e.cancellation_details.reason :
-                # Error output should not be suppressed, even if suppress output flag is set.
-                print("Encountered error. Cancellation details: {}{}".format(e.cancellation_details, linesep))
-                done = True
+                cancellation_error = "Encountered error. Cancellation details: {}".format(e.cancellation_details)
+                done.set()
             else :
                 print("Request was cancelled for an unrecognized reason. Cancellation details: {}{}".format(e.cancellation_details, linesep))
-                done = True
+                done.set()
 
         def stopped_handler(e : speechsdk.SessionEventArgs) :
-            nonlocal done
             helper.write_to_console(text="Session stopped.{}".format(linesep), user_config=self._user_config)
-            done = True
+            done.set()
 
         # We only use Recognizing results in real-time mode.
         if user_config_helper.CaptioningMode.REALTIME == self._user_config["captioning_mode"] :
@@ -335,19 +628,139 @@ class Captioning(object) :
         speech_recognizer.session_stopped.connect(stopped_handler)
         speech_recognizer.canceled.connect(canceled_handler)
 
+        if self._event_recorder is not None :
+            self._event_recorder.connect(speech_recognizer)
+            self._event_recorder.start()
+        if self._metrics is not None :
+            self._metrics.start()
+        if self._delay_controller is not None :
+            self._delay_controller.start()
         speech_recognizer.start_continuous_recognition()
 
-        while not done :
-            sleep(5)
+        poll_interval_seconds = self.poll_interval_seconds()
+        while not done.wait(poll_interval_seconds) :
+            for track in self.tracks() :
+                track._sink.poll()
+            if self._metrics is not None :
+                self._metrics.poll()
+            if self._checkpoint is not None :
+                self._checkpoint.poll()
         speech_recognizer.stop_continuous_recognition()
+        if self._coalescer is not None :
+            self._coalescer.flush()
+        if self._dispatcher is not None :
+            self._dispatcher.wait()
+        if self._checkpoint is not None :
+            self._checkpoint.write()
+        if cancellation_error is not None :
+            raise RuntimeError(cancellation_error)
 
         return
 
-if user_config_helper.cmd_option_exists("--help") :
-    print(USAGE)
-else :
-    captioning = Captioning()
+    # Return how long recognize_continuous waits between polls, so that no flush, fsync, rotation, segment,
+    # metrics or checkpoint interval is rounded up.
+    def poll_interval_seconds(self) -> float :
+        intervals = [POLL_INTERVAL_SECONDS, self._user_config["flush_interval"].total_seconds()]
+        if self._user_config["fsync_interval"] is not None :
+            intervals.append(self._user_config["fsync_interval"].total_seconds())
+        if self._user_config["rotate_interval_seconds"] is not None :
+            intervals.append(self._user_config["rotate_interval_seconds"])
+        if self._user_config["hls_directory"] is not None :
+            intervals.append(self._user_config["hls_segment_seconds"])
+        if self._metrics is not None :
+            intervals.append(self._user_config["metrics_interval_seconds"])
+        if self._checkpoint is not None :
+            intervals.append(self._user_config["checkpoint_interval_seconds"])
+        return max(min(intervals), MIN_POLL_INTERVAL_SECONDS)
+
+    # Recognize one segment of the input WAV file in its own session, and return its final results
+    # with their offsets moved to where the segment starts in the recording.
+    def recognize_segment(self, header : helper.WavHeader, segment : segment_helper.Segment) -> List[caption_helper.RecognitionRecord] :
+        retval : List[caption_helper.RecognitionRecord] = []
+        done = Event()
+        audio_stream_format = audio_helper.audio_stream_format_from_wav_header(header)
+        callback = audio_helper.BinaryFileReaderCallback(filename=self._user_config["input_file"], start=segment.start_byte, end=segment.end_byte)
+        stream = speechsdk.audio.PullAudioInputStream(pull_stream_callback=callback, stream_format=audio_stream_format)
+        speech_recognizer = self.speech_recognizer_from_audio_config(speechsdk.audio.AudioConfig(stream=stream))
+
+        def recognized_handler(e : speechsdk.RecognitionEventArgs) :
+            if caption_helper.reason_name(e.result.reason) in caption_helper.FINAL_RESULT_REASONS and len(e.result.text) > 0 :
+                retval.append(caption_helper.RecognitionRecord.from_result(e.result, segment.offset_ticks))
+
+        # Set if the segment is canceled before the end of its audio.
+        cancellation_details : Optional[Any] = None
+
+        def canceled_handler(e : speechsdk.SpeechRecognitionCanceledEventArgs) :
+            nonlocal cancellation_details
+            if speechsdk.CancellationReason.EndOfStream != e.cancellation_details.reason :
+                cancellation_details = e.cancellation_details
+            done.set()
+
+        speech_recognizer.recognized.connect(recognized_handler)
+        speech_recognizer.session_stopped.connect(lambda e : done.set())
+        speech_recognizer.canceled.connect(canceled_handler)
+        speech_recognizer.start_continuous_recognition()
+        done.wait()
+        speech_recognizer.stop_continuous_recognition()
+        if cancellation_details is not None :
+            # The captions would have a hole where this segment is, so fail the run rather than write them as if complete.
+            end_ticks = segment.offset_ticks + header.ticks_from_bytes(segment.end_byte - segment.start_byte)
+            raise RuntimeError("The segment from {} to {} was canceled, so it has no captions. Cancellation details: {}".format(helper.timestamp_from_ticks(segment.offset_ticks), helper.timestamp_from_ticks(end_ticks), cancellation_details))
+        return retval
+
+    # Split the input into segments, recognize them in parallel, and make captions from the merged results.
+    def recognize_parallel(self) -> None :
+        if self._user_config["input_file"] is None or self._user_config["use_compressed_audio"] or user_config_helper.CaptioningMode.OFFLINE != self._user_config["captioning_mode"] :
+            raise RuntimeError("--parallel is valid only in offline mode, with an uncompressed --input file.{}{}".format(linesep, USAGE))
+        header = helper.wav_header_from_file(self._user_config["input_file"])
+        self._audio_duration_ticks = header.ticks_from_bytes(header.data_size)
+        segments = segment_helper.segments_from_wav(self._user_config["input_file"], header, self._user_config["parallel_sessions"], self._user_config["segment_seconds"])
+        helper.write_to_console(text="Recognizing {} segments in {} sessions.{}".format(len(segments), self._user_config["parallel_sessions"], linesep), user_config=self._user_config)
+        with ThreadPoolExecutor(max_workers=self._user_config["parallel_sessions"]) as executor :
+            try :
+                # map() returns the results in segment order, so results stay in order as we merge them.
+                for records in executor.map(lambda segment : self.recognize_segment(header, segment), segments) :
+                    for record in records :
+                        self._last_result_end_ticks = max(self._last_result_end_ticks, record.offset + record.duration)
+                        self.cache_result(record, True)
+                        for track in self.tracks() :
+                            track.add_result(record, True)
+            except Exception :
+                # The run has failed, so do not start the segments that are still waiting.
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    # Return how many seconds of audio the session processed. For compressed audio and the microphone,
+    # we do not know the audio length, so we use the end of the last recognized result.
+    def audio_seconds(self) -> float :
+        ticks = self._audio_duration_ticks if self._audio_duration_ticks is not None else self._last_result_end_ticks
+        return ticks / helper.TICKS_PER_SECOND
+
+def caption_session(user_config : helper.Read_Only_Dict, dispatcher : Optional[channel_helper.ChannelDispatcher] = None) -> float :
+    captioning = Captioning(user_config, dispatcher)
     captioning.initialize()
-    speech_recognizer_data = captioning.speech_recognizer_from_user_config()
-    captioning.recognize_continuous(speech_recognizer=speech_recognizer_data["speech_recognizer"], format=speech_recognizer_data["audio_stream_format"], callback=speech_recognizer_data["pull_input_audio_stream_callback"], stream=speech_recognizer_data["pull_input_audio_stream"])
-    captioning.finish()
\ No newline at end of file
+    # If recognition fails, still write and close what we have before the error is raised.
+    try :
+        if user_config["parallel_sessions"] is not None :
+            captioning.recognize_parallel()
+        else :
+            speech_recognizer_data = captioning.speech_recognizer_from_user_config()
+            captioning.recognize_continuous(speech_recognizer=speech_recognizer_data["speech_recognizer"], format=speech_recognizer_data["audio_stream_format"], callback=speech_recognizer_data["pull_input_audio_stream_callback"], stream=speech_recognizer_data["pull_input_audio_stream"])
+    finally :
+        captioning.finish()
+    return captioning.audio_seconds()
+
+if __name__ == "__main__" :
+    if user_config_helper.cmd_option_exists("--help") :
+        print(USAGE)
+    else :
+        user_config = user_config_helper.user_config_from_args(USAGE)
+        if user_config["channels_file"] is not None :
+            channel_helper.caption_channels(user_config, caption_session)
+        elif user_config["batch_input"] is not None :
+            jobs = batch_helper.caption_batch(user_config, caption_session)
+            # Let scripts that run a batch tell that some files failed.
+            if any(job.error is not None for job in jobs) :
+                exit(1)
+        else :
+            caption_session(user_config)
\ No newline at end of file
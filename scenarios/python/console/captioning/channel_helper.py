@@ -0,0 +1,236 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Runs several live caption channels in one process, so they share one interpreter, one copy of the Speech SDK,
+# and one pool of threads for caption work. The channels are defined in a JSON file:
+# {
+#     "channels" : [
+#         { "name" : "studio1", "ffmpeg" : "rtmp://example/studio1", "output" : "studio1.vtt" },
+#         { "name" : "studio2", "input" : "studio2.wav", "hls" : "hls/studio2", "language" : "de-DE" }
+#     ]
+# }
+# Each channel starts from the options on the command line, and its keys override them. See CHANNEL_OPTIONS.
+# The recognizer of each channel calls back on SDK threads. The callbacks only queue the caption work for their
+# channel, and a shared pool of dispatch threads does it. The work for one channel is done in order, one item
+# at a time, so each channel keeps the same caption state as a process of its own.
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps, load
+from os import linesep
+from threading import Condition, Lock, Thread
+from time import monotonic, sleep, strftime
+from typing import Callable, Deque, Dict, List, Optional
+import helper
+
+try :
+    import resource
+except ImportError :
+    # Not available on Windows.
+    resource = None
+
+DEFAULT_DISPATCH_THREADS = 4
+DEFAULT_HEALTH_INTERVAL_SECONDS = 30
+# How many caption work items a channel can have queued before its recognizer callbacks wait.
+MAX_PENDING = 256
+# How many items a dispatch thread does for one channel before it lets other channels run.
+DRAIN_BATCH = 32
+
+# The keys a channel can set, and the user_config keys they override.
+CHANNEL_OPTIONS = {
+    "input" : "input_file",
+    "ffmpeg" : "ffmpeg_source",
+    "output" : "output_file",
+    "hls" : "hls_directory",
+    "language" : "language",
+    "translate" : "target_languages",
+    "phrases" : "phrases",
+    "cache" : "cache_file",
+    "record" : "recording_file",
+    "metrics" : "metrics_file",
+}
+# These keys take a list, or a string of items separated by ';' as on the command line.
+LIST_OPTIONS = ["translate", "phrases"]
+
+# Runs the caption work of one channel in order on a shared pool.
+class ChannelDispatcher(object) :
+    def __init__(self, pool : ThreadPoolExecutor, max_pending : int = MAX_PENDING) :
+        self._pool = pool
+        self._max_pending = max_pending
+        self._condition = Condition()
+        self._pending : Deque[Callable[[], None]] = deque()
+        # True while a dispatch thread is working on, or is about to work on, this channel.
+        self._scheduled = False
+        self.processed = 0
+        self.last_submitted : Optional[float] = None
+
+    # Called on SDK threads. Waits while the channel has max_pending items queued.
+    def submit(self, action : Callable[[], None]) -> None :
+        with self._condition :
+            while len(self._pending) >= self._max_pending :
+                self._condition.wait()
+            self._pending.append(action)
+            self.last_submitted = monotonic()
+            if not self._scheduled :
+                self._scheduled = True
+                self._pool.submit(self._drain)
+
+    def pending(self) -> int :
+        with self._condition :
+            return len(self._pending)
+
+    # Wait until all queued work is done.
+    def wait(self) -> None :
+        with self._condition :
+            while self._scheduled :
+                self._condition.wait()
+
+    def _drain(self) -> None :
+        for _ in range(DRAIN_BATCH) :
+            with self._condition :
+                if not self._pending :
+                    self._scheduled = False
+                    self._condition.notify_all()
+                    return
+                action = self._pending.popleft()
+                self._condition.notify_all()
+            # The actions catch and report their own exceptions, as the recognizer callbacks do.
+            action()
+            self.processed += 1
+        # Go to the back of the pool's queue, so other channels get a turn.
+        self._pool.submit(self._drain)
+
+class Channel(object) :
+    def __init__(self, name : str, user_config : helper.Read_Only_Dict, dispatcher : ChannelDispatcher) :
+        self.name = name
+        self.user_config = user_config
+        self.dispatcher = dispatcher
+        self.state = "starting"
+        self.error : Optional[str] = None
+        self.audio_seconds = 0.0
+
+    def health(self) -> Dict :
+        return {
+            "name" : self.name,
+            "state" : self.state,
+            "events" : self.dispatcher.processed,
+            "pending" : self.dispatcher.pending(),
+            "seconds_since_last_event" : round(monotonic() - self.dispatcher.last_submitted, 1) if self.dispatcher.last_submitted is not None else None,
+            "audio_seconds" : round(self.audio_seconds, 1),
+            "error" : self.error,
+        }
+
+# Return the resident memory of this process in bytes, or None if we cannot tell.
+def resident_memory_bytes() -> Optional[int] :
+    try :
+        with open("/proc/self/statm", mode = "r") as f :
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, AttributeError) :
+        pass
+    if resource is not None :
+        # The peak rather than the current size. ru_maxrss is in KiB on Linux and bytes on macOS.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+def channels_from_user_config(user_config : helper.Read_Only_Dict, pool : ThreadPoolExecutor) -> List[Channel] :
+    with open(user_config["channels_file"], mode = "r", encoding = "utf-8") as f :
+        definitions = load(f)["channels"]
+    retval : List[Channel] = []
+    names = set()
+    for definition in definitions :
+        name = definition.get("name")
+        if name is None or name in names :
+            raise RuntimeError("Each channel in {} needs a unique name.".format(user_config["channels_file"]))
+        names.add(name)
+        # Channels share the rest of the configuration, so each one only holds its overrides. Their console output
+        # would be interleaved, so we print health lines instead.
+        overrides = { "suppress_console_output" : True }
+        for (key, value) in definition.items() :
+            if "name" == key :
+                continue
+            if key not in CHANNEL_OPTIONS :
+                raise RuntimeError("Channel {} has unknown key {}. Valid keys: name, {}".format(name, key, ", ".join(CHANNEL_OPTIONS.keys())))
+            if key in LIST_OPTIONS and isinstance(value, str) :
+                value = [item.strip() for item in value.split(";") if item.strip()]
+            overrides[CHANNEL_OPTIONS[key]] = value
+        channel_config = helper.user_config_with_overrides(user_config, overrides)
+        retval.append(Channel(name, channel_config, ChannelDispatcher(pool)))
+    return retval
+
+def health_from_channels(channels : List[Channel], start : float) -> Dict :
+    memory = resident_memory_bytes()
+    return {
+        "uptime_seconds" : round(monotonic() - start, 1),
+        "resident_memory_bytes" : memory,
+        # The channels share the process, so this is the average, not a measurement of each channel.
+        "resident_memory_bytes_per_channel" : memory // len(channels) if memory is not None and channels else None,
+        "channels" : [channel.health() for channel in channels],
+    }
+
+def text_from_health(health : Dict) -> str :
+    running = sum(1 for channel in health["channels"] if "running" == channel["state"])
+    memory = "unknown" if health["resident_memory_bytes"] is None else "{:.1f} MiB ({:.1f} MiB per channel)".format(health["resident_memory_bytes"] / 1048576, health["resident_memory_bytes_per_channel"] / 1048576)
+    retval = "{}: {} of {} channels running. Memory: {}.{}".format(strftime("%H:%M:%S"), running, len(health["channels"]), memory, linesep)
+    for channel in health["channels"] :
+        retval += "    {}: {}, {} events, {} pending".format(channel["name"], channel["state"], channel["events"], channel["pending"])
+        if channel["seconds_since_last_event"] is not None :
+            retval += ", last event {} s ago".format(channel["seconds_since_last_event"])
+        if channel["error"] is not None :
+            retval += ", error: {}".format(channel["error"])
+        retval += linesep
+    return retval
+
+# Run every channel in user_config["channels_file"] until all of them stop, and report their health
+# every user_config["health_interval_seconds"].
+# caption_session runs one session for the user_config it is given, with its caption work done by the dispatcher
+# it is given, and returns the seconds of audio it processed.
+def caption_channels(user_config : helper.Read_Only_Dict, caption_session : Callable[[helper.Read_Only_Dict, ChannelDispatcher], float]) -> List[Channel] :
+    if user_config["batch_input"] is not None :
+        raise RuntimeError("--channels is not valid with --batch.")
+    if user_config["use_stdin"] :
+        # Channels cannot share one stdin.
+        raise RuntimeError("--stdin is not valid with --channels. Use the ffmpeg key of each channel.")
+    if user_config["serve_port"] is not None :
+        # Every channel would try to listen on the same port.
+        raise RuntimeError("--serve is not valid with --channels.")
+    if user_config["parallel_sessions"] is not None :
+        raise RuntimeError("--parallel is not valid with --channels.")
+    start = monotonic()
+    pool = ThreadPoolExecutor(max_workers = user_config["dispatch_threads"])
+    channels = channels_from_user_config(user_config, pool)
+    print_lock = Lock()
+
+    def run_channel(channel : Channel) -> None :
+        channel.state = "running"
+        try :
+            channel.audio_seconds = caption_session(channel.user_config, channel.dispatcher)
+            channel.state = "stopped"
+        except Exception as ex :
+            channel.error = str(ex)
+            channel.state = "failed"
+        with print_lock :
+            print("{}: {} after {:.1f} s of audio.{}".format(channel.name, channel.state, channel.audio_seconds, " Error: {}".format(channel.error) if channel.error is not None else ""))
+
+    # Each channel waits for its session on a thread of its own. The caption work is done on the pool.
+    threads = [Thread(target = run_channel, args = (channel,), daemon = True) for channel in channels]
+    for thread in threads :
+        thread.start()
+    last_report = monotonic()
+    while any(thread.is_alive() for thread in threads) :
+        sleep(1)
+        if monotonic() - last_report >= user_config["health_interval_seconds"] :
+            last_report = monotonic()
+            report_health(user_config, channels, start, print_lock)
+    report_health(user_config, channels, start, print_lock)
+    pool.shutdown()
+    return channels
+
+def report_health(user_config : helper.Read_Only_Dict, channels : List[Channel], start : float, print_lock : Lock) -> None :
+    health = health_from_channels(channels, start)
+    if user_config["health_file"] is not None :
+        helper.write_file_atomically(user_config["health_file"], dumps(health, indent = 2) + "\n")
+    if not user_config["suppress_console_output"] :
+        with print_lock :
+            print(text_from_health(health), end = "", flush = True)
@@ -0,0 +1,100 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Saves the progress of a long offline session, so that if it is canceled or killed, it can continue with
+# --resume rather than recognize the whole input again. The checkpoint file is a JSON Lines file. The first
+# line says which input the checkpoint is for, and each line after it is one final result, as in result_cache.py:
+# {"input_file": "meeting.wav", "language": "en-US", "data_size": 345600000}
+# {"text": ..., "offset": ..., "duration": ..., "reason": ...}
+# data_size is the size of the data chunk of the input, so we can tell if --resume is given another input.
+# The recognizer reads ahead of its results, so audio after the last final result has been read but not
+# recognized. We resume at the end of the last final result, and recognize that audio again.
+# The first write replaces the file atomically. Each later write only appends the results that arrived since
+# the one before, so a write does not get slower as the session gets longer. If the process dies while
+# appending, the last line can be incomplete, and we ignore it when we resume.
+# This module does not import the Speech SDK.
+
+from json import JSONDecodeError, dumps, loads
+from os import fsync
+from os.path import basename, isfile
+from threading import Lock
+from time import monotonic
+from typing import Dict, List
+import caption_helper
+import helper
+import result_cache
+
+CHECKPOINT_FILE_EXTENSION = ".checkpoint.jsonl"
+DEFAULT_INTERVAL_SECONDS = 60
+
+def line_from_dict(value : Dict) -> str :
+    return dumps(value, ensure_ascii = False, separators = (",", ":")) + "\n"
+
+class Checkpoint(object) :
+    def __init__(self, checkpoint_file : str, input_file : str, language : str, data_size : int, interval_seconds : float) :
+        self._checkpoint_file = checkpoint_file
+        self._input_file = input_file
+        self._language = language
+        self._data_size = data_size
+        self._interval_seconds = interval_seconds
+        # Results arrive on SDK threads, and the checkpoint is written from the main thread.
+        self._lock = Lock()
+        # The results that have not been written to the checkpoint file yet.
+        self._results : List[Dict] = []
+        # Once we have written the checkpoint file, we only append to it.
+        self._started = False
+        self._last_write = monotonic()
+
+    def add_result(self, result : caption_helper.RecognitionResult) -> None :
+        record = result_cache.dict_from_result(result)
+        with self._lock :
+            self._results.append(record)
+
+    # Write the checkpoint if interval_seconds have passed since the last one.
+    def poll(self) -> None :
+        if monotonic() - self._last_write >= self._interval_seconds :
+            self.write()
+
+    def write(self) -> None :
+        with self._lock :
+            (results, self._results) = (self._results, [])
+            self._last_write = monotonic()
+        text = "".join(line_from_dict(record) for record in results)
+        if not self._started :
+            # Replace any checkpoint from a previous run. If we resumed from it, its results were added again.
+            header = line_from_dict({ "input_file" : basename(self._input_file), "language" : self._language, "data_size" : self._data_size })
+            helper.write_file_atomically(self._checkpoint_file, header + text)
+            self._started = True
+        elif text :
+            with open(self._checkpoint_file, mode = "a", newline = "", encoding = "utf-8") as f :
+                f.write(text)
+                f.flush()
+                fsync(f.fileno())
+
+# Return the final results saved in checkpoint_file, or an empty list if there is no checkpoint yet.
+def records_from_checkpoint(checkpoint_file : str, language : str, data_size : int) -> List[caption_helper.RecognitionRecord] :
+    if not isfile(checkpoint_file) :
+        return []
+    with open(checkpoint_file, mode = "r", encoding = "utf-8") as f :
+        lines = [line for line in f if line.strip()]
+    if not lines :
+        return []
+    checkpoint = loads(lines[0])
+    if checkpoint["data_size"] != data_size or checkpoint["language"] != language :
+        raise RuntimeError("{} is a checkpoint for {} in {}, with {} bytes of audio, not for this input and language.".format(
+            checkpoint_file, checkpoint["input_file"], checkpoint["language"], checkpoint["data_size"]))
+    retval : List[caption_helper.RecognitionRecord] = []
+    for (index, line) in enumerate(lines[1:], 2) :
+        try :
+            retval.append(result_cache.record_from_dict(loads(line)))
+        except JSONDecodeError :
+            # Only the last line can be incomplete, if the process died while appending it.
+            if index < len(lines) :
+                raise RuntimeError("Line {} of {} is not valid.".format(index, checkpoint_file))
+    return retval
+
+# Return where to resume recognition, in ticks: the end of the last final result.
+def resume_offset_from_records(records : List[caption_helper.RecognitionRecord]) -> int :
+    return max((record.offset + record.duration for record in records), default = 0)
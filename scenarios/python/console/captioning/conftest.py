@@ -0,0 +1,22 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Fixtures shared by the tests in this directory. Run with: python -m pytest -q
+
+import pytest
+
+# Replaces time.monotonic, so the tests decide how much time passes.
+# Patch the monotonic of the module under test with it, for example:
+# monkeypatch.setattr(delay_controller, "monotonic", clock)
+class Clock(object) :
+    def __init__(self) :
+        self.now = 100.0
+
+    def __call__(self) -> float :
+        return self.now
+
+@pytest.fixture
+def clock() -> Clock :
+    return Clock()
@@ -0,0 +1,128 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Chooses the real-time caption delay from how the recognizer behaves, rather than using a fixed --delay.
+# With a delay D, the caption for audio that ends at time E is shown at E + D. A partial result that is
+# later revised (the next partial result does not just add to its text) causes visible flicker only if the revision
+# arrives after the partial is shown. Likewise, a final result that arrives after E + D replaces text that
+# viewers already saw. So for each partial result we record how long after the end of its audio the revision
+# arrived, and for each final result how long after the end of its audio it arrived. Then we choose the
+# lowest D for which at most target_revision_rate of recent partial results, and of recent final results,
+# arrive too late, within [min_delay, max_delay].
+# Texts are compared without case and punctuation, because the recognizer often changes those without
+# changing the words. A final result is not compared with the last partial result of its utterance,
+# because the final text is usually formatted differently. Its lateness is recorded instead.
+# The controller must see every result, including partial results that --maxPartialRate replaces.
+# Arrival times are measured from when recognition starts, so this is only meaningful for live audio.
+
+from collections import deque
+from os import linesep
+from threading import Lock
+from time import monotonic
+from typing import Deque, List, Optional, Tuple
+from unicodedata import category
+import caption_helper
+import helper
+
+DEFAULT_MIN_DELAY_MILLISECONDS = 0
+DEFAULT_MAX_DELAY_MILLISECONDS = 5000
+DEFAULT_TARGET_REVISION_RATE = 0.05
+# How many recent partial and final results we choose the delay from.
+RECENT_SAMPLES = 500
+# How many results we wait for before the first change, so one utterance does not decide the delay.
+MIN_SAMPLES = 20
+# The most the delay changes after one utterance, so it settles rather than jumps.
+MAX_STEP_MILLISECONDS = 500
+
+# Return the lowest value that at most rate of samples exceed. None samples never exceed.
+def lowest_bound(samples : List[Optional[float]], rate : float) -> Optional[float] :
+    late = sorted((sample for sample in samples if sample is not None), reverse = True)
+    allowed = int(rate * len(samples))
+    return late[allowed] if allowed < len(late) else None
+
+# Return text in lower case, without punctuation, and with single spaces.
+def normalized_text(text : str) -> str :
+    return " ".join("".join(c for c in text.lower() if not category(c).startswith("P")).split())
+
+# True if text changes the words of previous_text, rather than adding to them.
+def is_revision(previous_text : str, text : str) -> bool :
+    return not normalized_text(text).startswith(normalized_text(previous_text))
+
+class DelayController(object) :
+    # All times are in ticks. If user_config is set, each new delay is logged to the console.
+    def __init__(self, initial_delay : int, min_delay : int, max_delay : int, target_revision_rate : float, user_config : Optional[helper.Read_Only_Dict] = None) :
+        self._min_delay = min_delay
+        self._max_delay = max(max_delay, min_delay)
+        self._delay = min(max(initial_delay, self._min_delay), self._max_delay)
+        self._target_revision_rate = target_revision_rate
+        self._user_config = user_config
+        # Results arrive on SDK threads.
+        self._lock = Lock()
+        self._start : Optional[float] = None
+        # The normalized text of the previous partial result in this utterance, and when its audio ended, in seconds.
+        self._previous_partial : Optional[Tuple[str, float]] = None
+        # For each recent partial result, how many seconds after its audio ended it was revised, or None.
+        self._revision_lateness : Deque[Optional[float]] = deque(maxlen = RECENT_SAMPLES)
+        # For each recent final result, how many seconds after its audio ended it arrived.
+        self._final_lateness : Deque[Optional[float]] = deque(maxlen = RECENT_SAMPLES)
+
+    # Call when the audio starts.
+    def start(self) -> None :
+        with self._lock :
+            self._start = monotonic()
+
+    def delay(self) -> int :
+        with self._lock :
+            return self._delay
+
+    # Return the new delay if this result changed it, or None.
+    def add_result(self, result : caption_helper.RecognitionResult, is_final_result : bool) -> Optional[int] :
+        with self._lock :
+            if self._start is None :
+                return None
+            now = monotonic() - self._start
+            end = (result.offset + result.duration) / helper.TICKS_PER_SECOND
+            if not is_final_result :
+                text = normalized_text(result.text)
+                if self._previous_partial is not None :
+                    (previous_text, previous_end) = self._previous_partial
+                    self._revision_lateness.append(None if text.startswith(previous_text) else now - previous_end)
+                self._previous_partial = (text, end)
+                return None
+            self._previous_partial = None
+            self._final_lateness.append(now - end)
+            return self._update()
+
+    # Call only while holding _lock.
+    def _update(self) -> Optional[int] :
+        if len(self._revision_lateness) + len(self._final_lateness) < MIN_SAMPLES :
+            return None
+        bounds = [bound for bound in [lowest_bound(list(self._revision_lateness), self._target_revision_rate), lowest_bound(list(self._final_lateness), self._target_revision_rate)] if bound is not None]
+        target = int(max(bounds) * helper.TICKS_PER_SECOND) if bounds else self._min_delay
+        target = min(max(target, self._min_delay), self._max_delay)
+        step = helper.ticks_from_milliseconds(MAX_STEP_MILLISECONDS)
+        delay = min(max(target, self._delay - step), self._delay + step)
+        if delay == self._delay :
+            return None
+        self._delay = delay
+        if self._user_config is not None :
+            helper.write_to_console(text="Delay: {:.3f} s (revision rate {:.1%} at this delay, over {} partial and {} final results).{}".format(
+                delay / helper.TICKS_PER_SECOND, self._revision_rate(delay), len(self._revision_lateness), len(self._final_lateness), linesep), user_config=self._user_config)
+        return delay
+
+    # Call only while holding _lock. The share of recent partial results that were revised after the given delay.
+    def _revision_rate(self, delay : int) -> float :
+        if not self._revision_lateness :
+            return 0.0
+        seconds = delay / helper.TICKS_PER_SECOND
+        return sum(1 for lateness in self._revision_lateness if lateness is not None and lateness > seconds) / len(self._revision_lateness)
+
+def delay_controller_from_user_config(user_config : helper.Read_Only_Dict) -> DelayController :
+    return DelayController(
+        initial_delay = user_config["delay"],
+        min_delay = user_config["min_delay"],
+        max_delay = user_config["max_delay"],
+        target_revision_rate = user_config["target_revision_rate"],
+        user_config = user_config)
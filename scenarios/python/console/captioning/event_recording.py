@@ -0,0 +1,154 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Records the events of a recognition session, with the time each one arrived, and plays them back.
+# Real-time captions depend on when Recognizing and Recognized events arrive, so a recording lets us
+# reproduce a session, and load-test the caption path, without audio or the Speech service.
+# A recording is a JSON Lines file. Each line is one event:
+# {"event": ..., "arrival": ..., "text": ..., "offset": ..., "duration": ..., "reason": ...}
+# event is recognizing, recognized, canceled or session_stopped. arrival is the seconds since recognition
+# started. The other fields are those of the event's result, as in result_cache.py. canceled and
+# session_stopped events have no result fields, and canceled has the name of the cancellation reason.
+# The first line can be a session_started event with the settings of the session, such as the stable
+# partial result threshold, that changed which events the recognizer sent. See sweep.py.
+# This module does not import the Speech SDK.
+
+from json import dumps, loads
+from threading import Lock, Thread
+from time import monotonic, perf_counter_ns, sleep
+from typing import Any, Callable, Dict, List, Optional
+import caption_helper
+import result_cache
+
+RECOGNIZING = "recognizing"
+RECOGNIZED = "recognized"
+CANCELED = "canceled"
+SESSION_STOPPED = "session_stopped"
+SESSION_STARTED = "session_started"
+
+class EventRecorder(object) :
+    # settings, if set, is saved with the session_started event.
+    def __init__(self, recording_file : str, settings : Optional[Dict] = None) :
+        # Events arrive on SDK threads.
+        self._lock = Lock()
+        self._start = monotonic()
+        # Opening with mode "w" replaces any recording from a previous run.
+        self._file = open(recording_file, mode = "w", newline = "", encoding = "utf-8")
+        if settings is not None :
+            self._file.write(dumps({ "event" : SESSION_STARTED, "arrival" : 0.0, "settings" : settings }, ensure_ascii = False, separators = (",", ":")) + "\n")
+
+    # Record the events of speech_recognizer, which can be a speechsdk.Recognizer or a ReplayRecognizer.
+    def connect(self, speech_recognizer : Any) -> None :
+        speech_recognizer.recognizing.connect(lambda e : self.write(RECOGNIZING, e.result))
+        speech_recognizer.recognized.connect(lambda e : self.write(RECOGNIZED, e.result))
+        speech_recognizer.canceled.connect(lambda e : self.write(CANCELED, None, e.cancellation_details.reason.name))
+        speech_recognizer.session_stopped.connect(lambda e : self.write(SESSION_STOPPED, None))
+
+    # Call when recognition starts.
+    def start(self) -> None :
+        self._start = monotonic()
+
+    def write(self, event : str, result : Optional[caption_helper.RecognitionResult], cancellation_reason : Optional[str] = None) -> None :
+        record = { "event" : event, "arrival" : round(monotonic() - self._start, 6) }
+        if result is not None :
+            record.update(result_cache.dict_from_result(result))
+        if cancellation_reason is not None :
+            record["cancellation_reason"] = cancellation_reason
+        line = dumps(record, ensure_ascii = False, separators = (",", ":")) + "\n"
+        with self._lock :
+            self._file.write(line)
+
+    def close(self) -> None :
+        with self._lock :
+            self._file.close()
+
+class RecordedEvent(object) :
+    def __init__(self, event : str, arrival : float, result : Optional[caption_helper.RecognitionRecord]) :
+        self.event = event
+        self.arrival = arrival
+        self.result = result
+
+def events_from_recording(recording_file : str) -> List[RecordedEvent] :
+    retval : List[RecordedEvent] = []
+    with open(recording_file, mode = "r", encoding = "utf-8") as f :
+        for line in f :
+            if line.strip() :
+                record = loads(line)
+                result = result_cache.record_from_dict(record) if "text" in record else None
+                retval.append(RecordedEvent(record["event"], record["arrival"], result))
+    return retval
+
+# Return the settings saved in recording_file, or an empty dict if it has none.
+def settings_from_recording(recording_file : str) -> Dict :
+    with open(recording_file, mode = "r", encoding = "utf-8") as f :
+        for line in f :
+            if line.strip() :
+                record = loads(line)
+                return record.get("settings", {}) if SESSION_STARTED == record["event"] else {}
+    return {}
+
+# Has the connect() method of a speechsdk.EventSignal.
+class ReplaySignal(object) :
+    def __init__(self) :
+        self._handlers : List[Callable[[Any], None]] = []
+
+    def connect(self, handler : Callable[[Any], None]) -> None :
+        self._handlers.append(handler)
+
+    def signal(self, event_args : Any) -> None :
+        for handler in self._handlers :
+            handler(event_args)
+
+# Has the event args properties that the handlers in captioning.py read.
+class ReplayEventArgs(object) :
+    def __init__(self, result : Optional[caption_helper.RecognitionRecord]) :
+        self.result = result
+
+# Has the parts of the speechsdk.Recognizer interface that captioning.py uses, and plays recorded events
+# to the connected handlers on a thread of its own, as the SDK does.
+# speed is how many times faster than recorded to play the events. If speed is 0, we do not wait between events.
+# A recorded canceled event ends the session, so we play it as session_stopped.
+class ReplayRecognizer(object) :
+    def __init__(self, events : List[RecordedEvent], speed : float) :
+        self._events = events
+        self._speed = speed
+        self.recognizing = ReplaySignal()
+        self.recognized = ReplaySignal()
+        self.canceled = ReplaySignal()
+        self.session_stopped = ReplaySignal()
+        self._thread = Thread(target = self._play, daemon = True)
+        self._stopped = False
+        # How long the handlers took for each event, in nanoseconds.
+        self.handler_ns : List[int] = []
+        # How late each event was played compared to the recording at speed, in seconds.
+        self.lag_seconds : List[float] = []
+        self.wall_seconds = 0.0
+
+    def start_continuous_recognition(self) -> None :
+        self._thread.start()
+
+    def stop_continuous_recognition(self) -> None :
+        self._stopped = True
+        self._thread.join()
+
+    def _play(self) -> None :
+        start = monotonic()
+        signals = { RECOGNIZING : self.recognizing, RECOGNIZED : self.recognized }
+        for event in self._events :
+            if SESSION_STARTED == event.event :
+                continue
+            if self._stopped or event.event not in signals :
+                break
+            if self._speed > 0 :
+                due = start + event.arrival / self._speed
+                wait = due - monotonic()
+                if wait > 0 :
+                    sleep(wait)
+                self.lag_seconds.append(max(0.0, monotonic() - due))
+            handler_start = perf_counter_ns()
+            signals[event.event].signal(ReplayEventArgs(event.result))
+            self.handler_ns.append(perf_counter_ns() - handler_start)
+        self.wall_seconds = monotonic() - start
+        self.session_stopped.signal(ReplayEventArgs(None))
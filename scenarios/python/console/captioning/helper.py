@@ -4,40 +4,70 @@
 #
 
 # Note: abc = abstract base classes
+from collections import ChainMap
 from collections.abc import Mapping
-from datetime import date, datetime, time, timedelta
+from os import SEEK_END, replace
+from os.path import splitext
+from struct import unpack
 from sys import argv
-from typing import Optional
-from pathlib import Path
-import azure.cognitiveservices.speech as speechsdk # type: ignore
+from typing import List, Optional, Tuple
 
 DEFAULT_MAX_LINE_LENGTH_SBCS = 37
 DEFAULT_MAX_LINE_LENGTH_MBCS = 30
+DEFAULT_SAMPLES_PER_SECOND = 16000
 
-# See speech_recognize_once_compressed_input() in:
-# https://github.com/Azure-Samples/cognitive-services-speech-sdk/blob/master/samples/python/console/speech_sample.py
-class BinaryFileReaderCallback(speechsdk.audio.PullAudioInputStreamCallback):
-    def __init__(self, filename: str):
-        super().__init__()
-        self._file_h = open(filename, "rb")
-
-    def read(self, buffer: memoryview) -> int:
-        try:
-            size = buffer.nbytes
-            frames = self._file_h.read(size)
-            buffer[:len(frames)] = frames
-            return len(frames)
-        except Exception as ex:
-            print('Exception in `read`: {}'.format(ex))
-            raise
-
-    def close(self) -> None:
-        print('closing file')
-        try:
-            self._file_h.close()
-        except Exception as ex:
-            print('Exception in `close`: {}'.format(ex))
-            raise
+# The format of a PCM WAV file and the location of its audio data.
+class WavHeader(object) :
+    def __init__(self, samples_per_second : int, bits_per_sample : int, channels : int, data_offset : int, data_size : int) :
+        self.samples_per_second = samples_per_second
+        self.bits_per_sample = bits_per_sample
+        self.channels = channels
+        self.data_offset = data_offset
+        self.data_size = data_size
+        self.block_align = channels * bits_per_sample // 8
+
+    def ticks_from_bytes(self, size : int) -> int :
+        return size // self.block_align * TICKS_PER_SECOND // self.samples_per_second
+
+    # Return the size of the audio from the start of the data chunk to ticks, rounded down to a whole block.
+    def bytes_from_ticks(self, ticks : int) -> int :
+        return min(ticks * self.samples_per_second // TICKS_PER_SECOND * self.block_align, self.data_size)
+
+def wav_header_from_file(filename : str) -> WavHeader :
+    with open(filename, "rb") as f :
+        return wav_header_from_stream(f, filename)
+
+# Walk the RIFF chunks of a WAV file to find the fmt and data chunks. See:
+# http://soundfile.sapp.org/doc/WaveFormat/
+# This leaves f positioned at the start of the data chunk.
+def wav_header_from_stream(f, filename : str) -> WavHeader :
+    file_size = f.seek(0, SEEK_END)
+    f.seek(0)
+    riff = f.read(12)
+    if len(riff) < 12 or riff[0:4] != b"RIFF" or riff[8:12] != b"WAVE" :
+        raise RuntimeError("{} is not a WAV file.".format(filename))
+    format_chunk : Optional[bytes] = None
+    while True :
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8 :
+            raise RuntimeError("{} has no data chunk.".format(filename))
+        chunk_id = chunk_header[0:4]
+        (chunk_size,) = unpack("<I", chunk_header[4:8])
+        if b"fmt " == chunk_id :
+            format_chunk = f.read(chunk_size)
+        elif b"data" == chunk_id :
+            if format_chunk is None or len(format_chunk) < 16 :
+                raise RuntimeError("{} has no fmt chunk before its data chunk.".format(filename))
+            (channels, samples_per_second, _, _, bits_per_sample) = unpack("<HIIHH", format_chunk[2:16])
+            data_offset = f.tell()
+            # Streaming writers can leave the data size as 0 or 0xFFFFFFFF, so do not read past the end of the file.
+            data_size = min(chunk_size, file_size - data_offset) if chunk_size > 0 else file_size - data_offset
+            return WavHeader(samples_per_second, bits_per_sample, channels, data_offset, data_size)
+        else :
+            f.seek(chunk_size, 1)
+        # Chunks are padded to an even size.
+        if chunk_size % 2 == 1 :
+            f.seek(1, 1)
 
 class Read_Only_Dict(Mapping):
     def __init__(self, data):
@@ -49,35 +79,78 @@ class Read_Only_Dict(Mapping):
     def __iter__(self):
         return iter(self._data)
 
-# See:
-# https://stackoverflow.com/a/12448721
-# https://stackoverflow.com/a/39651061
-def add_time_and_timedelta(t1 : time, t2 : timedelta) -> time :
-    return (datetime.combine(date.min, t1) + t2).time()
-
-def subtract_times(t1 : time, t2 : time) -> timedelta :
-    return datetime.combine(date.min, t1) - datetime.combine(date.min, t2)
-
-# We cannot simply create time with ticks.
-def time_from_ticks(ticks) -> time :
-    microseconds_1 = ticks / 10
-    microseconds_2 = microseconds_1 % 1000000
-    seconds_1 = microseconds_1 / 1000000
-    seconds_2 = seconds_1 % 60
-    minutes_1 = seconds_1 / 60
-    minutes_2 = minutes_1 % 60
-    hours = minutes_1 / 60
-    return time(int(hours), int(minutes_2), int(seconds_2), int(microseconds_2))
+# Return user_config with the values in overrides in place of its own. The result looks up each key in overrides,
+# then in user_config, rather than copying user_config, so many configs can share one base.
+def user_config_with_overrides(user_config : Read_Only_Dict, overrides : dict) -> Read_Only_Dict :
+    return Read_Only_Dict(ChainMap(overrides, user_config))
+
+# The caption timeline is kept in ticks (100-nanosecond units), which is how the Speech SDK reports
+# result offsets and durations. Timing math stays in plain integers, and there is no 24-hour limit.
+TICKS_PER_MILLISECOND = 10000
+TICKS_PER_SECOND = 10000000
+
+def ticks_from_milliseconds(milliseconds : float) -> int :
+    return int(milliseconds * TICKS_PER_MILLISECOND)
+
+# Format ticks as HH:MM:SS.mmm (or HH:MM:SS,mmm for SRT), truncated to milliseconds.
+# Hours are not wrapped, so a recording longer than a day gives, for example, 25:00:00.000.
+def timestamp_from_ticks(ticks : int, decimal_separator : str = ".") -> str :
+    seconds, milliseconds = divmod(ticks // TICKS_PER_MILLISECOND, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return "%02d:%02d:%02d%s%03d" % (hours, minutes, seconds, decimal_separator, milliseconds)
 
 def write_to_console(text : str, user_config : Read_Only_Dict) :
     if not user_config["suppress_console_output"] :
         print(text, end = "", flush = True)
     return
 
-def write_to_console_or_file(text : str, user_config : Read_Only_Dict) :
-    write_to_console(text = text, user_config = user_config)
-    if user_config["output_file"] is not None :
-        file_path = Path(user_config["output_file"])
-        with open(file_path, mode = "a", newline = "", encoding='utf-8') as f :
-            f.write(text)
-    return
+# Return the nearest-rank percentile of values, which must be sorted and not empty.
+def percentile_from_sorted(values : List[float], percentile : float) -> float :
+    return values[min(len(values) - 1, max(0, int(round(percentile / 100 * len(values))) - 1))]
+
+# Write a file so that readers see either the old or the new version, never a partial one.
+def write_file_atomically(filename : str, text : str) -> None :
+    temp_file = filename + ".tmp"
+    with open(temp_file, mode = "w", newline = "", encoding = "utf-8") as f :
+        f.write(text)
+    replace(temp_file, filename)
+
+
+# Return the output file for the captions in language: output_file with .language added before the extension.
+def output_file_from_language(output_file : Optional[str], language : str) -> Optional[str] :
+    if output_file is None :
+        return None
+    (root, extension) = splitext(output_file)
+    return "{}.{}{}".format(root, language, extension)
+
+# Return the output file for a variant from --formats and --layouts: output_file with its extension replaced by .variant.
+def output_file_from_variant(output_file : Optional[str], variant : str) -> Optional[str] :
+    if output_file is None :
+        return None
+    return "{}.{}".format(splitext(output_file)[0], variant)
+
+# Return the variant, caption format, maximum line length and number of lines of each combination of
+# --layouts and --formats other than the first format in the --maxLineLength and --lines layout.
+def caption_variants(user_config : Read_Only_Dict) -> List[Tuple[str, str, int, int]] :
+    retval : List[Tuple[str, str, int, int]] = []
+    layouts = [(None, user_config["max_line_length"], user_config["lines"])] + user_config["caption_layouts"]
+    for (layout, max_line_length, lines) in layouts :
+        for caption_format in [user_config["caption_format"]] + user_config["extra_caption_formats"] :
+            if layout is None and caption_format == user_config["caption_format"] :
+                # The output file itself has the first format in the --maxLineLength and --lines layout.
+                continue
+            variant = caption_format if layout is None else "{}.{}".format(layout, caption_format)
+            retval.append((variant, caption_format, max_line_length, lines))
+    return retval
+
+# Return every caption file a session writes: the output file, the file for each --translate language,
+# and the --formats and --layouts variants of each.
+def output_files_from_user_config(user_config : Read_Only_Dict) -> List[str] :
+    retval : List[str] = []
+    if user_config["output_file"] is None :
+        return retval
+    for output_file in [user_config["output_file"]] + [output_file_from_language(user_config["output_file"], language) for language in user_config["target_languages"]] :
+        retval.append(output_file)
+        retval += [output_file_from_variant(output_file, variant) for (variant, _, _, _) in caption_variants(user_config)]
+    return retval
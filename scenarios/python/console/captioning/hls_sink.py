@@ -0,0 +1,151 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Writes captions as WebVTT segments of a fixed duration, plus a sliding-window HLS media playlist,
+# for live streams. See:
+# https://datatracker.ietf.org/doc/html/rfc8216#section-3.5
+# https://datatracker.ietf.org/doc/html/rfc8216#section-6.2.2
+# A cue that spans a segment boundary is written to each segment it overlaps, clipped to the segment.
+# The playlist lists the last window segments. Segments that leave the playlist stay on disk for
+# window + 1 more segments, so players that fetched an older playlist can still get them, and are then deleted.
+
+from collections import deque
+from math import ceil
+from os import linesep, makedirs, remove
+from os.path import join
+from threading import Lock
+from time import monotonic
+from typing import Deque, Dict, List, Optional
+import caption_helper
+import caption_sink
+import helper
+
+PLAYLIST_FILE = "captions.m3u8"
+SEGMENT_FILE = "captions{}.vtt"
+DEFAULT_SEGMENT_SECONDS = 6
+DEFAULT_WINDOW = 5
+# RFC 8216 requires a live playlist to last at least three target durations.
+MINIMUM_WINDOW = 3
+# MPEG-TS timestamps use a 90 kHz clock and wrap at 33 bits.
+MPEGTS_TICKS_PER_SECOND = 90000
+MPEGTS_WRAP = 1 << 33
+
+# Has the same interface as caption_sink.CaptionSink, so Captioning can write to either.
+# If console_label is set, each line shown on the console starts with it, as in caption_sink.CaptionSink.
+# If live is True, segments are also published as the wall clock passes them, so the playlist
+# keeps advancing through silence. Live captions that arrive for a segment that was already
+# published are moved to the start of the first open segment.
+class HlsCaptionSink(object) :
+    def __init__(self, directory : str, suppress_console_output : bool, segment_seconds : float, window : int, mpegts_offset : int, live : bool, console_label : Optional[str] = None) :
+        makedirs(directory, exist_ok = True)
+        self._directory = directory
+        self._suppress_console_output = suppress_console_output
+        self._console_label = console_label
+        self._segment_ticks = max(1, int(segment_seconds * helper.TICKS_PER_SECOND))
+        self._target_duration = ceil(segment_seconds)
+        self._window = max(window, MINIMUM_WINDOW)
+        self._mpegts_offset = mpegts_offset
+        self._live = live
+        # Captions arrive on SDK threads, and poll() is called from the main thread.
+        self._lock = Lock()
+        self._start = monotonic()
+        # The index of the first segment that has not been published.
+        self._next_segment = 0
+        # The cues of each segment that has not been published.
+        self._cues : Dict[int, List[str]] = {}
+        # The segments in the playlist, and the segments that have left it but are still on disk.
+        self._playlist : Deque[int] = deque()
+        self._expired : Deque[int] = deque()
+        self._closed = False
+
+    # Text without a caption, such as the WebVTT file header, is only shown on the console.
+    # Each segment has its own header, so the header is only shown on the console.
+    def write_header(self, text : str) -> None :
+        self.write(text)
+
+    def write(self, text : str, caption : Optional[caption_helper.Caption] = None) -> None :
+        if not self._suppress_console_output :
+            print(caption_sink.labeled_text(text, self._console_label), end = "", flush = True)
+        if caption is None :
+            return
+        with self._lock :
+            # Captions arrive in order of their begin times, so no later caption can belong to an earlier segment.
+            self._publish_before(caption.begin // self._segment_ticks)
+            self._add_cue(caption)
+
+    def poll(self) -> None :
+        if not self._live :
+            return
+        with self._lock :
+            # Allow one segment for captions that are still on their way.
+            now = int((monotonic() - self._start) * helper.TICKS_PER_SECOND)
+            self._publish_before(now // self._segment_ticks - 1)
+
+    def close(self) -> None :
+        with self._lock :
+            if self._closed :
+                return
+            self._publish_before(max(self._cues.keys(), default = self._next_segment - 1) + 1)
+            self._closed = True
+            self._write_playlist()
+
+    def _add_cue(self, caption : caption_helper.Caption) -> None :
+        begin = max(caption.begin, self._next_segment * self._segment_ticks)
+        end = caption.end
+        for index in range(begin // self._segment_ticks, (end - 1) // self._segment_ticks + 1) :
+            cue_begin = max(begin, index * self._segment_ticks)
+            cue_end = min(end, (index + 1) * self._segment_ticks)
+            if cue_end > cue_begin :
+                self._cues.setdefault(index, []).append("{} --> {}{}{}{}{}".format(helper.timestamp_from_ticks(cue_begin), helper.timestamp_from_ticks(cue_end), linesep, caption.text, linesep, linesep))
+
+    # Publish every segment before the segment with index end, including segments with no cues,
+    # so the playlist has no gaps.
+    def _publish_before(self, end : int) -> None :
+        if self._next_segment >= end :
+            return
+        while self._next_segment < end :
+            self._write_segment(self._next_segment, self._cues.pop(self._next_segment, []))
+            self._next_segment += 1
+        self._write_playlist()
+
+    def _write_segment(self, index : int, cues : List[str]) -> None :
+        begin = index * self._segment_ticks
+        # Map the start of the segment to the matching MPEG-TS timestamp of the media, so players can
+        # place the cues even after the MPEG-TS clock wraps.
+        mpegts = (self._mpegts_offset + begin * MPEGTS_TICKS_PER_SECOND // helper.TICKS_PER_SECOND) % MPEGTS_WRAP
+        header = "WEBVTT{}X-TIMESTAMP-MAP=MPEGTS:{},LOCAL:{}{}{}".format(linesep, mpegts, helper.timestamp_from_ticks(begin), linesep, linesep)
+        helper.write_file_atomically(join(self._directory, SEGMENT_FILE.format(index)), header + "".join(cues))
+        self._playlist.append(index)
+        while len(self._playlist) > self._window :
+            self._expired.append(self._playlist.popleft())
+        while len(self._expired) > self._window + 1 :
+            try :
+                remove(join(self._directory, SEGMENT_FILE.format(self._expired.popleft())))
+            except FileNotFoundError :
+                pass
+
+    def _write_playlist(self) -> None :
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-TARGETDURATION:{}".format(self._target_duration),
+            "#EXT-X-MEDIA-SEQUENCE:{}".format(self._playlist[0] if self._playlist else 0),
+        ]
+        for index in self._playlist :
+            lines.append("#EXTINF:{:.3f},".format(self._segment_ticks / helper.TICKS_PER_SECOND))
+            lines.append(SEGMENT_FILE.format(index))
+        if self._closed :
+            lines.append("#EXT-X-ENDLIST")
+        helper.write_file_atomically(join(self._directory, PLAYLIST_FILE), "\n".join(lines) + "\n")
+
+def hls_sink_from_user_config(user_config : helper.Read_Only_Dict, live : bool) -> HlsCaptionSink :
+    return HlsCaptionSink(
+        directory = user_config["hls_directory"],
+        suppress_console_output = user_config["suppress_console_output"],
+        segment_seconds = user_config["hls_segment_seconds"],
+        window = user_config["hls_window"],
+        mpegts_offset = user_config["mpegts_offset"],
+        live = live,
+        console_label = caption_sink.console_label_from_user_config(user_config))
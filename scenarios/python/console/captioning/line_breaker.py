@@ -0,0 +1,172 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from itertools import accumulate, chain
+from typing import List, Optional, Pattern, Tuple
+import re
+import unicodedata
+
+# Line break candidates are positions in the text where a line can end (that is, the index just past
+# the last character of the line). Each candidate has a tier. When we choose where to end a line,
+# we take the last candidate in the highest tier that fits in the line, and only look at a lower tier
+# if no candidate in a higher tier fits. If no candidate fits, we break at the maximum line width,
+# moved back past any position where a line must not end (inside a grapheme cluster, or against
+# Chinese and Japanese line start and line end rules).
+# See:
+# http://unicode.org/reports/tr29/#Sentence_Boundaries
+# http://unicode.org/reports/tr29/#Word_Boundaries
+# http://unicode.org/reports/tr29/#Grapheme_Cluster_Boundaries
+
+# Characters that should not start a line in Chinese and Japanese text (closing punctuation, small kana,
+# and iteration marks).
+CJK_NO_LINE_START = "、。，．・：；？！ー～）」』】〕〉》〙〗〟’”ぁぃぅぇぉっゃゅょゎゕゖァィゥェォッャュョヮヵヶ々〻ゝゞヽヾ)]}.,!?:;%"
+# Characters that should not end a line in Chinese and Japanese text (opening punctuation).
+CJK_NO_LINE_END = "（「『【〔〈《〘〖〝‘“([{"
+# Thai leading vowels are written before the consonant they follow in speech, so they begin a syllable.
+THAI_LEADING_VOWELS = "เแโใไ"
+# Thai characters that end a syllable or phrase: sara a, paiyannoi and mai yamok.
+THAI_SYLLABLE_ENDS = "ะฯๆ"
+ZERO_WIDTH_JOINER = "‍"
+# '.' and ',' between letters or digits (3.14, 1,000, e.g, bing.com) do not end a sentence or clause.
+MID_WORD_TERMINATORS = ".,"
+
+CJK_NO_LINE_START_PATTERN = re.compile("[{}]".format(re.escape(CJK_NO_LINE_START)))
+CJK_NO_LINE_END_PATTERN = re.compile("[{}]".format(re.escape(CJK_NO_LINE_END)))
+THAI_LEADING_VOWEL_PATTERN = re.compile("(?<=[฀-๿])[{}]".format(THAI_LEADING_VOWELS))
+THAI_SYLLABLE_END_PATTERN = re.compile("[{}](?=[฀-๿])".format(THAI_SYLLABLE_ENDS))
+
+class LineBreakRules(object) :
+    # terminator_tiers lists, from highest to lowest tier, the characters after which a line can end.
+    # If break_between_ideographs is True, a line that has no other candidate can end between any two
+    # characters, except where Chinese and Japanese line start and line end rules forbid it.
+    # If break_thai_syllables is True, a line can also end at Thai syllable boundaries, in an extra lowest tier.
+    # If use_mbcs_width is True, the default maximum line width for multi-byte character sets is used.
+    def __init__(self, terminator_tiers : List[str], break_between_ideographs : bool = False, break_thai_syllables : bool = False, use_mbcs_width : bool = False) :
+        self.terminator_tiers = terminator_tiers
+        self.break_between_ideographs = break_between_ideographs
+        self.break_thai_syllables = break_thai_syllables
+        self.use_mbcs_width = use_mbcs_width
+
+DEFAULT_RULES = LineBreakRules(["?!,;", " ."])
+
+# Keyed by ISO 639-1 language code.
+RULES_BY_LANGUAGE = {
+    "zh" : LineBreakRules(["，、；？！?!,;", "。 "], break_between_ideographs = True, use_mbcs_width = True),
+    "ja" : LineBreakRules(["、，；？！?!,;", "。 "], break_between_ideographs = True, use_mbcs_width = True),
+    # Korean separates words with spaces and uses Western punctuation.
+    "ko" : LineBreakRules(["?!,;", " ."]),
+    # Thai separates phrases and sentences, but not words, with spaces.
+    "th" : LineBreakRules(["?!,;", " ."], break_thai_syllables = True),
+}
+
+def rules_from_language(language : Optional[str]) -> LineBreakRules :
+    if language is None :
+        return DEFAULT_RULES
+    iso639 = language.split('-')[0].lower()
+    return RULES_BY_LANGUAGE.get(iso639, DEFAULT_RULES)
+
+# Matches characters that attach to the preceding character: combining marks, variation selectors,
+# emoji modifiers, and zero width joiners along with the character that follows them.
+# We build the character class from the Unicode database the first time we need it.
+@lru_cache(maxsize=None)
+def grapheme_extend_pattern() -> Pattern :
+    ranges : List[str] = []
+    first = last = -1
+    for code_point in range(0x0300, 0x10000) :
+        if unicodedata.category(chr(code_point)) in ("Mn", "Mc", "Me") :
+            if code_point != last + 1 :
+                if first >= 0 :
+                    ranges.append("{}-{}".format(re.escape(chr(first)), re.escape(chr(last))))
+                first = code_point
+            last = code_point
+    ranges.append("{}-{}".format(re.escape(chr(first)), re.escape(chr(last))))
+    return re.compile("[{}{}\U0001f3fb-\U0001f3ff]|(?<={}).".format("".join(ranges), ZERO_WIDTH_JOINER, ZERO_WIDTH_JOINER), re.DOTALL)
+
+# Return the sorted positions just past each occurrence of terminator in text.
+# Splitting and summing the part lengths keeps the scan in native code, which matters for spaces,
+# because nearly every word is followed by one.
+def ends_of_terminator(text : str, terminator : str) -> List[int] :
+    if terminator not in text :
+        return []
+    ends = list(accumulate(map((1).__add__, map(len, text.split(terminator)))))
+    # The last part is not followed by the terminator.
+    ends.pop()
+    return ends
+
+# Break candidates for one text. Each kind of candidate is found with one scan of the text.
+# Once built, a BreakIndex can lay out the text for any maximum line width, with one bisect lookup per tier per line.
+class BreakIndex(object) :
+    def __init__(self, text : str, rules : LineBreakRules) :
+        self._length = len(text)
+        # One sorted list of candidate positions per tier.
+        self._tiers : List[List[int]] = []
+        for terminators in rules.terminator_tiers :
+            runs : List[List[int]] = []
+            for terminator in terminators :
+                ends = ends_of_terminator(text, terminator)
+                if terminator in MID_WORD_TERMINATORS :
+                    ends = [end for end in ends if not (text[end - 2 : end - 1].isalnum() and text[end : end + 1].isalnum())]
+                runs.append(ends)
+            # Each run is already sorted, so this merge is close to linear.
+            self._tiers.append(sorted(chain.from_iterable(runs)))
+
+        # Sorted positions where a line must not end. In most text these are rare, so we index them
+        # rather than every position between two ideographs where a line can end.
+        self._unbreakable : List[int] = []
+        # ASCII text has no ideographs, Thai or combining marks.
+        is_ascii = text.isascii()
+        if not is_ascii :
+            runs = [[match.start() for match in grapheme_extend_pattern().finditer(text)]]
+            if rules.break_between_ideographs :
+                runs.append([match.start() for match in CJK_NO_LINE_START_PATTERN.finditer(text)])
+                runs.append([match.end() for match in CJK_NO_LINE_END_PATTERN.finditer(text)])
+            self._unbreakable = sorted(set(chain.from_iterable(runs)))
+
+        if rules.break_thai_syllables :
+            thai_tier : List[int] = []
+            if not is_ascii :
+                thai_tier = sorted(chain(
+                    (match.start() for match in THAI_LEADING_VOWEL_PATTERN.finditer(text)),
+                    (match.end() for match in THAI_SYLLABLE_END_PATTERN.finditer(text))))
+            self._tiers.append(thai_tier)
+
+    # Return the length of the best line that starts at start_index and is at most max_width characters long.
+    def best_width(self, start_index : int, max_width : int) -> int :
+        remaining = self._length - start_index
+        if remaining < max_width :
+            return remaining
+        limit = start_index + max_width
+        for tier in self._tiers :
+            index = bisect_right(tier, limit)
+            if index and tier[index - 1] > start_index :
+                return tier[index - 1] - start_index
+        # No candidate fits, so break at the maximum width, moving back past positions where a line must not end.
+        end = limit
+        index = bisect_left(self._unbreakable, end)
+        while end > start_index + 1 and 0 <= index < len(self._unbreakable) and self._unbreakable[index] == end :
+            end -= 1
+            index -= 1
+        return end - start_index
+
+# Keeps the BreakIndex of the most recent text, so the caption layouts of one language can share it.
+# Break candidates do not depend on the maximum line width, so a text laid out in several layouts
+# (see --layouts in captioning.py) is analyzed once rather than once per layout.
+class BreakIndexCache(object) :
+    def __init__(self, rules : LineBreakRules) :
+        self.rules = rules
+        self._text : Optional[str] = None
+        self._base = 0
+        self._break_index : Optional[BreakIndex] = None
+
+    # Return a BreakIndex for text[base:], and the base it was built from. If we already have one for
+    # the same text from an earlier base, we return that, because it has the same candidates after base.
+    def break_index(self, text : str, base : int = 0) -> Tuple[BreakIndex, int] :
+        if self._break_index is None or base < self._base or text != self._text :
+            self._break_index = BreakIndex(text[base:] if base > 0 else text, self.rules)
+            self._text = text
+            self._base = base
+        return (self._break_index, self._base)
@@ -0,0 +1,106 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Rotates the caption file of a long-running session, so it does not grow without bound. The sink always
+# writes to the --output file. When that file reaches rotate_bytes, or has been open for rotate_interval_seconds,
+# the sink closes it, renames it to FILE with a number added before the extension (captions.00001.vtt), and
+# starts a new FILE, which begins with the file header again. The rename is atomic, so a reader that opens FILE
+# gets either the old file or the new one. If compress is True, renamed files are gzipped on a background
+# thread, and the uncompressed file is deleted once the .gz file is complete.
+# The manifest, FILE.manifest.json, lists the files in order with the span of caption time each one covers:
+# {
+#     "files" : [
+#         { "file" : "captions.00001.vtt.gz", "start" : 0.5, "end" : 3601.2, "captions" : 1234, "bytes" : 56789 },
+#         ...
+#     ]
+# }
+# file is relative to the directory of the manifest. start and end are in seconds, or null if the file has
+# no captions. bytes is the size before compression. The manifest is rewritten after each change.
+
+from concurrent.futures import ThreadPoolExecutor
+from gzip import GzipFile
+from json import dumps
+from os import remove, replace
+from os.path import basename, splitext
+from shutil import copyfileobj
+from threading import Lock
+from typing import Dict, List, Optional
+import helper
+
+MANIFEST_FILE_EXTENSION = ".manifest.json"
+COMPRESSED_FILE_EXTENSION = ".gz"
+
+class OutputRotation(object) :
+    def __init__(self, output_file : str, rotate_bytes : Optional[int], rotate_interval_seconds : Optional[float], compress : bool) :
+        self._output_file = output_file
+        self._rotate_bytes = rotate_bytes
+        self._rotate_interval_seconds = rotate_interval_seconds
+        self._manifest_file = output_file + MANIFEST_FILE_EXTENSION
+        # The manifest is changed by the sink and by the compression thread.
+        self._lock = Lock()
+        self._files : List[Dict] = []
+        self._rotated_count = 0
+        # One thread, so files are compressed in order and compression does not compete with captioning.
+        self._compressor : Optional[ThreadPoolExecutor] = ThreadPoolExecutor(max_workers = 1) if compress else None
+
+    # True if a file that has file_bytes, and was opened at opened (from time.monotonic), should be rotated at now.
+    def is_due(self, file_bytes : int, opened : float, now : float) -> bool :
+        return (self._rotate_bytes is not None and file_bytes >= self._rotate_bytes) or (self._rotate_interval_seconds is not None and now - opened >= self._rotate_interval_seconds)
+
+    # Return the name to rename the current file to.
+    def next_file_name(self) -> str :
+        self._rotated_count += 1
+        (root, extension) = splitext(self._output_file)
+        return "{}.{:05d}{}".format(root, self._rotated_count, extension)
+
+    # Add a closed file to the manifest. start and end are the span of its captions, in ticks.
+    # index_file is its caption index, if there is one. The index is not compressed, because it is read in place.
+    def add_file(self, file_name : str, start : Optional[int], end : Optional[int], captions : int, size : int, index_file : Optional[str] = None, compress : bool = True) -> None :
+        entry = {
+            "file" : basename(file_name),
+            "start" : start / helper.TICKS_PER_SECOND if start is not None else None,
+            "end" : end / helper.TICKS_PER_SECOND if end is not None else None,
+            "captions" : captions,
+            "bytes" : size,
+        }
+        if index_file is not None :
+            entry["index"] = basename(index_file)
+        with self._lock :
+            self._files.append(entry)
+            self._write_manifest()
+        if compress and self._compressor is not None :
+            self._compressor.submit(self._compress, file_name, entry)
+
+    # Add the last file, which keeps the name of the output file and is not compressed, and wait for compression to finish.
+    def close(self, start : Optional[int], end : Optional[int], captions : int, size : int, index_file : Optional[str] = None) -> None :
+        if self._compressor is not None :
+            self._compressor.shutdown(wait = True)
+            self._compressor = None
+        self.add_file(self._output_file, start, end, captions, size, index_file, compress = False)
+
+    def _compress(self, file_name : str, entry : Dict) -> None :
+        compressed_file = file_name + COMPRESSED_FILE_EXTENSION
+        temp_file = compressed_file + ".tmp"
+        try :
+            with open(file_name, mode = "rb") as source, GzipFile(temp_file, mode = "wb") as target :
+                copyfileobj(source, target)
+            # Only list the compressed file once it is complete.
+            replace(temp_file, compressed_file)
+            with self._lock :
+                entry["file"] = basename(compressed_file)
+                self._write_manifest()
+            remove(file_name)
+        except OSError as ex :
+            # The uncompressed file is still listed, so nothing is lost.
+            print("Could not compress {}: {}".format(file_name, ex))
+
+    # Call only while holding _lock.
+    def _write_manifest(self) -> None :
+        helper.write_file_atomically(self._manifest_file, dumps({ "files" : self._files }, indent = 2) + "\n")
+
+def output_rotation_from_user_config(user_config : helper.Read_Only_Dict) -> Optional[OutputRotation] :
+    if user_config["output_file"] is None or (user_config["rotate_bytes"] is None and user_config["rotate_interval_seconds"] is None) :
+        return None
+    return OutputRotation(user_config["output_file"], user_config["rotate_bytes"], user_config["rotate_interval_seconds"], user_config["compress_rotated"])
@@ -0,0 +1,79 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Limits how often partial (Recognizing) results reach the caption path. The recognizer can send several
+# partial results within a few milliseconds, each adding a word to the one before, and in real-time mode each
+# one makes a caption, a write, and an update to every viewer. With a maximum rate, a partial result that
+# arrives too soon after the previous one is held, and a newer partial result replaces it, so superseded
+# results are dropped before they are captioned. The held result is passed on when the interval has passed,
+# so the caption does not fall behind when the speaker pauses. A final result is always passed on at once,
+# and replaces any held partial result.
+# This module does not import the Speech SDK.
+
+from threading import Lock, Timer
+from time import monotonic
+from typing import Callable, Optional
+import caption_helper
+
+class PartialCoalescer(object) :
+    # emit is called with each result and whether it is final, in the order the results are passed on.
+    # It is called on the thread that added the result, or on a timer thread for a held partial result.
+    def __init__(self, max_partial_rate : float, emit : Callable[[caption_helper.RecognitionResult, bool], None]) :
+        self._interval_seconds = 1 / max_partial_rate
+        self._emit = emit
+        # Results arrive on SDK threads, and held results are passed on from a timer thread. We hold the lock
+        # while we call emit, so results are passed on in order.
+        self._lock = Lock()
+        self._last_emit : Optional[float] = None
+        self._held : Optional[caption_helper.RecognitionResult] = None
+        self._timer : Optional[Timer] = None
+        # Counts the timers we start, so a timer that fires after it was canceled does nothing.
+        self._timer_generation = 0
+        # How many partial results were replaced by a newer result before they were passed on.
+        self.coalesced_results = 0
+
+    def add_result(self, result : caption_helper.RecognitionResult, is_final_result : bool) -> None :
+        with self._lock :
+            now = monotonic()
+            if self._held is not None :
+                self._held = None
+                self.coalesced_results += 1
+            if is_final_result or self._last_emit is None or now - self._last_emit >= self._interval_seconds :
+                self._cancel_timer()
+                self._emit_locked(result, is_final_result, now)
+            else :
+                self._held = result
+                if self._timer is None :
+                    self._timer_generation += 1
+                    self._timer = Timer(self._interval_seconds - (now - self._last_emit), self._emit_held, args = (self._timer_generation,))
+                    self._timer.daemon = True
+                    self._timer.start()
+
+    # Pass on the held partial result, if there is one. Call when the results stop.
+    def flush(self) -> None :
+        with self._lock :
+            self._cancel_timer()
+            if self._held is not None :
+                self._emit_locked(self._held, False, monotonic())
+
+    def _emit_held(self, generation : int) -> None :
+        with self._lock :
+            if self._timer is None or generation != self._timer_generation :
+                return
+            self._timer = None
+            if self._held is not None :
+                self._emit_locked(self._held, False, monotonic())
+
+    # Call only while holding _lock.
+    def _emit_locked(self, result : caption_helper.RecognitionResult, is_final_result : bool, now : float) -> None :
+        self._held = None
+        self._last_emit = now
+        self._emit(result, is_final_result)
+
+    # Call only while holding _lock.
+    def _cancel_timer(self) -> None :
+        if self._timer is not None :
+            self._timer.cancel()
+            self._timer = None
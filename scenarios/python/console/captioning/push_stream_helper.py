@@ -0,0 +1,108 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Feeds raw PCM audio from a pipe (stdin, or the output of an ffmpeg process) to the Speech SDK as it arrives,
+# so recognition starts with the first frames and we never write the audio to disk. See:
+# https://docs.microsoft.com/azure/cognitive-services/speech-service/how-to-use-audio-input-streams
+# A reader thread copies the pipe into a bounded ring buffer, and a writer thread copies the ring buffer
+# into a PushAudioInputStream. See ring_buffer.py. When the ring buffer is full, the reader stops reading, so the pipe fills
+# and the process writing to it waits. Memory use does not grow if the source is faster than recognition.
+
+from collections import deque
+from subprocess import DEVNULL, PIPE, Popen
+from threading import Thread
+from typing import BinaryIO, Deque
+import azure.cognitiveservices.speech as speechsdk # type: ignore
+import audio_helper
+import helper
+import ring_buffer
+
+# How much audio the ring buffer holds.
+RING_BUFFER_SECONDS = 10
+# How much audio we read from the pipe, or write to the SDK, at a time.
+CHUNK_MILLISECONDS = 100
+# How many lines of ffmpeg error output to show if it fails.
+FFMPEG_ERROR_LINES = 20
+
+class PushAudioFeeder(object) :
+    # pcm_format describes the audio in source. Its data_offset and data_size are not used.
+    def __init__(self, source : BinaryIO, pcm_format : helper.WavHeader) :
+        self._source = source
+        self.pcm_format = pcm_format
+        bytes_per_second = pcm_format.samples_per_second * pcm_format.block_align
+        self._chunk_size = max(pcm_format.block_align, bytes_per_second * CHUNK_MILLISECONDS // 1000 // pcm_format.block_align * pcm_format.block_align)
+        self._ring_buffer = ring_buffer.RingBuffer(bytes_per_second * RING_BUFFER_SECONDS)
+        self.stream = speechsdk.audio.PushAudioInputStream(stream_format=audio_helper.audio_stream_format_from_wav_header(pcm_format))
+        self.bytes_pushed = 0
+        self._reader = Thread(target=self._read_source, daemon=True)
+        self._writer = Thread(target=self._write_stream, daemon=True)
+
+    def start(self) -> None :
+        self._reader.start()
+        self._writer.start()
+
+    def close(self) -> None :
+        self._ring_buffer.close()
+        self._writer.join()
+
+    def _read_source(self) -> None :
+        try :
+            while True :
+                # read1 returns as soon as some data is available, rather than waiting for a full chunk.
+                data = self._source.read1(self._chunk_size)
+                # Stop if recognition has finished.
+                if not data or not self._ring_buffer.write(data) :
+                    break
+        except Exception as ex :
+            print('Exception in `_read_source`: {}'.format(ex))
+        finally :
+            self._ring_buffer.close()
+
+    def _write_stream(self) -> None :
+        try :
+            while True :
+                data = self._ring_buffer.read(self._chunk_size)
+                if not data :
+                    break
+                self.stream.write(data)
+                self.bytes_pushed += len(data)
+        finally :
+            # Closing the stream tells the SDK it has reached the end of the audio.
+            self.stream.close()
+
+# Runs ffmpeg to decode any audio or video source it supports into raw PCM on its stdout.
+class FfmpegProcess(object) :
+    def __init__(self, source : str, samples_per_second : int) :
+        arguments = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-i", source, "-vn", "-ac", "1", "-ar", str(samples_per_second), "-f", "s16le", "-"]
+        try :
+            self._process = Popen(arguments, stdin=DEVNULL, stdout=PIPE, stderr=PIPE)
+        except FileNotFoundError :
+            raise RuntimeError("--ffmpeg requires ffmpeg. Install it and add it to the PATH.")
+        self.stdout : BinaryIO = self._process.stdout
+        # Read stderr as it arrives, so ffmpeg never blocks on a full stderr pipe.
+        self._error_lines : Deque[str] = deque(maxlen=FFMPEG_ERROR_LINES)
+        self._error_reader = Thread(target=self._read_errors, daemon=True)
+        self._error_reader.start()
+
+    def _read_errors(self) -> None :
+        for line in self._process.stderr :
+            self._error_lines.append(line.decode("utf-8", errors="replace").rstrip())
+
+    # Stop ffmpeg if it is still running, and report if it failed.
+    def close(self) -> None :
+        if self._process.poll() is None :
+            self._process.terminate()
+            self._process.wait()
+            return
+        self._error_reader.join()
+        if 0 != self._process.returncode :
+            # Error output should not be suppressed, even if suppress output flag is set.
+            print("ffmpeg exited with code {}:".format(self._process.returncode))
+            for line in self._error_lines :
+                print(line)
+
+def pcm_format_from_user_config(user_config : helper.Read_Only_Dict) -> helper.WavHeader :
+    # Both stdin input and ffmpeg output are 16-bit mono PCM.
+    return helper.WavHeader(samples_per_second=user_config["samples_per_second"], bits_per_sample=16, channels=1, data_offset=0, data_size=0)
@@ -0,0 +1,79 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Plays back the recognizer events that captioning.py recorded with --record, through the same handlers and
+# caption path as a live session, without audio or the Speech service. Events are played at the times they
+# arrived, or faster, so we can reproduce real-time caption behavior and load-test the output.
+# The Speech SDK must be installed, because captioning.py imports it, but it is not used to recognize.
+
+from os import linesep
+from typing import List
+import captioning
+import event_recording
+import helper
+import user_config_helper
+
+USAGE = """Usage: python replay.py --input FILE [...]
+
+  HELP
+    --help                           Show this help and stop.
+
+  INPUT
+    --input FILE                     Play back the events recorded to FILE with captioning.py --record.
+    --speed FACTOR                   Play the events FACTOR times faster than they were recorded, or as fast as possible with max.
+                                     Default is 1.
+
+  MODE AND OUTPUT
+    The MODE, TRANSLATION and OUTPUT options of captioning.py, such as --realTime, --output, --srt, --delay,
+    --metrics, --serve and --hls, work as they do there. --translate needs a recording of a session with
+    the same target languages. Run python captioning.py --help to see them. --checkpoint is not valid,
+    because FILE is a recording rather than audio.
+"""
+
+def speed_from_args() -> float :
+    s_speed = user_config_helper.get_cmd_option("--speed")
+    if s_speed is None :
+        return 1.0
+    # 0 means no waiting between events. See event_recording.ReplayRecognizer.
+    if "max" == s_speed.lower() :
+        return 0.0
+    speed = float(s_speed)
+    if speed <= 0 :
+        raise RuntimeError("--speed must be greater than 0, or max.{}{}".format(linesep, USAGE))
+    return speed
+
+def replay_session(user_config : helper.Read_Only_Dict, speed : float) -> event_recording.ReplayRecognizer :
+    if user_config["input_file"] is None :
+        raise RuntimeError("Please provide a recording with the --input option.{}{}".format(linesep, USAGE))
+    if user_config["checkpoint_file"] is not None :
+        # A checkpoint records how much of a WAV file was read, and --input is a recording.
+        raise RuntimeError("--checkpoint is not valid with replay.py.{}{}".format(linesep, USAGE))
+    speech_recognizer = event_recording.ReplayRecognizer(event_recording.events_from_recording(user_config["input_file"]), speed)
+    session = captioning.Captioning(user_config)
+    session.initialize()
+    session.recognize_continuous(speech_recognizer=speech_recognizer, format=None, callback=None, stream=None)
+    session.finish()
+    return speech_recognizer
+
+def summary_from_replay(speech_recognizer : event_recording.ReplayRecognizer) -> str :
+    handler_us : List[float] = sorted(ns / 1000 for ns in speech_recognizer.handler_ns)
+    if not handler_us :
+        return "No events were played."
+    retval = "Played {} events in {:.2f} s ({:.0f} events per second).{}".format(len(handler_us), speech_recognizer.wall_seconds, len(handler_us) / speech_recognizer.wall_seconds if speech_recognizer.wall_seconds > 0 else 0, linesep)
+    retval += "Handler time per event: p50 {:.1f} us, p90 {:.1f} us, p99 {:.1f} us, max {:.1f} us.".format(
+        helper.percentile_from_sorted(handler_us, 50), helper.percentile_from_sorted(handler_us, 90), helper.percentile_from_sorted(handler_us, 99), handler_us[-1])
+    if speech_recognizer.lag_seconds :
+        lag_ms = sorted(seconds * 1000 for seconds in speech_recognizer.lag_seconds)
+        retval += "{}Lag behind the recorded timing: p50 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms.".format(linesep, helper.percentile_from_sorted(lag_ms, 50), helper.percentile_from_sorted(lag_ms, 99), lag_ms[-1])
+    return retval
+
+if __name__ == "__main__" :
+    if user_config_helper.cmd_option_exists("--help") :
+        print(USAGE)
+    else :
+        user_config = user_config_helper.user_config_from_args(USAGE, connect=False)
+        speech_recognizer = replay_session(user_config, speed_from_args())
+        # The summary is the point of a replay, so it is not suppressed by --quiet.
+        print(summary_from_replay(speech_recognizer))
@@ -0,0 +1,141 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Renders captions again from the recognition results that captioning.py saved with --cache.
+# This script, and the modules it uses, do not import the Speech SDK and make no service calls,
+# so it runs without the SDK installed.
+
+from os import linesep, listdir, makedirs
+from os.path import basename, isdir, isfile, join, splitext
+from time import perf_counter
+from typing import List, Optional, Sequence, Tuple
+import caption_helper
+import caption_renderer
+import caption_sink
+import helper
+import result_cache
+import user_config_helper
+
+USAGE = """Usage: python rerender.py --input PATH [...]
+
+  HELP
+    --help                           Show this help and stop.
+
+  INPUT
+    --input PATH                     Render captions from result cache file PATH, or from every .jsonl file in directory PATH.
+    --track LANG                     Render the captions for translation target language LANG, rather than the recognition language.
+                                     The results must have been cached from a session with --translate.
+    --language LANG                  The language to use when breaking captions into lines.
+                                     Default is the language saved in the cache, or LANG from --track.
+
+  MODE
+    --offline                        Output offline results.
+                                     Overrides --realTime.
+    --realTime                       Output real-time results. Best with results cached with --cachePartials.
+                                     Default output mode is offline.
+    --stream                         Write each offline caption as soon as the caption after it is rendered.
+                                     Valid only in offline mode.
+
+  OUTPUT
+    --output FILE                    Output captions to FILE. Valid only with a cache file.
+    --outputDir DIR                  Write the captions for each cache file to DIR (default is next to each cache file.)
+                                     Each caption file has the name of its cache file, with the extension of the format.
+                                     Valid only with a directory.
+    --srt                            Output captions in SubRip Text format (default format is WebVTT.)
+    --formats FORMAT                 Output captions in FORMAT. Overrides --srt. Unlike captioning.py, only one format is valid.
+                                     Valid values: vtt, srt, json
+    --maxLineLength LENGTH           Set the maximum number of characters per line for a caption to LENGTH.
+                                     Minimum is 20. Default is 37 (30 for Chinese and Japanese).
+    --lines LINES                    Set the number of lines for a caption to LINES.
+                                     Minimum is 1. Default is 2.
+    --delay MILLISECONDS             How many MILLISECONDS to delay the appearance of each caption.
+                                     Minimum is 0. Default is 1000.
+    --remainTime MILLISECONDS        How many MILLISECONDS a caption should remain on screen if it is not replaced by another.
+                                     Minimum is 0. Default is 1000.
+    --index                          Also write a caption index to FILE.idx. See caption_index.py.
+    --quiet                          Suppress console output, except errors.
+"""
+
+def cache_files_from_directory(directory : str) -> List[str] :
+    return [join(directory, name) for name in sorted(listdir(directory)) if splitext(name)[1].lower() == result_cache.CACHE_FILE_EXTENSION and isfile(join(directory, name))]
+
+# Return each cache file with the caption file to write it to.
+def jobs_from_user_config(user_config : helper.Read_Only_Dict) -> List[Tuple[str, Optional[str]]] :
+    input_path = user_config["input_file"]
+    if input_path is None :
+        raise RuntimeError("Please provide a result cache file or directory with the --input option.{}{}".format(linesep, USAGE))
+    if not isdir(input_path) :
+        if user_config["batch_output_directory"] is not None :
+            raise RuntimeError("--outputDir is valid only when --input is a directory.{}{}".format(linesep, USAGE))
+        return [(input_path, user_config["output_file"])]
+    if user_config["output_file"] is not None :
+        raise RuntimeError("--output is valid only when --input is a file. Use --outputDir.{}{}".format(linesep, USAGE))
+    extension = "." + user_config["caption_format"]
+    output_directory = user_config["batch_output_directory"]
+    retval : List[Tuple[str, Optional[str]]] = []
+    for cache_file in cache_files_from_directory(input_path) :
+        output_file = splitext(cache_file)[0] + extension
+        if output_directory is not None :
+            output_file = join(output_directory, basename(output_file))
+        retval.append((cache_file, output_file))
+    return retval
+
+# Return how many captions were written.
+def rerender(user_config : helper.Read_Only_Dict, cache_file : str, output_file : Optional[str]) -> int :
+    track = user_config_helper.get_cmd_option("--track")
+    language = user_config["language"]
+    if not user_config_helper.cmd_option_exists("--language") :
+        language = track if track is not None else result_cache.language_from_cache(cache_file) or language
+    user_config = helper.Read_Only_Dict(dict(user_config, language = language, output_file = output_file))
+    renderer = caption_renderer.CaptionRenderer(user_config)
+    sink = caption_sink.caption_sink_from_user_config(user_config)
+    if renderer.file_header() :
+        sink.write_header(renderer.file_header())
+    captions = 0
+
+    def write_captions(new_captions : Sequence[caption_helper.Caption]) -> None :
+        nonlocal captions
+        for caption in new_captions :
+            sink.write(text=renderer.string_from_caption(caption), caption=caption)
+            captions += 1
+
+    try :
+        for record in result_cache.records_from_cache(cache_file) :
+            if track is not None :
+                record = caption_helper.RecognitionRecord.from_translation(record, track)
+            if 0 == len(record.text) :
+                continue
+            is_final_result = caption_helper.reason_name(record.reason) in caption_helper.FINAL_RESULT_REASONS
+            write_captions(renderer.captions_from_result(record, is_final_result))
+        write_captions(renderer.final_captions())
+        if renderer.file_footer() :
+            sink.write(text=renderer.file_footer())
+    finally :
+        sink.close()
+    return captions
+
+def rerender_all(user_config : helper.Read_Only_Dict) -> None :
+    if user_config["extra_caption_formats"] or user_config["caption_layouts"] :
+        # Rendering from the cache is cheap, so we render one format and layout per run.
+        raise RuntimeError("rerender.py writes one format and layout. Run it once for each.{}{}".format(linesep, USAGE))
+    jobs = jobs_from_user_config(user_config)
+    if isdir(user_config["input_file"]) :
+        # Print a summary line per file, rather than every caption.
+        if user_config["batch_output_directory"] is not None :
+            makedirs(user_config["batch_output_directory"], exist_ok = True)
+        start = perf_counter()
+        for (cache_file, output_file) in jobs :
+            captions = rerender(helper.Read_Only_Dict(dict(user_config, suppress_console_output = True)), cache_file, output_file)
+            helper.write_to_console(text="{}: {} captions -> {}{}".format(cache_file, captions, output_file, linesep), user_config=user_config)
+        helper.write_to_console(text="{}Rendered {} files in {:.2f} s.{}".format(linesep, len(jobs), perf_counter() - start, linesep), user_config=user_config)
+    else :
+        (cache_file, output_file) = jobs[0]
+        rerender(user_config, cache_file, output_file)
+
+if __name__ == "__main__" :
+    if user_config_helper.cmd_option_exists("--help") :
+        print(USAGE)
+    else :
+        rerender_all(user_config_helper.user_config_from_args(USAGE, connect=False))
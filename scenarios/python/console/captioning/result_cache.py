@@ -0,0 +1,69 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Saves recognition results to a JSON Lines file, so captions can be rendered again with different
+# line, timing or format options (see rerender.py) without calling the Speech service.
+# Each line is one result:
+# {"text": ..., "offset": ..., "duration": ..., "reason": ..., "language": ...}
+# offset and duration are in ticks. reason is the name of a speechsdk.ResultReason member, for example
+# RecognizingSpeech for a partial result and RecognizedSpeech for a final result. Translation results
+# also have "translations", which maps each target language to the translated text.
+# This module does not import the Speech SDK.
+
+from json import dumps, loads
+from threading import Lock
+from typing import Dict, Iterator, Optional
+import caption_helper
+
+CACHE_FILE_EXTENSION = ".jsonl"
+
+# Return the fields of result that we save. See also event_recording.py.
+def dict_from_result(result : caption_helper.RecognitionResult) -> Dict :
+    retval = {
+        "text" : result.text,
+        "offset" : result.offset,
+        "duration" : result.duration,
+        "reason" : caption_helper.reason_name(result.reason),
+    }
+    translations = caption_helper.translations_from_result(result)
+    if translations :
+        retval["translations"] = translations
+    return retval
+
+def record_from_dict(value : Dict) -> caption_helper.RecognitionRecord :
+    return caption_helper.RecognitionRecord(value["text"], value["offset"], value["duration"], value["reason"], value.get("translations"))
+
+class ResultCacheWriter(object) :
+    def __init__(self, cache_file : str, language : str) :
+        self._language = language
+        # Results arrive on SDK threads.
+        self._lock = Lock()
+        # Opening with mode "w" replaces any cache from a previous run.
+        self._file = open(cache_file, mode = "w", newline = "", encoding = "utf-8")
+
+    def write(self, result : caption_helper.RecognitionResult) -> None :
+        record = dict_from_result(result)
+        record["language"] = self._language
+        line = dumps(record, ensure_ascii = False, separators = (",", ":")) + "\n"
+        with self._lock :
+            self._file.write(line)
+
+    def close(self) -> None :
+        with self._lock :
+            self._file.close()
+
+def records_from_cache(cache_file : str) -> Iterator[caption_helper.RecognitionRecord] :
+    with open(cache_file, mode = "r", encoding = "utf-8") as f :
+        for line in f :
+            if line.strip() :
+                yield record_from_dict(loads(line))
+
+# Return the recognition language of the results in cache_file, or None if it has no results.
+def language_from_cache(cache_file : str) -> Optional[str] :
+    with open(cache_file, mode = "r", encoding = "utf-8") as f :
+        for line in f :
+            if line.strip() :
+                return loads(line)["language"]
+    return None
@@ -0,0 +1,55 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# A bounded byte buffer between one writer thread and one reader thread. The writer blocks while the buffer
+# is full, so memory use does not grow if the writer is faster than the reader. See push_stream_helper.py.
+# This module does not import the Speech SDK.
+
+from threading import Condition
+
+class RingBuffer(object) :
+    def __init__(self, capacity : int) :
+        self._buffer = bytearray(capacity)
+        self._start = 0
+        self._size = 0
+        self._closed = False
+        self._condition = Condition()
+
+    # Block while the buffer is full. Return False if the buffer was closed, so the data was not all written.
+    def write(self, data : bytes) -> bool :
+        view = memoryview(data)
+        while len(view) > 0 :
+            with self._condition :
+                while len(self._buffer) == self._size and not self._closed :
+                    self._condition.wait()
+                if self._closed :
+                    return False
+                end = (self._start + self._size) % len(self._buffer)
+                # Copy up to the end of the free space, or the end of the buffer, whichever comes first.
+                count = min(len(view), len(self._buffer) - self._size, len(self._buffer) - end)
+                self._buffer[end:end + count] = view[:count]
+                self._size += count
+                view = view[count:]
+                self._condition.notify_all()
+        return True
+
+    # Block until there is data, and return up to size bytes of it.
+    # Return an empty bytes object when the buffer is closed and empty.
+    def read(self, size : int) -> bytes :
+        with self._condition :
+            while 0 == self._size and not self._closed :
+                self._condition.wait()
+            count = min(size, self._size, len(self._buffer) - self._start)
+            retval = bytes(self._buffer[self._start:self._start + count])
+            self._start = (self._start + count) % len(self._buffer)
+            self._size -= count
+            self._condition.notify_all()
+            return retval
+
+    # Readers get the data that is left, then end of stream. Writers stop waiting.
+    def close(self) -> None :
+        with self._condition :
+            self._closed = True
+            self._condition.notify_all()
@@ -0,0 +1,83 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+from array import array
+from operator import mul
+from sys import byteorder
+from typing import List, Optional
+import helper
+
+# We measure loudness over frames of this length when we look for silence.
+FRAME_MILLISECONDS = 20
+# How far from each planned cut we look for the quietest frame.
+SEARCH_SECONDS = 10
+
+# A byte range of the data chunk of a WAV file, and the time at which it starts in the recording.
+class Segment(object) :
+    def __init__(self, start_byte : int, end_byte : int, offset_ticks : int) :
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+        self.offset_ticks = offset_ticks
+
+def energies_from_bytes(data : bytes, bits_per_sample : int, frame_size : int) -> Optional[List[int]] :
+    # Return the sum of squared samples for each frame of frame_size bytes,
+    # or None if we cannot read samples of this size.
+    typecode = { 16 : "h", 32 : "i" }.get(bits_per_sample)
+    retval : List[int] = []
+    for start in range(0, len(data) - frame_size + 1, frame_size) :
+        frame = data[start:start + frame_size]
+        if 8 == bits_per_sample :
+            # 8-bit samples are unsigned, centered on 128.
+            retval.append(sum((sample - 128) * (sample - 128) for sample in frame))
+        elif typecode is not None :
+            samples = array(typecode, frame)
+            # WAV samples are little-endian.
+            if "big" == byteorder :
+                samples.byteswap()
+            retval.append(sum(map(mul, samples, samples)))
+        else :
+            return None
+    return retval
+
+# Return the byte offset, relative to the start of the data chunk, of the quietest frame within
+# SEARCH_SECONDS of target, and after minimum. The result is a multiple of the block alignment.
+def find_quiet_cut(f, header : helper.WavHeader, target : int, minimum : int) -> int :
+    bytes_per_second = header.samples_per_second * header.block_align
+    frame_size = max(1, bytes_per_second * FRAME_MILLISECONDS // 1000 // header.block_align) * header.block_align
+    search_size = SEARCH_SECONDS * bytes_per_second // header.block_align * header.block_align
+    search_start = max(minimum, target - search_size)
+    search_end = min(header.data_size, target + search_size)
+    if search_end - search_start < frame_size :
+        return target
+    f.seek(header.data_offset + search_start)
+    energies = energies_from_bytes(f.read(search_end - search_start), header.bits_per_sample, frame_size)
+    if not energies :
+        return target
+    # Among equally quiet frames, prefer the one closest to the planned cut.
+    quietest = min(range(len(energies)), key = lambda index : (energies[index], abs(search_start + index * frame_size - target)))
+    # Cut in the middle of the quietest frame.
+    return search_start + quietest * frame_size + frame_size // 2 // header.block_align * header.block_align
+
+# Split the audio data of a WAV file into segment_count segments of about the same length, cutting each at the
+# quietest point near where it would otherwise end. If segment_seconds is set, it sets the segment length instead.
+def segments_from_wav(filename : str, header : helper.WavHeader, segment_count : int, segment_seconds : Optional[float]) -> List[Segment] :
+    data_size = header.data_size // header.block_align * header.block_align
+    cuts = [0]
+    with open(filename, "rb") as f :
+        if segment_seconds is not None :
+            # Plan each cut from the previous one.
+            segment_size = max(1, int(segment_seconds * header.samples_per_second)) * header.block_align
+            target = segment_size
+            while target < data_size :
+                cuts.append(find_quiet_cut(f, header, target, cuts[-1] + header.block_align))
+                target = cuts[-1] + segment_size
+        else :
+            # Plan the cuts at equal intervals, so we get exactly segment_count segments.
+            for index in range(1, segment_count) :
+                target = data_size * index // segment_count // header.block_align * header.block_align
+                if target > cuts[-1] :
+                    cuts.append(find_quiet_cut(f, header, target, cuts[-1] + header.block_align))
+    cuts.append(data_size)
+    return [Segment(header.data_offset + start, header.data_offset + end, header.ticks_from_bytes(start)) for (start, end) in zip(cuts, cuts[1:]) if end > start]
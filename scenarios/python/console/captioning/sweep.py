@@ -0,0 +1,212 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Compares real-time caption settings on recorded sessions, without audio, the Speech service or the Speech SDK,
+# so it can run in CI. The recordings, made with captioning.py --record, stand in for the recognizer: they hold
+# the events it sent and when each arrived.
+# --threshold changes which partial results the recognizer sends, so it cannot be applied to a recording
+# afterwards. Record each input once for each threshold to compare. The threshold is saved in the recording.
+# --delay only changes how captions are timed, so we render every recording with each delay.
+# For each threshold and delay, we report:
+# - Caption latency: the seconds from the end of the audio of a caption to when viewers see it, which is when
+#   its timestamp comes up on the caption timeline, or when its result arrived, if that was later.
+# - Rewrites per caption: for each final caption, how many partial captions for its utterance were written,
+#   and then replaced by the next caption, before it. As in caption_metrics.py, captions are counted by
+#   sequence number, so results that were dropped are not counted.
+# - Late revisions: the share of partial results whose words the next partial result changed, rather than
+#   added to, after the partial result was shown, as delay_controller.py compares them. These are the rewrites that viewers see as flicker.
+# - The size of the caption output.
+
+from json import dump
+from os import linesep, listdir
+from os.path import isdir, isfile, join, splitext
+from typing import Dict, List, Optional, Tuple
+import caption_helper
+import caption_renderer
+import delay_controller
+import event_recording
+import helper
+import result_cache
+import user_config_helper
+
+USAGE = """Usage: python sweep.py --input PATH [...]
+
+  HELP
+    --help                           Show this help and stop.
+
+  INPUT
+    --input PATH                     Use the recording PATH, made with captioning.py --record, or every .jsonl recording
+                                     in directory PATH. Record each input once for each --threshold to compare.
+
+  SWEEP
+    --delays ""MS1;MS2""               The caption delays to compare, in milliseconds.
+                                     Default is ""0;500;1000;2000;3000"".
+    --thresholds ""N1;N2""             Only use the recordings made with these stable partial result thresholds.
+                                     Default is to use all recordings.
+
+  OUTPUT
+    The OUTPUT options of captioning.py that change the captions, such as --maxLineLength, --lines,
+    --remainTime and --srt, work as they do there.
+
+  REPORT
+    --json FILE                      Also write the report to FILE as JSON.
+"""
+
+DEFAULT_DELAYS_MILLISECONDS = [0, 500, 1000, 2000, 3000]
+# The name we report for recordings that do not save a threshold, or were made without --threshold.
+DEFAULT_THRESHOLD = "default"
+
+class SweepResult(object) :
+    def __init__(self, threshold : str, delay_milliseconds : float) :
+        self.threshold = threshold
+        self.delay_milliseconds = delay_milliseconds
+        self.recordings = 0
+        self.captions = 0
+        self.partial_results = 0
+        self.final_results = 0
+        self.final_captions = 0
+        self.rewrites = 0
+        self.late_revisions = 0
+        self.output_bytes = 0
+        self.latencies_seconds : List[float] = []
+
+    def to_dict(self) -> Dict :
+        latencies = sorted(self.latencies_seconds)
+        return {
+            "threshold" : self.threshold,
+            "delay_milliseconds" : self.delay_milliseconds,
+            "recordings" : self.recordings,
+            "captions" : self.captions,
+            "mean_latency_seconds" : sum(latencies) / len(latencies) if latencies else None,
+            "p95_latency_seconds" : helper.percentile_from_sorted(latencies, 95) if latencies else None,
+            "rewrites_per_caption" : self.rewrites / self.final_captions if self.final_captions else None,
+            "late_revision_rate" : self.late_revisions / self.partial_results if self.partial_results else None,
+            "output_bytes" : self.output_bytes,
+        }
+
+def recording_files_from_path(path : str) -> List[str] :
+    if not isdir(path) :
+        return [path]
+    return [join(path, name) for name in sorted(listdir(path)) if splitext(name)[1].lower() == result_cache.CACHE_FILE_EXTENSION and isfile(join(path, name))]
+
+def threshold_from_recording(recording_file : str) -> str :
+    threshold = event_recording.settings_from_recording(recording_file).get("stable_partial_result_threshold")
+    return DEFAULT_THRESHOLD if threshold is None else str(threshold)
+
+# Render the events of one recording with user_config, as captioning.py would have live, and add the
+# measurements to result.
+def sweep_recording(user_config : helper.Read_Only_Dict, events : List[event_recording.RecordedEvent], result : SweepResult) -> None :
+    renderer = caption_renderer.CaptionRenderer(user_config)
+    delay_seconds = user_config["delay"] / helper.TICKS_PER_SECOND
+    output_bytes = len((renderer.file_header() + renderer.file_footer()).encode("utf-8"))
+    # For each caption that is not written yet, keyed by sequence number, when its result arrived, when
+    # the audio of the result ended, in seconds, and whether the result was final.
+    sources : Dict[int, Tuple[float, float, bool]] = {}
+    # The sequence number of the first caption of the current utterance.
+    utterance_sequence : Optional[int] = None
+    # The text of the previous partial result in this utterance, and when its audio ended.
+    previous_partial : Optional[Tuple[str, float]] = None
+
+    def add_captions(captions : List[caption_helper.Caption]) -> None :
+        nonlocal output_bytes, utterance_sequence
+        for caption in captions :
+            output_bytes += len(renderer.string_from_caption(caption).encode("utf-8"))
+            (arrival, audio_end, is_final_caption) = sources.pop(caption.sequence)
+            result.latencies_seconds.append(max(caption.begin / helper.TICKS_PER_SECOND, arrival) - audio_end)
+            result.captions += 1
+            if utterance_sequence is None :
+                utterance_sequence = caption.sequence
+            if is_final_caption :
+                result.rewrites += caption.sequence - utterance_sequence
+                result.final_captions += 1
+                utterance_sequence = None
+
+    for event in events :
+        # As the handlers in captioning.py do, skip results that are not partial or final, or have no text.
+        if event.result is None or 0 == len(event.result.text) :
+            continue
+        reason = caption_helper.reason_name(event.result.reason)
+        is_final_result = reason in caption_helper.FINAL_RESULT_REASONS
+        if not is_final_result and reason not in caption_helper.PARTIAL_RESULT_REASONS :
+            continue
+        audio_end = (event.result.offset + event.result.duration) / helper.TICKS_PER_SECOND
+        if previous_partial is not None and not is_final_result :
+            (previous_text, previous_end) = previous_partial
+            # The partial result was shown delay after its audio ended. See delay_controller.py.
+            if delay_controller.is_revision(previous_text, event.result.text) and event.arrival - previous_end > delay_seconds :
+                result.late_revisions += 1
+        if is_final_result :
+            result.final_results += 1
+            previous_partial = None
+        else :
+            result.partial_results += 1
+            previous_partial = (event.result.text, audio_end)
+        captions = renderer.captions_from_result(event.result, is_final_result)
+        current_caption = renderer.current_caption()
+        # If the result was dropped, the current caption is still the one from an earlier result.
+        if current_caption is not None and current_caption.sequence not in sources :
+            sources[current_caption.sequence] = (event.arrival, audio_end, is_final_result)
+        add_captions(captions)
+    add_captions(list(renderer.final_captions()))
+    result.output_bytes += output_bytes
+    result.recordings += 1
+
+def run_sweep(user_config : helper.Read_Only_Dict, recording_files : List[str], delays_milliseconds : List[float], thresholds : Optional[List[str]]) -> List[SweepResult] :
+    recordings_by_threshold : Dict[str, List[str]] = {}
+    for recording_file in recording_files :
+        threshold = threshold_from_recording(recording_file)
+        if thresholds is None or threshold in thresholds :
+            recordings_by_threshold.setdefault(threshold, []).append(recording_file)
+    retval : List[SweepResult] = []
+    for (threshold, files) in sorted(recordings_by_threshold.items()) :
+        # Each recording is read once per threshold, not once per delay.
+        recordings = [event_recording.events_from_recording(recording_file) for recording_file in files]
+        for delay_milliseconds in delays_milliseconds :
+            result = SweepResult(threshold, delay_milliseconds)
+            delay_config = helper.Read_Only_Dict(dict(user_config,
+                captioning_mode = user_config_helper.CaptioningMode.REALTIME,
+                delay = helper.ticks_from_milliseconds(delay_milliseconds)))
+            for events in recordings :
+                sweep_recording(delay_config, events, result)
+            retval.append(result)
+    return retval
+
+def format_optional(value : Optional[float], format : str) -> str :
+    return "-" if value is None else format.format(value)
+
+def print_report(results : List[SweepResult]) -> None :
+    print("{:<11}{:>10}{:>12}{:>10}{:>10}{:>10}{:>10}{:>12}{:>14}".format("threshold", "delay ms", "recordings", "captions", "mean s", "p95 s", "rewrites", "late rev %", "output bytes"))
+    for result in results :
+        report = result.to_dict()
+        print("{:<11}{:>10.0f}{:>12}{:>10}{:>10}{:>10}{:>10}{:>12}{:>14}".format(
+            result.threshold, result.delay_milliseconds, result.recordings, result.captions,
+            format_optional(report["mean_latency_seconds"], "{:.3f}"), format_optional(report["p95_latency_seconds"], "{:.3f}"),
+            format_optional(report["rewrites_per_caption"], "{:.2f}"), format_optional(report["late_revision_rate"], "{:.1%}"),
+            result.output_bytes))
+
+def list_from_option(option : str) -> Optional[List[str]] :
+    value = user_config_helper.get_cmd_option(option)
+    if value is None :
+        return None
+    return [item.strip() for item in value.split(";") if item.strip()]
+
+if __name__ == "__main__" :
+    if user_config_helper.cmd_option_exists("--help") :
+        print(USAGE)
+    else :
+        user_config = user_config_helper.user_config_from_args(USAGE, connect=False)
+        if user_config["input_file"] is None :
+            raise RuntimeError("Please provide a recording file or directory with the --input option.{}{}".format(linesep, USAGE))
+        recording_files = recording_files_from_path(user_config["input_file"])
+        if not recording_files :
+            raise RuntimeError("No recordings found in {}.{}{}".format(user_config["input_file"], linesep, USAGE))
+        s_delays = list_from_option("--delays")
+        delays = [max(float(delay), 0) for delay in s_delays] if s_delays is not None else DEFAULT_DELAYS_MILLISECONDS
+        results = run_sweep(user_config, recording_files, delays, list_from_option("--thresholds"))
+        print_report(results)
+        json_file = user_config_helper.get_cmd_option("--json")
+        if json_file is not None :
+            with open(json_file, mode = "w", encoding = "utf-8") as f :
+                dump({ "recordings" : recording_files, "results" : [result.to_dict() for result in results] }, f, indent = 2)
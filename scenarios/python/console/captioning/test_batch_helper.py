@@ -0,0 +1,85 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from os import makedirs
+from os.path import dirname, join
+import pytest
+import batch_helper
+import helper
+
+def user_config_for_manifest(manifest : str, **overrides) -> helper.Read_Only_Dict :
+    return helper.Read_Only_Dict(dict({
+        "batch_input" : manifest,
+        "use_compressed_audio" : False,
+        "caption_format" : "vtt",
+        "batch_output_directory" : None,
+        "cache_file" : None,
+        "checkpoint_file" : None,
+        "target_languages" : [],
+        "extra_caption_formats" : [],
+        "caption_layouts" : [],
+        "max_line_length" : 37,
+        "lines" : 2,
+    }, **overrides))
+
+@pytest.fixture
+def manifest(tmp_path) -> str :
+    for directory in ["a", "b"] :
+        makedirs(join(tmp_path, directory))
+    retval = join(tmp_path, "manifest.txt")
+    with open(retval, mode = "w", encoding = "utf-8") as f :
+        f.write("# Two files with the same name.\na/talk.wav\nb/talk.wav\n")
+    return retval
+
+def test_same_name_next_to_input_is_allowed(manifest : str) -> None :
+    jobs = batch_helper.jobs_from_user_config(user_config_for_manifest(manifest))
+    assert [job.output_file for job in jobs] == [join(dirname(manifest), "a", "talk.vtt"), join(dirname(manifest), "b", "talk.vtt")]
+
+@pytest.mark.parametrize("option", ["batch_output_directory", "cache_file", "checkpoint_file"])
+def test_same_name_in_one_directory_fails(manifest : str, tmp_path, option : str) -> None :
+    with pytest.raises(RuntimeError, match = "would both write") :
+        batch_helper.jobs_from_user_config(user_config_for_manifest(manifest, **{ option : join(tmp_path, "out") }))
+
+def test_file_listed_twice_fails(tmp_path) -> None :
+    manifest = join(tmp_path, "manifest.txt")
+    with open(manifest, mode = "w", encoding = "utf-8") as f :
+        f.write("talk.wav\n./talk.wav\n")
+    with pytest.raises(RuntimeError, match = "would both write") :
+        batch_helper.jobs_from_user_config(user_config_for_manifest(manifest))
+
+def test_cache_and_checkpoint_files_per_input(tmp_path) -> None :
+    manifest = join(tmp_path, "manifest.txt")
+    with open(manifest, mode = "w", encoding = "utf-8") as f :
+        f.write("one.wav\ntwo.wav\n")
+    jobs = batch_helper.jobs_from_user_config(user_config_for_manifest(manifest, cache_file = "cache", checkpoint_file = "checkpoints"))
+    assert [job.cache_file for job in jobs] == [join("cache", "one.jsonl"), join("cache", "two.jsonl")]
+    assert [job.checkpoint_file for job in jobs] == [join("checkpoints", "one.checkpoint.jsonl"), join("checkpoints", "two.checkpoint.jsonl")]
+
+def test_translation_and_variant_files_are_checked(tmp_path) -> None :
+    manifest = join(tmp_path, "manifest.txt")
+    # With --translate fr, talk.vtt also writes talk.fr.vtt, the output file of talk.fr.wav.
+    with open(manifest, mode = "w", encoding = "utf-8") as f :
+        f.write("talk.wav\ntalk.fr.wav\n")
+    batch_helper.jobs_from_user_config(user_config_for_manifest(manifest))
+    with pytest.raises(RuntimeError, match = "would both write .*talk.fr.vtt") :
+        batch_helper.jobs_from_user_config(user_config_for_manifest(manifest, target_languages = ["fr"]))
+    # With --formats vtt;srt and --layouts tv=32x2, talk.wav also writes talk.srt and talk.tv.vtt.
+    with open(manifest, mode = "w", encoding = "utf-8") as f :
+        f.write("talk.wav\ntalk.tv.wav\n")
+    jobs = batch_helper.jobs_from_user_config(user_config_for_manifest(manifest, extra_caption_formats = ["srt"]))
+    assert [join(tmp_path, name) for name in ["talk.vtt", "talk.srt"]] == jobs[0].output_files
+    with pytest.raises(RuntimeError, match = "would both write .*talk.tv.vtt") :
+        batch_helper.jobs_from_user_config(user_config_for_manifest(manifest, caption_layouts = [("tv", 32, 2)]))
+
+@pytest.mark.parametrize("option, value", [("use_stdin", True), ("ffmpeg_source", "rtmp://example/live")])
+def test_live_sources_are_not_valid(manifest : str, option : str, value) -> None :
+    user_config = user_config_for_manifest(manifest, **{
+        "serve_port" : None, "hls_directory" : None, "metrics_file" : None, "recording_file" : None, "use_stdin" : False, "ffmpeg_source" : None,
+        option : value })
+    with pytest.raises(RuntimeError, match = "not valid with --batch") :
+        batch_helper.caption_batch(user_config, lambda job_config : 0.0)
@@ -0,0 +1,134 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from typing import List, Tuple
+import random
+import pytest
+import caption_helper
+
+SENTENCE = "So what I was trying to say, before we were interrupted, is that we should look at the numbers again before we decide anything at all. Does that make sense to everyone here?"
+
+# Partial results as the recognizer sends them: each adds a word, and now and then one revises the last words.
+def partial_texts(text : str, seed : int) -> List[str] :
+    rng = random.Random(seed)
+    words = text.split(" ")
+    retval : List[str] = []
+    for count in range(1, len(words) + 1) :
+        retval.append(" ".join(words[:count]))
+        if count > 2 and rng.random() < 0.3 :
+            # A revision: the last word is replaced, and the next result puts it back.
+            retval.append(" ".join(words[:count - 1] + ["revised"]))
+    return retval
+
+def full_line_spans(language : str, max_width : int, text : str) -> List[Tuple[int, int]] :
+    return caption_helper.CaptionHelper(language, max_width, 2, []).line_spans_from_text(text)
+
+@pytest.mark.parametrize("max_width", [10, 20, 37])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_incremental_layout_matches_full_layout(max_width : int, seed : int) -> None :
+    layout = caption_helper.RealTimeCaptionLayout("en-US", max_width, 2)
+    for text in partial_texts(SENTENCE, seed) :
+        assert layout.update_partial_layout(text) == full_line_spans("en-US", max_width, text)
+
+def test_incremental_layout_matches_full_layout_for_chinese() -> None :
+    text = "今天天气很好，我们去公园散步吧。明天再见，后天也可以。我们一起去吃饭好不好？"
+    layout = caption_helper.RealTimeCaptionLayout("zh-CN", 8, 2)
+    for length in range(1, len(text) + 1) :
+        assert layout.update_partial_layout(text[:length]) == full_line_spans("zh-CN", 8, text[:length])
+
+def test_incremental_layout_after_text_is_shortened() -> None :
+    layout = caption_helper.RealTimeCaptionLayout("en-US", 20, 2)
+    layout.update_partial_layout(SENTENCE)
+    assert layout.update_partial_layout(SENTENCE[:30]) == full_line_spans("en-US", 20, SENTENCE[:30])
+
+def test_caption_text_shows_last_lines() -> None :
+    layout = caption_helper.RealTimeCaptionLayout("en-US", 20, 2)
+    lines = caption_helper.CaptionHelper("en-US", 20, 2, []).lines_from_text(SENTENCE)
+    assert "\n".join(lines[-2:]) == layout.caption_text_from_result(SENTENCE, False)
+
+def test_caption_text_keeps_recognized_lines_until_cleared() -> None :
+    layout = caption_helper.RealTimeCaptionLayout("en-US", 20, 3)
+    assert "Hello there." == layout.caption_text_from_result("Hello there.", True)
+    # A partial result is shown after the recognized lines, and is not kept.
+    assert "Hello there.\nHow are" == layout.caption_text_from_result("How are", False)
+    assert "Hello there.\nHow are you?" == layout.caption_text_from_result("How are you?", True)
+    # Only the last max_height lines are kept. The comma is in a higher tier than the space, so the line ends there.
+    assert "How are you?\nFine,\nthanks. And you?" == layout.caption_text_from_result("Fine, thanks. And you?", True)
+    layout.clear_recognized_lines()
+    assert "Good." == layout.caption_text_from_result("Good.", False)
+
+def test_common_prefix_length() -> None :
+    assert 0 == caption_helper.common_prefix_length("", "abc")
+    assert 3 == caption_helper.common_prefix_length("abc", "abcdef")
+    assert 2 == caption_helper.common_prefix_length("abx", "abcdef")
+    assert 0 == caption_helper.common_prefix_length("xbc", "abc")
+    assert 3 == caption_helper.common_prefix_length("abcdef", "abc")
+
+def store_from_captions(captions : List[Tuple[int, int, str]]) -> caption_helper.CaptionStore :
+    retval = caption_helper.CaptionStore("en-US")
+    for (sequence, (begin, end, text)) in enumerate(captions, 1) :
+        retval.append(sequence, begin, end, text)
+    return retval
+
+def test_caption_store_reads_captions_as_a_list_does() -> None :
+    store = store_from_captions([(0, 10, "one"), (20, 30, ""), (40, 50, "three")])
+    assert 3 == len(store)
+    assert ["one", "", "three"] == [caption.text for caption in store]
+    last = store[-1]
+    assert (3, 40, 50, "three", "en-US") == (last.sequence, last.begin, last.end, last.text, last.language)
+    # Text appended after a read is joined on the next read.
+    store.append(4, 60, 70, "four")
+    assert "four" == store[3].text
+    # Changing a caption that was read does not change the store.
+    last.end = 0
+    assert 50 == store[2].end
+    with pytest.raises(IndexError) :
+        store[4]
+
+# Captions that overlap the next caption after remain_time, captions that do not, and the last caption.
+EXTEND_ENDS_CAPTIONS = [(0, 10, "a"), (12, 20, "b"), (100, 110, "c"), (111, 120, "d")]
+EXTEND_ENDS_EXPECTED = [12, 25, 111, 125]
+
+def test_extend_ends_without_numpy(monkeypatch) -> None :
+    monkeypatch.setattr(caption_helper, "numpy", None)
+    store = store_from_captions(EXTEND_ENDS_CAPTIONS)
+    store.extend_ends(5)
+    assert EXTEND_ENDS_EXPECTED == [caption.end for caption in store]
+    empty = caption_helper.CaptionStore("en-US")
+    empty.extend_ends(5)
+    assert 0 == len(empty)
+
+def test_extend_ends_with_numpy_matches_without(monkeypatch) -> None :
+    numpy = pytest.importorskip("numpy")
+    monkeypatch.setattr(caption_helper, "numpy", numpy)
+    store = store_from_captions(EXTEND_ENDS_CAPTIONS)
+    store.extend_ends(5)
+    assert EXTEND_ENDS_EXPECTED == [caption.end for caption in store]
+    rng = random.Random(1)
+    captions : List[Tuple[int, int, str]] = []
+    begin = 0
+    for _ in range(1000) :
+        begin += rng.randrange(0, 50)
+        captions.append((begin, begin + rng.randrange(1, 50), "x"))
+    with_numpy = store_from_captions(captions)
+    with_numpy.extend_ends(20)
+    monkeypatch.setattr(caption_helper, "numpy", None)
+    without_numpy = store_from_captions(captions)
+    without_numpy.extend_ends(20)
+    assert [caption.end for caption in without_numpy] == [caption.end for caption in with_numpy]
+
+def test_take_and_store_captions_lay_out_results_the_same() -> None :
+    results = [caption_helper.RecognitionRecord(text, offset, 10000000, "RecognizedSpeech") for (offset, text) in [(1, SENTENCE), (20000000, "Yes, it does."), (40000000, SENTENCE)]]
+    taker = caption_helper.CaptionHelper("en-US", 20, 2, [])
+    taken = [caption for result in results for caption in taker.take_captions_for_result(result)]
+    store = caption_helper.CaptionStore("en-US")
+    storer = caption_helper.CaptionHelper("en-US", 20, 2, [])
+    for result in results :
+        storer.store_captions_for_result(result, store)
+    assert len(taken) > len(results)
+    assert [(caption.sequence, caption.begin, caption.end, caption.text) for caption in taken] == [(caption.sequence, caption.begin, caption.end, caption.text) for caption in store]
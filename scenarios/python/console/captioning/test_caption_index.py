@@ -0,0 +1,97 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from os.path import join
+import caption_index
+import caption_sink
+import caption_helper
+
+def begins(index : caption_index.CaptionIndex, begin : int, end : int) -> list :
+    return [entry.begin for entry in index.entries_between(begin, end)]
+
+def test_entries_between_finds_overlapping_captions(tmp_path) -> None :
+    index_file = join(tmp_path, "c.idx")
+    writer = caption_index.CaptionIndexWriter(index_file)
+    # The first caption is shown for a long time, so it overlaps the later ones.
+    for (begin, end) in [(0, 100), (10, 20), (30, 40), (50, 60)] :
+        writer.add(begin, end, begin, 1)
+    writer.close()
+    index = caption_index.CaptionIndex(index_file)
+    assert 4 == len(index)
+    assert [0, 10] == begins(index, 15, 16)
+    assert [0, 30, 50] == begins(index, 35, 55)
+    assert [0] == begins(index, 25, 26)
+    assert [] == begins(index, 100, 200)
+    assert [0] == [entry.begin for entry in index.entries_at(99)]
+    assert 2 == index.position_from_ticks(25)
+    index.close()
+
+def test_out_of_order_captions_are_sorted_on_close(tmp_path) -> None :
+    index_file = join(tmp_path, "c.idx")
+    writer = caption_index.CaptionIndexWriter(index_file)
+    for (begin, end) in [(30, 40), (10, 20), (50, 60)] :
+        writer.add(begin, end, begin, 1)
+    writer.close()
+    index = caption_index.CaptionIndex(index_file)
+    assert [10, 30, 50] == [index.entry(position).begin for position in range(len(index))]
+    assert [10] == begins(index, 15, 16)
+    index.close()
+
+def test_index_is_readable_while_written(tmp_path) -> None :
+    index_file = join(tmp_path, "c.idx")
+    writer = caption_index.CaptionIndexWriter(index_file)
+    index = caption_index.CaptionIndex(index_file)
+    assert 0 == len(index)
+    writer.add(0, 10, 0, 1)
+    writer.add(10, 20, 1, 1)
+    # Records that are not flushed are not counted yet.
+    index.reload()
+    assert 0 == len(index)
+    writer.flush()
+    index.reload()
+    assert 2 == len(index)
+    assert [10] == begins(index, 15, 16)
+    writer.add(20, 30, 2, 1)
+    writer.flush()
+    index.reload()
+    assert 3 == len(index)
+    writer.close()
+    index.close()
+
+def test_live_index_stops_at_captions_out_of_order(tmp_path) -> None :
+    index_file = join(tmp_path, "c.idx")
+    writer = caption_index.CaptionIndexWriter(index_file)
+    writer.add(10, 20, 0, 1)
+    writer.flush()
+    writer.add(0, 5, 1, 1)
+    writer.flush()
+    index = caption_index.CaptionIndex(index_file)
+    # Until the writer sorts the records on close, readers see only the sorted records.
+    assert 1 == len(index)
+    index.close()
+    writer.close()
+    index = caption_index.CaptionIndex(index_file)
+    assert [0, 10] == [index.entry(position).begin for position in range(len(index))]
+    index.close()
+
+def test_sink_index_points_at_flushed_captions(tmp_path) -> None :
+    output_file = join(tmp_path, "c.vtt")
+    index_file = output_file + caption_index.INDEX_FILE_EXTENSION
+    # Flush after every caption.
+    sink = caption_sink.CaptionSink(output_file, True, 1, 60.0, None, index_file)
+    sink.write_header("WEBVTT\n\n")
+    texts = []
+    for sequence in range(1, 4) :
+        caption = caption_helper.Caption("en-US", sequence, sequence * 10, sequence * 10 + 5, "caption {}".format(sequence))
+        texts.append("{}\n\n".format(caption.text))
+        sink.write(texts[-1], caption)
+    index = caption_index.CaptionIndex(index_file, output_file)
+    assert 3 == len(index)
+    assert texts == [index.caption_text(index.entry(position)) for position in range(len(index))]
+    index.close()
+    sink.close()
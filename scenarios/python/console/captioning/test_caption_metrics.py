@@ -0,0 +1,61 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from os.path import join
+import pytest
+import caption_helper
+import caption_metrics
+import helper
+
+@pytest.fixture
+def metrics(tmp_path, monkeypatch, clock) -> caption_metrics.CaptionMetrics :
+    monkeypatch.setattr(caption_metrics, "monotonic", clock)
+    retval = caption_metrics.CaptionMetrics(join(tmp_path, "metrics.json"), caption_metrics.MetricsFormat.JSON, 10, "en-US", 0, None)
+    retval.start()
+    return retval
+
+def caption(sequence : int, begin_seconds : float) -> caption_helper.Caption :
+    begin = int(begin_seconds * helper.TICKS_PER_SECOND)
+    return caption_helper.Caption("en-US", sequence, begin, begin + helper.TICKS_PER_SECOND, "text")
+
+def test_latency_is_measured_from_caption_begin(metrics, clock) -> None :
+    # The begin time includes the delay, so a caption written before it is due has negative latency.
+    clock.now += 3.0
+    metrics.add_caption(caption(1, 3.5), False)
+    clock.now += 1.0
+    metrics.add_caption(caption(2, 2.5), True)
+    latency = metrics.to_dict()["latency_seconds"]
+    assert -0.5 == latency["partial"]["max"]
+    assert 1.5 == latency["final"]["max"]
+
+def test_results_without_captions_are_counted_but_not_measured(metrics) -> None :
+    metrics.add_result(False, False)
+    metrics.add_result(False, True)
+    metrics.add_result(True, False)
+    report = metrics.to_dict()
+    assert { "partial" : 2, "final" : 1 } == report["results"]
+    assert 1 == report["dropped_results"]
+    assert 0 == report["latency_seconds"]["partial"]["count"] + report["latency_seconds"]["final"]["count"]
+
+def test_rewrites_count_captions_written_per_utterance(metrics) -> None :
+    # Three partial captions, then the final caption.
+    for sequence in range(1, 4) :
+        metrics.add_caption(caption(sequence, sequence), False)
+    metrics.add_caption(caption(4, 4), True)
+    # An utterance with only a final caption has no rewrites.
+    metrics.add_caption(caption(5, 5), True)
+    rewrites = metrics.to_dict()["rewrites"]
+    assert 2 == rewrites["count"]
+    assert 3 == rewrites["sum"]
+
+def test_prometheus_text(metrics, clock) -> None :
+    clock.now += 1.0
+    metrics.add_caption(caption(1, 0.5), True)
+    text = metrics.prometheus_text()
+    assert 'caption_latency_seconds_bucket{language="en-US",kind="final",le="0.5"} 1' in text
+    assert 'caption_rewrites_count{language="en-US"} 1' in text
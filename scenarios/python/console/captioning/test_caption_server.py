@@ -0,0 +1,75 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from http.client import HTTPConnection, HTTPResponse
+from json import loads
+from time import perf_counter
+from typing import Tuple
+import pytest
+import caption_server
+
+@pytest.fixture
+def server() -> caption_server.CaptionServer :
+    retval = caption_server.CaptionServer("127.0.0.1", 0, queue_size = 4)
+    yield retval
+    retval.close()
+
+def connect(server : caption_server.CaptionServer, path : str) -> HTTPResponse :
+    (host, port) = server._server.server_address[:2]
+    connection = HTTPConnection(host, port, timeout = 5)
+    connection.request("GET", path)
+    return connection.getresponse()
+
+# Return the name and data of the next event in the stream.
+def read_event(response : HTTPResponse) -> Tuple[str, dict] :
+    fields = {}
+    while True :
+        line = response.fp.readline().decode("utf-8").rstrip("\n")
+        if not line :
+            if "event" in fields :
+                return (fields["event"], loads(fields["data"]))
+            continue
+        if not line.startswith(":") :
+            (name, value) = line.split(": ", 1)
+            fields[name] = value
+
+def test_viewer_page(server : caption_server.CaptionServer) -> None :
+    response = connect(server, "/")
+    assert 200 == response.status
+    assert b"EventSource" in response.read()
+    assert 404 == connect(server, "/other").status
+
+def test_new_viewer_gets_snapshot_then_deltas(server : caption_server.CaptionServer) -> None :
+    server.publish("en-US", "Hello there.\nHow are")
+    response = connect(server, "/captions")
+    assert 200 == response.status
+    assert "text/event-stream; charset=utf-8" == response.getheader("Content-Type")
+    assert ("snapshot", { "language" : "en-US", "lines" : ["Hello there.", "How are"] }) == read_event(response)
+    # Only the lines from the first changed line on are sent.
+    server.publish("en-US", "Hello there.\nHow are you?")
+    assert ("delta", { "language" : "en-US", "start" : 1, "lines" : ["How are you?"] }) == read_event(response)
+    # Publishing the same text again sends nothing, so the next event is the next change.
+    server.publish("en-US", "Hello there.\nHow are you?")
+    server.publish("fr", "Bonjour.")
+    assert ("delta", { "language" : "fr", "start" : 0, "lines" : ["Bonjour."] }) == read_event(response)
+
+def test_viewer_that_falls_behind_gets_snapshot(server : caption_server.CaptionServer) -> None :
+    # A viewer that never reads its queue.
+    client = server._subscribe()
+    start = perf_counter()
+    for count in range(1, 101) :
+        server.publish("en-US", "word " * count)
+    # The publisher never waits for the viewer.
+    assert perf_counter() - start < 1.0
+    events = []
+    while not client.queue.empty() :
+        events.append(client.queue.get_nowait().decode("utf-8"))
+    assert len(events) <= 4
+    assert any(event.startswith("event: snapshot\n") for event in events)
+    # The queued events end with the latest caption.
+    assert loads(events[-1].split("data: ", 1)[1])["lines"][-1] == ("word " * 100)
@@ -0,0 +1,24 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+import caption_helper
+import caption_sink
+import helper
+
+def test_labeled_text_labels_each_line() -> None :
+    assert "[fr] 1\n[fr] 00:00:00.000 --> 00:00:01.000\n[fr] Bonjour\n\n" == caption_sink.labeled_text("1\n00:00:00.000 --> 00:00:01.000\nBonjour\n\n", "[fr] ")
+    assert "Hello\n" == caption_sink.labeled_text("Hello\n", None)
+
+def test_console_is_labeled_only_with_translation() -> None :
+    assert caption_sink.console_label_from_user_config(helper.Read_Only_Dict({ "language" : "en-US", "target_languages" : [] })) is None
+    assert "[fr] " == caption_sink.console_label_from_user_config(helper.Read_Only_Dict({ "language" : "fr", "target_languages" : ["fr", "de"] }))
+
+def test_sink_labels_console_output(capsys) -> None :
+    sink = caption_sink.CaptionSink(None, False, 1, 60.0, None, console_label = "[de] ")
+    sink.write("Hallo\n\n", caption_helper.Caption("de", 1, 0, 10, "Hallo"))
+    assert "[de] Hallo\n\n" == capsys.readouterr().out
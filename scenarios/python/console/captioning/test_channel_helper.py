@@ -0,0 +1,103 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from concurrent.futures import ThreadPoolExecutor
+from json import dump
+from os.path import join
+from threading import Event, Lock, Thread
+from time import sleep
+from typing import List
+import channel_helper
+import helper
+
+def test_work_for_a_channel_is_done_in_order() -> None :
+    pool = ThreadPoolExecutor(max_workers = 4)
+    dispatchers = [channel_helper.ChannelDispatcher(pool, max_pending = 8) for _ in range(3)]
+    done : List[List[int]] = [[] for _ in dispatchers]
+    running = [0 for _ in dispatchers]
+    overlaps = []
+    lock = Lock()
+
+    def action(channel : int, index : int) -> None :
+        with lock :
+            running[channel] += 1
+            if running[channel] > 1 :
+                overlaps.append(channel)
+        done[channel].append(index)
+        with lock :
+            running[channel] -= 1
+
+    # Submit from a thread per channel, as the recognizer callbacks of each channel do.
+    def submit_all(channel : int) -> None :
+        for index in range(500) :
+            dispatchers[channel].submit(lambda index = index : action(channel, index))
+
+    threads = [Thread(target = submit_all, args = (channel,)) for channel in range(len(dispatchers))]
+    for thread in threads :
+        thread.start()
+    for thread in threads :
+        thread.join()
+    for dispatcher in dispatchers :
+        dispatcher.wait()
+    pool.shutdown()
+    assert [] == overlaps
+    assert [list(range(500))] * 3 == done
+    assert [500] * 3 == [dispatcher.processed for dispatcher in dispatchers]
+
+def test_busy_channel_gives_up_its_thread_after_a_batch() -> None :
+    pool = ThreadPoolExecutor(max_workers = 1)
+    busy = channel_helper.ChannelDispatcher(pool)
+    other = channel_helper.ChannelDispatcher(pool)
+    done : List[str] = []
+    gate = Event()
+    # Hold the only pool thread until both channels have work queued.
+    busy.submit(lambda : (gate.wait(), done.append("busy")))
+    for _ in range(3 * channel_helper.DRAIN_BATCH - 1) :
+        busy.submit(lambda : done.append("busy"))
+    other.submit(lambda : done.append("other"))
+    gate.set()
+    busy.wait()
+    other.wait()
+    pool.shutdown()
+    assert channel_helper.DRAIN_BATCH == done.index("other")
+    assert 3 * channel_helper.DRAIN_BATCH == done.count("busy")
+
+def test_submit_waits_while_the_channel_is_full() -> None :
+    pool = ThreadPoolExecutor(max_workers = 1)
+    dispatcher = channel_helper.ChannelDispatcher(pool, max_pending = 2)
+    gate = Event()
+    dispatcher.submit(gate.wait)
+    # The first item is running, so two more fill the queue.
+    while dispatcher.pending() > 0 :
+        sleep(0.001)
+    dispatcher.submit(lambda : None)
+    dispatcher.submit(lambda : None)
+    submitted = Event()
+    thread = Thread(target = lambda : (dispatcher.submit(lambda : None), submitted.set()))
+    thread.start()
+    assert not submitted.wait(0.2)
+    gate.set()
+    assert submitted.wait(10)
+    thread.join()
+    dispatcher.wait()
+    pool.shutdown()
+    assert 4 == dispatcher.processed
+
+def test_channels_override_the_shared_config(tmp_path) -> None :
+    channels_file = join(tmp_path, "channels.json")
+    with open(channels_file, mode = "w", encoding = "utf-8") as f :
+        dump({ "channels" : [{ "name" : "one", "output" : "one.vtt" }, { "name" : "two", "language" : "de-DE", "translate" : "fr; es" }] }, f)
+    user_config = helper.Read_Only_Dict({ "channels_file" : channels_file, "language" : "en-US", "output_file" : None, "target_languages" : [], "suppress_console_output" : False })
+    pool = ThreadPoolExecutor(max_workers = 1)
+    (one, two) = channel_helper.channels_from_user_config(user_config, pool)
+    pool.shutdown()
+    assert ("one.vtt", "en-US", [], True) == (one.user_config["output_file"], one.user_config["language"], one.user_config["target_languages"], one.user_config["suppress_console_output"])
+    assert (None, "de-DE", ["fr", "es"], True) == (two.user_config["output_file"], two.user_config["language"], two.user_config["target_languages"], two.user_config["suppress_console_output"])
+    assert sorted(user_config) == sorted(one.user_config) == sorted(two.user_config)
+    # The command line options are not changed.
+    assert (None, False) == (user_config["output_file"], user_config["suppress_console_output"])
@@ -0,0 +1,80 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from os.path import join
+import pytest
+import caption_helper
+import checkpoint
+import helper
+
+# 16 kHz, 16-bit, mono: 32000 bytes per second.
+HEADER = helper.WavHeader(16000, 16, 1, 44, 32000 * 60)
+
+def records() -> list :
+    return [
+        caption_helper.RecognitionRecord("First.", 10000000, 20000000, "RecognizedSpeech"),
+        caption_helper.RecognitionRecord("Zweite, ¿qué?", 40000000, 15000000, "RecognizedSpeech"),
+    ]
+
+def test_checkpoint_round_trip(tmp_path) -> None :
+    checkpoint_file = join(tmp_path, "talk" + checkpoint.CHECKPOINT_FILE_EXTENSION)
+    writer = checkpoint.Checkpoint(checkpoint_file, join(tmp_path, "talk.wav"), "en-US", HEADER.data_size, 60)
+    for record in records() :
+        writer.add_result(record)
+    writer.write()
+    read = checkpoint.records_from_checkpoint(checkpoint_file, "en-US", HEADER.data_size)
+    assert [(record.text, record.offset, record.duration, caption_helper.reason_name(record.reason)) for record in records()] == \
+        [(record.text, record.offset, record.duration, caption_helper.reason_name(record.reason)) for record in read]
+    # Resume at the end of the last result, rounded down to a whole block of audio.
+    offset = checkpoint.resume_offset_from_records(read)
+    assert 55000000 == offset
+    assert 32000 * 5 + 16000 == HEADER.bytes_from_ticks(offset)
+    assert offset == HEADER.ticks_from_bytes(HEADER.bytes_from_ticks(offset))
+
+def test_later_writes_append_only_new_results(tmp_path) -> None :
+    checkpoint_file = join(tmp_path, "talk" + checkpoint.CHECKPOINT_FILE_EXTENSION)
+    # A checkpoint from a previous run is replaced by the first write.
+    with open(checkpoint_file, mode = "w", encoding = "utf-8") as f :
+        f.write("old\n")
+    writer = checkpoint.Checkpoint(checkpoint_file, join(tmp_path, "talk.wav"), "en-US", HEADER.data_size, 60)
+    (first, second) = records()
+    writer.add_result(first)
+    writer.write()
+    with open(checkpoint_file, mode = "r", encoding = "utf-8") as f :
+        written = f.read()
+    writer.write()
+    writer.add_result(second)
+    writer.write()
+    with open(checkpoint_file, mode = "r", encoding = "utf-8") as f :
+        lines = f.read()
+    assert lines.startswith(written)
+    assert 3 == len(lines.splitlines())
+    assert ["First.", "Zweite, ¿qué?"] == [record.text for record in checkpoint.records_from_checkpoint(checkpoint_file, "en-US", HEADER.data_size)]
+
+def test_incomplete_last_line_is_ignored(tmp_path) -> None :
+    checkpoint_file = join(tmp_path, "talk" + checkpoint.CHECKPOINT_FILE_EXTENSION)
+    writer = checkpoint.Checkpoint(checkpoint_file, join(tmp_path, "talk.wav"), "en-US", HEADER.data_size, 60)
+    for record in records() :
+        writer.add_result(record)
+    writer.write()
+    # The process died while appending a result.
+    with open(checkpoint_file, mode = "a", encoding = "utf-8") as f :
+        f.write('{"text":"Dri')
+    assert ["First.", "Zweite, ¿qué?"] == [record.text for record in checkpoint.records_from_checkpoint(checkpoint_file, "en-US", HEADER.data_size)]
+
+def test_missing_checkpoint_starts_at_the_beginning(tmp_path) -> None :
+    read = checkpoint.records_from_checkpoint(join(tmp_path, "none.json"), "en-US", HEADER.data_size)
+    assert [] == read
+    assert 0 == checkpoint.resume_offset_from_records(read)
+
+@pytest.mark.parametrize("language, data_size", [("de-DE", HEADER.data_size), ("en-US", HEADER.data_size + 2)])
+def test_checkpoint_for_other_input_fails(tmp_path, language : str, data_size : int) -> None :
+    checkpoint_file = join(tmp_path, "talk" + checkpoint.CHECKPOINT_FILE_EXTENSION)
+    checkpoint.Checkpoint(checkpoint_file, "talk.wav", "en-US", HEADER.data_size, 60).write()
+    with pytest.raises(RuntimeError, match = "not for this input and language") :
+        checkpoint.records_from_checkpoint(checkpoint_file, language, data_size)
@@ -0,0 +1,63 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+import pytest
+import caption_helper
+import delay_controller
+import helper
+
+def result(text : str, end_seconds : float) -> caption_helper.RecognitionRecord :
+    return caption_helper.RecognitionRecord(text, 0, int(end_seconds * helper.TICKS_PER_SECOND), "RecognizingSpeech")
+
+@pytest.fixture
+def controller(monkeypatch, clock) -> delay_controller.DelayController :
+    monkeypatch.setattr(delay_controller, "monotonic", clock)
+    retval = delay_controller.DelayController(0, 0, helper.ticks_from_milliseconds(5000), 0.05)
+    retval.start()
+    return retval
+
+def test_normalized_text() -> None :
+    assert "hello world" == delay_controller.normalized_text("Hello, World!")
+    assert "its 35" == delay_controller.normalized_text("It's 3.5")
+
+def test_case_and_punctuation_changes_are_not_revisions() -> None :
+    assert not delay_controller.is_revision("hello world", "Hello, world. How")
+    assert not delay_controller.is_revision("well", "well-known")
+    assert delay_controller.is_revision("hello word", "hello world")
+
+def test_final_result_is_not_compared_with_last_partial(controller, clock) -> None :
+    clock.now += 1.0
+    controller.add_result(result("four", 0.5), False)
+    clock.now += 1.0
+    # The final text is formatted differently, which is not a revision of the partial result.
+    controller.add_result(result("4.", 1.0), True)
+    assert [] == list(controller._revision_lateness)
+    assert [1.0] == list(controller._final_lateness)
+
+def test_late_revisions_raise_the_delay(controller, clock) -> None :
+    delays = []
+    for utterance in range(30) :
+        start = utterance * 10.0
+        clock.now = 100.0 + start + 0.5
+        controller.add_result(result("the whether", start + 0.5), False)
+        # The partial result is revised 2 s after its audio ended.
+        clock.now += 2.0
+        controller.add_result(result("The weather is", start + 1.0), False)
+        clock.now += 0.1
+        delay = controller.add_result(result("The weather is nice.", start + 2.0), True)
+        if delay is not None :
+            delays.append(delay)
+    # The delay rises by one step at a time until revisions are no longer late.
+    step = helper.ticks_from_milliseconds(delay_controller.MAX_STEP_MILLISECONDS)
+    assert [step, 2 * step, 3 * step, 4 * step] == delays
+    assert helper.ticks_from_milliseconds(2000) == controller.delay()
+
+def test_results_before_start_are_ignored() -> None :
+    controller = delay_controller.DelayController(0, 0, helper.ticks_from_milliseconds(5000), 0.05)
+    assert controller.add_result(result("hello", 1.0), True) is None
+    assert [] == list(controller._final_lateness)
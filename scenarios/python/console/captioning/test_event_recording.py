@@ -0,0 +1,68 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from os.path import join
+from threading import Event
+from typing import List, Tuple
+import caption_helper
+import event_recording
+
+def events(count : int) -> List[event_recording.RecordedEvent] :
+    retval = [event_recording.RecordedEvent(event_recording.SESSION_STARTED, 0.0, None)]
+    for index in range(count) :
+        is_final_result = 4 == index % 5
+        result = caption_helper.RecognitionRecord("result {}".format(index), index * 1000, 1000, "RecognizedSpeech" if is_final_result else "RecognizingSpeech")
+        retval.append(event_recording.RecordedEvent(event_recording.RECOGNIZED if is_final_result else event_recording.RECOGNIZING, index * 0.001, result))
+    return retval
+
+# Play events with speech_recognizer, and return the kind and text of each event the handlers got.
+def play(speech_recognizer : event_recording.ReplayRecognizer) -> List[Tuple[str, str]] :
+    retval : List[Tuple[str, str]] = []
+    stopped = Event()
+    speech_recognizer.recognizing.connect(lambda e : retval.append((event_recording.RECOGNIZING, e.result.text)))
+    speech_recognizer.recognized.connect(lambda e : retval.append((event_recording.RECOGNIZED, e.result.text)))
+    speech_recognizer.session_stopped.connect(lambda e : stopped.set())
+    speech_recognizer.start_continuous_recognition()
+    assert stopped.wait(10)
+    speech_recognizer.stop_continuous_recognition()
+    return retval
+
+def test_events_arrive_in_order_at_max_speed() -> None :
+    recorded = events(1000)
+    speech_recognizer = event_recording.ReplayRecognizer(recorded, 0)
+    assert [(event.event, event.result.text) for event in recorded[1:]] == play(speech_recognizer)
+    assert 1000 == len(speech_recognizer.handler_ns)
+    # At max speed, events are not timed, so there is no lag.
+    assert [] == speech_recognizer.lag_seconds
+
+def test_events_are_timed_at_speed() -> None :
+    recorded = events(20)
+    speech_recognizer = event_recording.ReplayRecognizer(recorded, 2)
+    assert [(event.event, event.result.text) for event in recorded[1:]] == play(speech_recognizer)
+    # The last event was recorded at 19 ms, so at twice the speed it is played at 9.5 ms or later.
+    assert speech_recognizer.wall_seconds >= 0.0095
+    assert 20 == len(speech_recognizer.lag_seconds)
+
+def test_canceled_event_ends_playback() -> None :
+    recorded = events(10)
+    recorded.insert(4, event_recording.RecordedEvent(event_recording.CANCELED, 0.0025, None))
+    assert 3 == len(play(event_recording.ReplayRecognizer(recorded, 0)))
+
+def test_recording_round_trip(tmp_path) -> None :
+    recording_file = join(tmp_path, "session.jsonl")
+    recorder = event_recording.EventRecorder(recording_file, { "stable_partial_result_threshold" : "3" })
+    # Record a replay, as captioning.py --record does with a live recognizer.
+    speech_recognizer = event_recording.ReplayRecognizer(events(10), 0)
+    recorder.connect(speech_recognizer)
+    texts = play(speech_recognizer)
+    recorder.close()
+    assert { "stable_partial_result_threshold" : "3" } == event_recording.settings_from_recording(recording_file)
+    recorded = event_recording.events_from_recording(recording_file)
+    assert [event_recording.SESSION_STARTED] + [kind for (kind, _) in texts] + [event_recording.SESSION_STOPPED] == [event.event for event in recorded]
+    assert [text for (_, text) in texts] == [event.result.text for event in recorded if event.result is not None]
+    assert all(earlier.arrival <= later.arrival for (earlier, later) in zip(recorded, recorded[1:]))
@@ -0,0 +1,61 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from os import listdir
+from os.path import join
+import caption_helper
+import helper
+import hls_sink
+
+SECOND = helper.TICKS_PER_SECOND
+
+def sink_in(directory : str, window : int = 3, mpegts_offset : int = 0) -> hls_sink.HlsCaptionSink :
+    return hls_sink.HlsCaptionSink(directory, True, 6, window, mpegts_offset, False)
+
+def read(directory : str, index : int) -> str :
+    with open(join(directory, hls_sink.SEGMENT_FILE.format(index)), mode = "r", encoding = "utf-8") as f :
+        return f.read()
+
+def test_cue_across_segment_boundary_is_split_and_clipped(tmp_path) -> None :
+    sink = sink_in(tmp_path)
+    sink.write("", caption_helper.Caption("en-US", 1, 1 * SECOND, 2 * SECOND, "Before."))
+    sink.write("", caption_helper.Caption("en-US", 2, 5 * SECOND, 14 * SECOND, "Across."))
+    sink.close()
+    assert "00:00:01.000 --> 00:00:02.000\nBefore.\n\n00:00:05.000 --> 00:00:06.000\nAcross.\n\n" == read(tmp_path, 0).split("\n\n", 1)[1]
+    assert "00:00:06.000 --> 00:00:12.000\nAcross.\n\n" == read(tmp_path, 1).split("\n\n", 1)[1]
+    assert "00:00:12.000 --> 00:00:14.000\nAcross.\n\n" == read(tmp_path, 2).split("\n\n", 1)[1]
+
+def test_timestamp_map_wraps_at_33_bits(tmp_path) -> None :
+    # The MPEG-TS clock is 6 s before it wraps when the first segment starts.
+    sink = sink_in(tmp_path, mpegts_offset = hls_sink.MPEGTS_WRAP - 6 * hls_sink.MPEGTS_TICKS_PER_SECOND)
+    sink.write("", caption_helper.Caption("en-US", 1, 13 * SECOND, 14 * SECOND, "Later."))
+    sink.close()
+    assert "X-TIMESTAMP-MAP=MPEGTS:{},LOCAL:00:00:00.000".format(hls_sink.MPEGTS_WRAP - 540000) in read(tmp_path, 0)
+    assert "X-TIMESTAMP-MAP=MPEGTS:0,LOCAL:00:00:06.000" in read(tmp_path, 1)
+    assert "X-TIMESTAMP-MAP=MPEGTS:540000,LOCAL:00:00:12.000" in read(tmp_path, 2)
+
+def test_old_segments_leave_the_window_and_are_deleted(tmp_path) -> None :
+    sink = sink_in(tmp_path, window = 3)
+    # One caption in each of 10 segments.
+    for index in range(10) :
+        sink.write("", caption_helper.Caption("en-US", index + 1, index * 6 * SECOND, index * 6 * SECOND + SECOND, "Caption {}.".format(index)))
+    sink.close()
+    with open(join(tmp_path, hls_sink.PLAYLIST_FILE), mode = "r", encoding = "utf-8") as f :
+        playlist = f.read().split("\n")
+    assert "#EXT-X-MEDIA-SEQUENCE:7" in playlist
+    assert [hls_sink.SEGMENT_FILE.format(index) for index in [7, 8, 9]] == [line for line in playlist if line.endswith(".vtt")]
+    assert "#EXT-X-ENDLIST" in playlist
+    # Segments that left the playlist stay for window + 1 more segments.
+    assert sorted(hls_sink.SEGMENT_FILE.format(index) for index in range(3, 10)) == sorted(name for name in listdir(tmp_path) if name.endswith(".vtt"))
+
+def test_segments_without_captions_fill_the_playlist(tmp_path) -> None :
+    sink = sink_in(tmp_path)
+    sink.write("", caption_helper.Caption("en-US", 1, 20 * SECOND, 21 * SECOND, "Late."))
+    sink.close()
+    assert "-->" not in read(tmp_path, 1)
+    assert "00:00:20.000 --> 00:00:21.000" in read(tmp_path, 3)
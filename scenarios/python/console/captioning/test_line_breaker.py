@@ -0,0 +1,142 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from typing import List
+import pytest
+import caption_helper
+import line_breaker
+
+ORDINARY_TEXT = [
+    "The quick brown fox jumps over the lazy dog, and then it runs away into the forest.",
+    "Hello everyone, welcome to today's meeting! Can you all hear me? Let's get started; we have a lot to cover.",
+    "So what I was trying to say is that we should probably look at the numbers again before we decide anything.",
+    "Yes. No. Maybe, I don't know, let me think about it for a while and get back to you later this week.",
+    "Supercalifragilisticexpialidocious is a very long word that does not fit on one short line at all.",
+]
+
+def lines_from_text(text : str, language : str, max_width : int) -> List[str] :
+    return caption_helper.CaptionHelper(language, max_width, 2, []).lines_from_text(text)
+
+# The layout before BreakIndex: for each line, search back from the maximum width for the last terminator
+# of the first tier, then of the second tier, and break at the maximum width if there is neither.
+def reference_lines_from_text(text : str, max_width : int) -> List[str] :
+    first_pass_terminators = ["?", "!", ",", ";"]
+    second_pass_terminators = [" ", "."]
+
+    def find_best_width(terminators : List[str], start_at : int) -> int :
+        check_chars = min(len(text) - start_at, max_width)
+        best_width = -1
+        for terminator in terminators :
+            width = text.rfind(terminator, start_at, start_at + check_chars) - start_at
+            if width > best_width :
+                best_width = width + len(terminator)
+        return best_width
+
+    retval : List[str] = []
+    index = 0
+    while index < len(text) :
+        while index < len(text) and " " == text[index] :
+            index += 1
+        remaining = len(text) - index
+        best_width = remaining if remaining < max_width else find_best_width(first_pass_terminators, index)
+        if best_width < 0 :
+            best_width = find_best_width(second_pass_terminators, index)
+        if best_width < 0 :
+            best_width = max_width
+        retval.append(text[index:index + best_width].strip())
+        index += best_width
+    return retval
+
+@pytest.mark.parametrize("text", ORDINARY_TEXT)
+@pytest.mark.parametrize("max_width", [10, 15, 20, 30, 37, 50])
+def test_layout_matches_reference_on_ordinary_text(text : str, max_width : int) -> None :
+    assert lines_from_text(text, "en-US", max_width) == reference_lines_from_text(text, max_width)
+
+def test_latin_prefers_clause_ends_to_spaces() -> None :
+    assert lines_from_text("The quick brown fox, which was quick, jumped over the dog.", "en-US", 25) == [
+        "The quick brown fox,",
+        "which was quick,",
+        "jumped over the dog.",
+    ]
+
+def test_latin_breaks_at_width_without_candidates() -> None :
+    assert lines_from_text("abcdefghijklmnopqrstuvwxyz", "en-US", 10) == ["abcdefghij", "klmnopqrst", "uvwxyz"]
+
+def test_decimal_point_is_not_a_break() -> None :
+    # Before BreakIndex, the first line was "We measured 3.".
+    assert lines_from_text("We measured 3.5 and 1,000 units", "en-US", 14) == ["We measured", "3.5 and 1,000", "units"]
+
+def test_thousands_separator_is_not_a_break() -> None :
+    # Before BreakIndex, the first line was "Add 1,".
+    assert lines_from_text("Add 1,000 more units now", "en-US", 10) == ["Add 1,000", "more", "units now"]
+
+def test_sentence_and_clause_ends_still_break() -> None :
+    assert lines_from_text("Yes, and no more of that", "en-US", 10) == ["Yes,", "and no", "more of", "that"]
+    assert lines_from_text("Done. Next one is here", "en-US", 8) == ["Done.", "Next", "one is", "here"]
+
+def test_zh_breaks_after_ideographic_comma() -> None :
+    assert lines_from_text("今天天气很好，我们去公园散步吧。明天再见", "zh-CN", 10) == ["今天天气很好，", "我们去公园散步吧。", "明天再见"]
+
+def test_zh_line_does_not_start_with_closing_punctuation() -> None :
+    # Breaking at the width would start the second line with "。", so the first line gives up a character.
+    assert lines_from_text("一二三四五六七八九。十一", "zh-CN", 9) == ["一二三四五六七八", "九。十一"]
+
+def test_zh_line_does_not_end_with_opening_punctuation() -> None :
+    assert lines_from_text("一二三四五六七八「九十」", "zh-CN", 9) == ["一二三四五六七八", "「九十」"]
+
+def test_zh_uses_mbcs_width_by_default() -> None :
+    helper_zh = caption_helper.CaptionHelper("zh-CN", caption_helper.helper.DEFAULT_MAX_LINE_LENGTH_SBCS, 2, [])
+    assert caption_helper.helper.DEFAULT_MAX_LINE_LENGTH_MBCS == helper_zh.get_max_width()
+
+def test_ja_breaks_after_ideographic_comma() -> None :
+    assert lines_from_text("これはテストです、よろしくお願いします", "ja-JP", 10) == ["これはテストです、", "よろしくお願いします"]
+
+def test_ja_line_does_not_start_with_small_kana() -> None :
+    assert lines_from_text("あいうえおかきくけこっさ", "ja-JP", 10) == ["あいうえおかきくけ", "こっさ"]
+
+def test_ko_breaks_at_spaces_and_commas() -> None :
+    assert lines_from_text("안녕하세요 여러분, 오늘은 좋은 날입니다", "ko-KR", 12) == ["안녕하세요 여러분,", "오늘은 좋은 날입니다"]
+
+def test_th_breaks_at_syllables_without_spaces() -> None :
+    # Lines can end before the leading vowels "ไ", "โ" and "เ". With no candidate in the second line, it breaks at the width.
+    assert lines_from_text("ฉันไปโรงเรียนทุกวัน", "th-TH", 8) == ["ฉันไปโรง", "เรียนทุก", "วัน"]
+
+def test_th_prefers_spaces_to_syllables() -> None :
+    assert lines_from_text("ฉันไปโรงเรียน ทุกวัน", "th-TH", 16) == ["ฉันไปโรงเรียน", "ทุกวัน"]
+
+def test_combining_marks_stay_with_their_base() -> None :
+    # "e" followed by a combining acute accent must not be split across lines.
+    assert lines_from_text("abcdefghie\u0301jk", "en-US", 10) == ["abcdefghi", "e\u0301jk"]
+
+def test_rules_from_language() -> None :
+    assert line_breaker.RULES_BY_LANGUAGE["zh"] is line_breaker.rules_from_language("zh-Hans")
+    assert line_breaker.RULES_BY_LANGUAGE["th"] is line_breaker.rules_from_language("TH-th")
+    assert line_breaker.DEFAULT_RULES is line_breaker.rules_from_language("de-DE")
+    assert line_breaker.DEFAULT_RULES is line_breaker.rules_from_language(None)
+
+def test_break_index_cache_reuses_index_for_same_text() -> None :
+    cache = line_breaker.BreakIndexCache(line_breaker.DEFAULT_RULES)
+    text = ORDINARY_TEXT[0]
+    (first, base) = cache.break_index(text)
+    assert 0 == base
+    # A later base can use the index built from an earlier one.
+    assert (first, 0) == cache.break_index(text, 10)
+    (second, base) = cache.break_index(text + " More.")
+    assert second is not first and 0 == base
+
+def test_break_index_cache_rebuilds_for_earlier_base() -> None :
+    cache = line_breaker.BreakIndexCache(line_breaker.DEFAULT_RULES)
+    text = ORDINARY_TEXT[0]
+    (first, base) = cache.break_index(text, 10)
+    assert 10 == base
+    (second, base) = cache.break_index(text, 5)
+    assert second is not first and 5 == base
+    # Widths from a base are the same as from the start of the text.
+    full = line_breaker.BreakIndex(text, line_breaker.DEFAULT_RULES)
+    for start in range(10, len(text)) :
+        assert full.best_width(start, 20) == second.best_width(start - 5, 20)
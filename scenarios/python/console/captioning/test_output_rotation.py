@@ -0,0 +1,73 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from gzip import open as gzip_open
+from json import load
+from os import listdir
+from os.path import join
+from typing import List
+import caption_helper
+import caption_sink
+import helper
+import output_rotation
+
+HEADER = "WEBVTT\n\n"
+
+def caption_text(caption : caption_helper.Caption) -> str :
+    return "{} --> {}\n{}\n\n".format(helper.timestamp_from_ticks(caption.begin), helper.timestamp_from_ticks(caption.end), caption.text)
+
+# Each caption lasts 1.5 seconds, and starts 2 seconds after the one before.
+def captions(count : int) -> List[caption_helper.Caption] :
+    return [caption_helper.Caption(None, index + 1, index * 2 * helper.TICKS_PER_SECOND, (index * 4 + 3) * helper.TICKS_PER_SECOND // 2, "Caption {}".format(index)) for index in range(count)]
+
+# Write captions to output_file, rotating it after every two captions.
+def write_rotated(output_file : str, compress : bool) -> List[caption_helper.Caption] :
+    written = captions(5)
+    rotate_bytes = len(HEADER) + len(caption_text(written[0])) * 2
+    rotation = output_rotation.OutputRotation(output_file, rotate_bytes, None, compress)
+    sink = caption_sink.CaptionSink(output_file, True, 1, 60.0, None, rotation = rotation)
+    sink.write_header(HEADER)
+    for caption in written :
+        sink.write(caption_text(caption), caption)
+    sink.close()
+    return written
+
+def manifest(output_file : str) -> List[dict] :
+    with open(output_file + output_rotation.MANIFEST_FILE_EXTENSION, mode = "r", encoding = "utf-8") as f :
+        return load(f)["files"]
+
+def test_manifest_records_the_span_of_each_file(tmp_path) -> None :
+    output_file = join(tmp_path, "captions.vtt")
+    written = write_rotated(output_file, False)
+    assert [
+        { "file" : "captions.00001.vtt", "start" : 0.0, "end" : 3.5, "captions" : 2, "bytes" : len(HEADER) + len(caption_text(written[0]) + caption_text(written[1])) },
+        { "file" : "captions.00002.vtt", "start" : 4.0, "end" : 7.5, "captions" : 2, "bytes" : len(HEADER) + len(caption_text(written[2]) + caption_text(written[3])) },
+        { "file" : "captions.vtt", "start" : 8.0, "end" : 9.5, "captions" : 1, "bytes" : len(HEADER) + len(caption_text(written[4])) },
+    ] == manifest(output_file)
+    # Each file starts with the header and has only the captions listed for it.
+    for (entry, expected) in zip(manifest(output_file), [written[0:2], written[2:4], written[4:]]) :
+        with open(join(tmp_path, entry["file"]), mode = "r", encoding = "utf-8") as f :
+            assert HEADER + "".join(caption_text(caption) for caption in expected) == f.read()
+
+def test_rotated_files_are_compressed(tmp_path) -> None :
+    output_file = join(tmp_path, "captions.vtt")
+    written = write_rotated(output_file, True)
+    entries = manifest(output_file)
+    assert ["captions.00001.vtt.gz", "captions.00002.vtt.gz", "captions.vtt"] == [entry["file"] for entry in entries]
+    assert sorted(entry["file"] for entry in entries) + ["captions.vtt" + output_rotation.MANIFEST_FILE_EXTENSION] == sorted(listdir(tmp_path))
+    with gzip_open(join(tmp_path, entries[1]["file"]), mode = "rt", encoding = "utf-8") as f :
+        assert HEADER + caption_text(written[2]) + caption_text(written[3]) == f.read()
+    # The times do not change when a file is compressed.
+    assert [(0.0, 3.5), (4.0, 7.5), (8.0, 9.5)] == [(entry["start"], entry["end"]) for entry in entries]
+
+def test_rotation_by_interval() -> None :
+    rotation = output_rotation.OutputRotation("captions.vtt", None, 60.0, False)
+    assert not rotation.is_due(1 << 30, 100.0, 159.9)
+    assert rotation.is_due(0, 100.0, 160.0)
+    assert "captions.00001.vtt" == rotation.next_file_name()
+    assert "captions.00002.vtt" == rotation.next_file_name()
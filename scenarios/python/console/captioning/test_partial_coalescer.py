@@ -0,0 +1,93 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from typing import Callable, List, Tuple
+import pytest
+import caption_helper
+import partial_coalescer
+
+# Replaces threading.Timer, so the tests decide when a timer fires.
+class ManualTimer(object) :
+    timers : List["ManualTimer"] = []
+
+    def __init__(self, interval : float, function : Callable, args : tuple) :
+        self.interval = interval
+        self._function = function
+        self._args = args
+        self.canceled = False
+        self.daemon = False
+        ManualTimer.timers.append(self)
+
+    def start(self) -> None :
+        pass
+
+    def cancel(self) -> None :
+        self.canceled = True
+
+    def fire(self) -> None :
+        self._function(*self._args)
+
+@pytest.fixture
+def coalescer(monkeypatch, clock) -> Tuple[partial_coalescer.PartialCoalescer, List[Tuple[str, bool]]] :
+    ManualTimer.timers = []
+    monkeypatch.setattr(partial_coalescer, "monotonic", clock)
+    monkeypatch.setattr(partial_coalescer, "Timer", ManualTimer)
+    emitted : List[Tuple[str, bool]] = []
+    # At most 10 partial results per second.
+    retval = partial_coalescer.PartialCoalescer(10, lambda result, is_final_result : emitted.append((result.text, is_final_result)))
+    return (retval, emitted)
+
+def result(text : str) -> caption_helper.RecognitionRecord :
+    return caption_helper.RecognitionRecord(text, 0, 0, "RecognizingSpeech")
+
+def test_partial_results_within_interval_are_replaced(coalescer, clock) -> None :
+    (coalescer, emitted) = coalescer
+    coalescer.add_result(result("one"), False)
+    clock.now += 0.02
+    coalescer.add_result(result("one two"), False)
+    clock.now += 0.02
+    coalescer.add_result(result("one two three"), False)
+    assert [("one", False)] == emitted
+    assert 1 == len(ManualTimer.timers)
+    # The timer fires when the interval since the first result has passed.
+    assert pytest.approx(0.08) == ManualTimer.timers[0].interval
+    clock.now += 0.06
+    ManualTimer.timers[0].fire()
+    assert [("one", False), ("one two three", False)] == emitted
+    assert 1 == coalescer.coalesced_results
+
+def test_partial_result_after_interval_is_passed_on(coalescer, clock) -> None :
+    (coalescer, emitted) = coalescer
+    coalescer.add_result(result("one"), False)
+    clock.now += 0.2
+    coalescer.add_result(result("one two"), False)
+    assert [("one", False), ("one two", False)] == emitted
+    assert [] == ManualTimer.timers
+
+def test_final_result_replaces_held_partial_result(coalescer, clock) -> None :
+    (coalescer, emitted) = coalescer
+    coalescer.add_result(result("one"), False)
+    clock.now += 0.01
+    coalescer.add_result(result("one two"), False)
+    coalescer.add_result(result("One, two."), True)
+    assert [("one", False), ("One, two.", True)] == emitted
+    assert ManualTimer.timers[0].canceled
+    # A timer that fires after it was canceled does nothing.
+    ManualTimer.timers[0].fire()
+    assert 2 == len(emitted)
+    assert 1 == coalescer.coalesced_results
+
+def test_flush_passes_on_held_partial_result(coalescer, clock) -> None :
+    (coalescer, emitted) = coalescer
+    coalescer.add_result(result("one"), False)
+    clock.now += 0.01
+    coalescer.add_result(result("one two"), False)
+    coalescer.flush()
+    assert [("one", False), ("one two", False)] == emitted
+    coalescer.flush()
+    assert 2 == len(emitted)
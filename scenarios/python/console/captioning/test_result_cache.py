@@ -0,0 +1,69 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from os.path import join
+from typing import List
+import pytest
+import caption_helper
+import caption_renderer
+import helper
+import rerender
+import result_cache
+import user_config_helper
+
+SECOND = helper.TICKS_PER_SECOND
+
+def results() -> List[caption_helper.RecognitionRecord] :
+    return [
+        caption_helper.RecognitionRecord("so what", 1 * SECOND, SECOND, "TranslatingSpeech", { "fr" : "alors" }),
+        caption_helper.RecognitionRecord("so what I was trying", 1 * SECOND, 2 * SECOND, "TranslatingSpeech", { "fr" : "alors ce que" }),
+        caption_helper.RecognitionRecord("So what I was trying to say is that we should look at the numbers again.", 1 * SECOND, 4 * SECOND, "TranslatedSpeech", { "fr" : "Alors, ce que je voulais dire, c'est qu'il faut revoir les chiffres." }),
+        caption_helper.RecognitionRecord("Does that make sense?", 6 * SECOND, 2 * SECOND, "TranslatedSpeech", { "fr" : "Est-ce que cela a du sens ?" }),
+    ]
+
+def write_cache(cache_file : str) -> None :
+    writer = result_cache.ResultCacheWriter(cache_file, "en-US")
+    for result in results() :
+        writer.write(result)
+    writer.close()
+
+def user_config_from(monkeypatch, args : List[str]) -> helper.Read_Only_Dict :
+    monkeypatch.setattr(user_config_helper, "argv", ["rerender.py"] + args)
+    return user_config_helper.user_config_from_args(rerender.USAGE, connect = False)
+
+# Render the results straight from memory, as captioning.py does.
+def direct_render(user_config : helper.Read_Only_Dict, track : str = None) -> str :
+    renderer = caption_renderer.CaptionRenderer(user_config)
+    retval = renderer.file_header()
+    for result in results() :
+        if track is not None :
+            result = caption_helper.RecognitionRecord.from_translation(result, track)
+        is_final_result = caption_helper.reason_name(result.reason) in caption_helper.FINAL_RESULT_REASONS
+        retval += "".join(renderer.string_from_caption(caption) for caption in renderer.captions_from_result(result, is_final_result))
+    retval += "".join(renderer.string_from_caption(caption) for caption in renderer.final_captions())
+    return retval + renderer.file_footer()
+
+def test_cache_round_trip(tmp_path) -> None :
+    cache_file = join(tmp_path, "talk" + result_cache.CACHE_FILE_EXTENSION)
+    write_cache(cache_file)
+    records = list(result_cache.records_from_cache(cache_file))
+    assert [(result.text, result.offset, result.duration, result.reason, result.translations) for result in results()] == \
+        [(record.text, record.offset, record.duration, record.reason, record.translations) for record in records]
+    assert "en-US" == result_cache.language_from_cache(cache_file)
+
+@pytest.mark.parametrize("args", [[], ["--realTime"], ["--srt", "--maxLineLength", "20"], ["--realTime", "--track", "fr"]])
+def test_rerender_matches_direct_render(tmp_path, monkeypatch, args : List[str]) -> None :
+    cache_file = join(tmp_path, "talk" + result_cache.CACHE_FILE_EXTENSION)
+    output_file = join(tmp_path, "talk.out")
+    write_cache(cache_file)
+    user_config = user_config_from(monkeypatch, ["--input", cache_file, "--quiet"] + args)
+    captions = rerender.rerender(user_config, cache_file, output_file)
+    assert captions > 0
+    track = "fr" if "--track" in args else None
+    with open(output_file, mode = "r", encoding = "utf-8", newline = "") as f :
+        assert direct_render(helper.Read_Only_Dict(dict(user_config, language = track or "en-US")), track) == f.read()
@@ -0,0 +1,70 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from threading import Thread
+from typing import List
+import ring_buffer
+
+# How long we wait to decide that a thread is blocked.
+BLOCKED_SECONDS = 0.2
+
+def read_all(buffer : ring_buffer.RingBuffer) -> bytes :
+    retval = b""
+    while True :
+        data = buffer.read(3)
+        if not data :
+            return retval
+        retval += data
+
+def test_data_wraps_around_the_end_of_the_buffer() -> None :
+    buffer = ring_buffer.RingBuffer(8)
+    assert buffer.write(b"abcdef")
+    assert b"abc" == buffer.read(3)
+    # This write wraps around to the start of the buffer.
+    assert buffer.write(b"ghijk")
+    buffer.close()
+    assert b"defghijk" == read_all(buffer)
+
+def test_full_buffer_blocks_the_writer_until_read() -> None :
+    buffer = ring_buffer.RingBuffer(4)
+    results : List[bool] = []
+    writer = Thread(target = lambda : results.append(buffer.write(b"abcdefgh")), daemon = True)
+    writer.start()
+    writer.join(BLOCKED_SECONDS)
+    assert writer.is_alive()
+    assert b"abcd" == buffer.read(4)
+    writer.join(5)
+    assert not writer.is_alive()
+    assert [True] == results
+    assert b"efgh" == buffer.read(4)
+
+def test_close_unblocks_the_writer() -> None :
+    buffer = ring_buffer.RingBuffer(4)
+    results : List[bool] = []
+    writer = Thread(target = lambda : results.append(buffer.write(b"abcdefgh")), daemon = True)
+    writer.start()
+    writer.join(BLOCKED_SECONDS)
+    assert writer.is_alive()
+    buffer.close()
+    writer.join(5)
+    # The data was not all written.
+    assert [False] == results
+    # The reader still gets the data that was written, then end of stream.
+    assert b"abcd" == read_all(buffer)
+
+def test_close_unblocks_the_reader() -> None :
+    buffer = ring_buffer.RingBuffer(4)
+    results : List[bytes] = []
+    reader = Thread(target = lambda : results.append(buffer.read(4)), daemon = True)
+    reader.start()
+    reader.join(BLOCKED_SECONDS)
+    assert reader.is_alive()
+    buffer.close()
+    reader.join(5)
+    assert [b""] == results
+    assert not buffer.write(b"a")
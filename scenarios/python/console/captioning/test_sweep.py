@@ -0,0 +1,52 @@
+#
+# Copyright (c) Microsoft. All rights reserved.
+# Licensed under the MIT license. See LICENSE.md file in the project root for full license information.
+#
+
+# Run with: python -m pytest -q
+# These tests do not import the Speech SDK.
+
+from typing import List
+import caption_helper
+import event_recording
+import helper
+import sweep
+import user_config_helper
+
+def event(text : str, begin_seconds : float, end_seconds : float, is_final_result : bool, arrival : float) -> event_recording.RecordedEvent :
+    reason = "RecognizedSpeech" if is_final_result else "RecognizingSpeech"
+    begin = int(begin_seconds * helper.TICKS_PER_SECOND)
+    result = caption_helper.RecognitionRecord(text, begin, int(end_seconds * helper.TICKS_PER_SECOND) - begin, reason)
+    return event_recording.RecordedEvent("recognized" if is_final_result else "recognizing", arrival, result)
+
+def sweep_events(monkeypatch, events : List[event_recording.RecordedEvent]) -> sweep.SweepResult :
+    monkeypatch.setattr(user_config_helper, "argv", ["sweep.py", "--realTime", "--delay", "0"])
+    result = sweep.SweepResult(sweep.DEFAULT_THRESHOLD, 0)
+    sweep.sweep_recording(user_config_helper.user_config_from_args(sweep.USAGE, connect = False), events, result)
+    return result
+
+def test_rewrites_are_counted_per_final_caption(monkeypatch) -> None :
+    result = sweep_events(monkeypatch, [
+        event("one", 0.5, 1.0, False, 1.1),
+        event("one two", 0.5, 1.5, False, 1.6),
+        # This result ends before the previous one, so it is dropped and is not a rewrite.
+        event("one", 0.5, 1.2, False, 1.7),
+        event("one two three", 0.5, 2.0, False, 2.1),
+        event("One, two, three.", 0.5, 2.0, True, 2.5),
+        event("Four.", 3.0, 3.5, True, 3.6),
+    ])
+    report = result.to_dict()
+    assert 4 == result.partial_results and 2 == result.final_results
+    assert 5 == report["captions"]
+    # Three partial captions before the first final caption, and none before the second.
+    assert 1.5 == report["rewrites_per_caption"]
+
+def test_late_revisions_ignore_formatting_and_final_results(monkeypatch) -> None :
+    result = sweep_events(monkeypatch, [
+        event("hello world", 0.0, 1.0, False, 1.1),
+        event("Hello, world. How", 0.0, 1.5, False, 1.6),
+        event("hello word how are", 0.0, 2.0, False, 2.1),
+        event("Hello, world. How are you?", 0.0, 2.5, True, 2.6),
+    ])
+    assert 1 == result.late_revisions
+    assert 1 / 3 == result.to_dict()["late_revision_rate"]
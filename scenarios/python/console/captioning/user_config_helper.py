@@ -7,14 +7,28 @@ from datetime import timedelta
 from enum import Enum
 from os import linesep, environ
 from sys import argv
-from typing import List, Optional
-import azure.cognitiveservices.speech as speechsdk # type: ignore
+from typing import List, Optional, Tuple
+import caption_metrics
+import caption_sink
+import channel_helper
+import checkpoint
+import delay_controller
 import helper
+import hls_sink
 
 class CaptioningMode(Enum):
     OFFLINE = 1
     REALTIME = 2
 
+# Each value is also the extension of a caption file in that format.
+class CaptionFormat(object) :
+    WEBVTT = "vtt"
+    SRT = "srt"
+    # A JSON array of cues, each with sequence, start and end in seconds, and text.
+    JSON = "json"
+
+CAPTION_FORMATS = [CaptionFormat.WEBVTT, CaptionFormat.SRT, CaptionFormat.JSON]
+
 def get_cmd_option(option : str) -> Optional[str] :
     argc = len(argv)
     if option.lower() in list(map(lambda arg: arg.lower(), argv)) :
@@ -44,60 +58,133 @@ def get_phrases() -> List[str] :
         retval = list(map(lambda phrase : phrase.strip(), phrases.split(';')))
     return retval
 
-def get_compressed_audio_format() -> speechsdk.AudioStreamContainerFormat :
+def get_target_languages() -> List[str] :
+    retval : List[str] = []
+    languages = get_cmd_option("--translate")
+    if languages is not None :
+        retval = [language.strip() for language in languages.split(';') if language.strip()]
+    return retval
+
+# Returns the caption formats to write, the first of which is written to the --output file.
+def get_caption_formats(usage : str) -> List[str] :
+    formats = get_cmd_option("--formats")
+    if formats is None :
+        return [CaptionFormat.SRT if cmd_option_exists("--srt") else CaptionFormat.WEBVTT]
+    retval : List[str] = []
+    for caption_format in [caption_format.strip().lower() for caption_format in formats.split(';') if caption_format.strip()] :
+        if caption_format not in CAPTION_FORMATS :
+            raise RuntimeError("Unknown caption format {} in --formats. Valid values: {}{}{}".format(caption_format, ", ".join(CAPTION_FORMATS), linesep, usage))
+        if caption_format not in retval :
+            retval.append(caption_format)
+    if not retval :
+        raise RuntimeError("Please provide at least one caption format with the --formats option.{}{}".format(linesep, usage))
+    return retval
+
+# Returns the (name, max_line_length, lines) of each layout in --layouts "NAME=LENGTHxLINES;...".
+def get_caption_layouts(usage : str) -> List[Tuple[str, int, int]] :
+    retval : List[Tuple[str, int, int]] = []
+    layouts = get_cmd_option("--layouts")
+    if layouts is None :
+        return retval
+    for layout in [layout.strip() for layout in layouts.split(';') if layout.strip()] :
+        try :
+            (name, size) = layout.split('=')
+            (s_max_line_length, s_lines) = size.lower().split('x')
+            (int_max_line_length, int_lines) = (int(s_max_line_length), int(s_lines))
+        except ValueError :
+            raise RuntimeError("Invalid layout {} in --layouts. Use NAME=LENGTHxLINES, for example mobile=20x3.{}{}".format(layout, linesep, usage))
+        name = name.strip()
+        if not name or name in [existing[0] for existing in retval] :
+            raise RuntimeError("Each layout in --layouts needs a unique name.{}{}".format(linesep, usage))
+        # The same limits as --maxLineLength and --lines.
+        retval.append((name, max(int_max_line_length, 20), int_lines if int_lines >= 1 else 2))
+    return retval
+
+# We keep the names of Speech SDK enum members, rather than the members, so this module does not import the SDK.
+# Returns the name of a speechsdk.AudioStreamContainerFormat member.
+def get_compressed_audio_format() -> str :
     value = get_cmd_option("--format")
     if value is None :
-        return speechsdk.AudioStreamContainerFormat.ANY
+        return "ANY"
     else :
         value = value.lower()
-        if "alaw" == value : return speechsdk.AudioStreamContainerFormat.ALAW
-        elif "flac" == value : return speechsdk.AudioStreamContainerFormat.FLAC
-        elif "mp3" == value : return speechsdk.AudioStreamContainerFormat.MP3
-        elif "mulaw" == value : return speechsdk.AudioStreamContainerFormat.MULAW
-        elif "ogg_opus" == value : return speechsdk.AudioStreamContainerFormat.OGG_OPUS
-        else : return speechsdk.AudioStreamContainerFormat.ANY;
-
-def get_profanity_option() -> speechsdk.ProfanityOption :
+        if "alaw" == value : return "ALAW"
+        elif "flac" == value : return "FLAC"
+        elif "mp3" == value : return "MP3"
+        elif "mulaw" == value : return "MULAW"
+        elif "ogg_opus" == value : return "OGG_OPUS"
+        else : return "ANY";
+
+# Returns the name of a speechsdk.ProfanityOption member.
+def get_profanity_option() -> str :
     value = get_cmd_option("--profanity")
     if value is None :
-        return speechsdk.ProfanityOption.Masked
+        return "Masked"
     else :
         value = value.lower()
-        if "raw"  == value: return speechsdk.ProfanityOption.Raw
-        elif "remove" == value : return speechsdk.ProfanityOption.Removed
-        else : return speechsdk.ProfanityOption.Masked
+        if "raw"  == value: return "Raw"
+        elif "remove" == value : return "Removed"
+        else : return "Masked"
 
-def user_config_from_args(usage : str) -> helper.Read_Only_Dict :
+# If connect is False, the caller does not use the Speech service, so the key and region are not required.
+def user_config_from_args(usage : str, connect : bool = True) -> helper.Read_Only_Dict :
     keyEnv = environ["SPEECH_KEY"] if "SPEECH_KEY" in environ else None
     keyOption = get_cmd_option("--key")
     key = keyOption if keyOption is not None else keyEnv
-    if key is None :
+    if key is None and connect :
         raise RuntimeError("Please set the SPEECH_KEY environment variable or provide a Speech resource key with the --key option.{}{}".format(linesep, usage))
 
     regionEnv = environ["SPEECH_REGION"] if "SPEECH_REGION" in environ else None
     regionOption = get_cmd_option("--region")
     region = regionOption if regionOption is not None else regionEnv
-    if region is None :
+    if region is None and connect :
         raise RuntimeError("Please set the SPEECH_REGION environment variable or provide a Speech resource region with the --region option.{}{}".format(linesep, usage))
 
     captioning_mode = CaptioningMode.REALTIME if cmd_option_exists("--realtime") and not cmd_option_exists("--offline") else CaptioningMode.OFFLINE
 
-    td_remain_time = timedelta(milliseconds=1000)
+    # remain_time and delay are in ticks, to match the caption timeline.
+    ticks_remain_time = helper.ticks_from_milliseconds(1000)
     s_remain_time = get_cmd_option("--remainTime")
     if s_remain_time is not None :
         int_remain_time = float(s_remain_time)
         if int_remain_time < 0 :
             int_remain_time = 1000
-        td_remain_time = timedelta(milliseconds=int_remain_time)
+        ticks_remain_time = helper.ticks_from_milliseconds(int_remain_time)
 
-    td_delay = timedelta(milliseconds=1000)
+    ticks_delay = helper.ticks_from_milliseconds(1000)
     s_delay = get_cmd_option("--delay")
     if s_delay is not None :
         int_delay = float(s_delay)
         if int_delay < 0 :
             int_delay = 1000
-        td_delay = timedelta(milliseconds=int_delay)
+        ticks_delay = helper.ticks_from_milliseconds(int_delay)
     
+    ticks_min_delay = helper.ticks_from_milliseconds(delay_controller.DEFAULT_MIN_DELAY_MILLISECONDS)
+    s_min_delay = get_cmd_option("--minDelay")
+    if s_min_delay is not None :
+        ticks_min_delay = helper.ticks_from_milliseconds(max(float(s_min_delay), 0))
+
+    ticks_max_delay = helper.ticks_from_milliseconds(delay_controller.DEFAULT_MAX_DELAY_MILLISECONDS)
+    s_max_delay = get_cmd_option("--maxDelay")
+    if s_max_delay is not None :
+        ticks_max_delay = helper.ticks_from_milliseconds(max(float(s_max_delay), 0))
+
+    float_target_revision_rate = delay_controller.DEFAULT_TARGET_REVISION_RATE
+    s_target_revision_rate = get_cmd_option("--targetRevisionRate")
+    if s_target_revision_rate is not None :
+        float_target_revision_rate = float(s_target_revision_rate)
+        if float_target_revision_rate < 0 or float_target_revision_rate > 1 :
+            float_target_revision_rate = delay_controller.DEFAULT_TARGET_REVISION_RATE
+
+    float_max_partial_rate : Optional[float] = None
+    s_max_partial_rate = get_cmd_option("--maxPartialRate")
+    if s_max_partial_rate is not None :
+        float_max_partial_rate = float(s_max_partial_rate)
+        if float_max_partial_rate <= 0 :
+            float_max_partial_rate = None
+
+    caption_formats = get_caption_formats(usage)
+
     int_max_line_length = helper.DEFAULT_MAX_LINE_LENGTH_SBCS
     s_max_line_length = get_cmd_option("--maxLineLength")
     if s_max_line_length is not None :
@@ -112,19 +199,187 @@ def user_config_from_args(usage : str) -> helper.Read_Only_Dict :
         if int_lines < 1 :
             int_lines = 2
 
+    int_flush_bytes = caption_sink.DEFAULT_FLUSH_BYTES
+    s_flush_bytes = get_cmd_option("--flushBytes")
+    if s_flush_bytes is not None :
+        int_flush_bytes = int(s_flush_bytes)
+        if int_flush_bytes < 1 :
+            int_flush_bytes = caption_sink.DEFAULT_FLUSH_BYTES
+
+    td_flush_interval = timedelta(milliseconds=caption_sink.DEFAULT_FLUSH_INTERVAL_MILLISECONDS)
+    s_flush_interval = get_cmd_option("--flushInterval")
+    if s_flush_interval is not None :
+        int_flush_interval = float(s_flush_interval)
+        if int_flush_interval < 0 :
+            int_flush_interval = caption_sink.DEFAULT_FLUSH_INTERVAL_MILLISECONDS
+        td_flush_interval = timedelta(milliseconds=int_flush_interval)
+
+    int_rotate_bytes : Optional[int] = None
+    s_rotate_bytes = get_cmd_option("--rotateBytes")
+    if s_rotate_bytes is not None :
+        int_rotate_bytes = int(s_rotate_bytes)
+        if int_rotate_bytes < 1 :
+            int_rotate_bytes = None
+
+    float_rotate_interval_seconds : Optional[float] = None
+    s_rotate_interval_seconds = get_cmd_option("--rotateInterval")
+    if s_rotate_interval_seconds is not None :
+        float_rotate_interval_seconds = float(s_rotate_interval_seconds)
+        if float_rotate_interval_seconds <= 0 :
+            float_rotate_interval_seconds = None
+
+    td_fsync_interval : Optional[timedelta] = None
+    s_fsync_interval = get_cmd_option("--fsyncInterval")
+    if s_fsync_interval is not None :
+        int_fsync_interval = float(s_fsync_interval)
+        if int_fsync_interval >= 0 :
+            td_fsync_interval = timedelta(milliseconds=int_fsync_interval)
+
+    int_concurrency = 4
+    s_concurrency = get_cmd_option("--concurrency")
+    if s_concurrency is not None :
+        int_concurrency = int(s_concurrency)
+        if int_concurrency < 1 :
+            int_concurrency = 4
+
+    int_parallel_sessions : Optional[int] = None
+    s_parallel_sessions = get_cmd_option("--parallel")
+    if s_parallel_sessions is not None :
+        int_parallel_sessions = max(int(s_parallel_sessions), 1)
+
+    int_serve_port : Optional[int] = None
+    s_serve_port = get_cmd_option("--serve")
+    if s_serve_port is not None :
+        int_serve_port = int(s_serve_port)
+        if int_serve_port < 0 :
+            int_serve_port = None
+
+    s_serve_host = get_cmd_option("--serveHost")
+    serve_host = s_serve_host if s_serve_host is not None else "localhost"
+
+    float_hls_segment_seconds = float(hls_sink.DEFAULT_SEGMENT_SECONDS)
+    s_hls_segment_seconds = get_cmd_option("--hlsSegmentLength")
+    if s_hls_segment_seconds is not None :
+        float_hls_segment_seconds = float(s_hls_segment_seconds)
+        if float_hls_segment_seconds <= 0 :
+            float_hls_segment_seconds = float(hls_sink.DEFAULT_SEGMENT_SECONDS)
+
+    int_hls_window = hls_sink.DEFAULT_WINDOW
+    s_hls_window = get_cmd_option("--hlsWindow")
+    if s_hls_window is not None :
+        int_hls_window = max(int(s_hls_window), hls_sink.MINIMUM_WINDOW)
+
+    int_mpegts_offset = 0
+    s_mpegts_offset = get_cmd_option("--mpegtsOffset")
+    if s_mpegts_offset is not None :
+        int_mpegts_offset = int(s_mpegts_offset) % hls_sink.MPEGTS_WRAP
+
+    int_samples_per_second = helper.DEFAULT_SAMPLES_PER_SECOND
+    s_samples_per_second = get_cmd_option("--sampleRate")
+    if s_samples_per_second is not None :
+        int_samples_per_second = int(s_samples_per_second)
+        if int_samples_per_second < 8000 :
+            int_samples_per_second = helper.DEFAULT_SAMPLES_PER_SECOND
+
+    metrics_format = caption_metrics.MetricsFormat.JSON
+    s_metrics_format = get_cmd_option("--metricsFormat")
+    if s_metrics_format is not None and caption_metrics.MetricsFormat.PROMETHEUS == s_metrics_format.lower() :
+        metrics_format = caption_metrics.MetricsFormat.PROMETHEUS
+
+    float_metrics_interval_seconds = float(caption_metrics.DEFAULT_INTERVAL_SECONDS)
+    s_metrics_interval_seconds = get_cmd_option("--metricsInterval")
+    if s_metrics_interval_seconds is not None :
+        float_metrics_interval_seconds = float(s_metrics_interval_seconds)
+        if float_metrics_interval_seconds <= 0 :
+            float_metrics_interval_seconds = float(caption_metrics.DEFAULT_INTERVAL_SECONDS)
+
+    int_dispatch_threads = channel_helper.DEFAULT_DISPATCH_THREADS
+    s_dispatch_threads = get_cmd_option("--dispatchThreads")
+    if s_dispatch_threads is not None :
+        int_dispatch_threads = max(int(s_dispatch_threads), 1)
+
+    float_health_interval_seconds = float(channel_helper.DEFAULT_HEALTH_INTERVAL_SECONDS)
+    s_health_interval_seconds = get_cmd_option("--healthInterval")
+    if s_health_interval_seconds is not None :
+        float_health_interval_seconds = float(s_health_interval_seconds)
+        if float_health_interval_seconds <= 0 :
+            float_health_interval_seconds = float(channel_helper.DEFAULT_HEALTH_INTERVAL_SECONDS)
+
+    float_checkpoint_interval_seconds = float(checkpoint.DEFAULT_INTERVAL_SECONDS)
+    s_checkpoint_interval_seconds = get_cmd_option("--checkpointInterval")
+    if s_checkpoint_interval_seconds is not None :
+        float_checkpoint_interval_seconds = float(s_checkpoint_interval_seconds)
+        if float_checkpoint_interval_seconds <= 0 :
+            float_checkpoint_interval_seconds = float(checkpoint.DEFAULT_INTERVAL_SECONDS)
+
+    float_segment_seconds : Optional[float] = None
+    s_segment_seconds = get_cmd_option("--segmentLength")
+    if s_segment_seconds is not None :
+        float_segment_seconds = float(s_segment_seconds)
+        if float_segment_seconds <= 0 :
+            float_segment_seconds = None
+
     return helper.Read_Only_Dict({
         "use_compressed_audio" : cmd_option_exists("--format"),
         "compressed_audio_format" : get_compressed_audio_format(),
         "profanity_option" : get_profanity_option(),
         "language" : get_language(),
+        "target_languages" : get_target_languages(),
+        # The language of a translation caption track. None for the recognition language.
+        "target_language" : None,
         "input_file" : get_cmd_option("--input"),
+        "use_stdin" : cmd_option_exists("--stdin"),
+        "ffmpeg_source" : get_cmd_option("--ffmpeg"),
+        "samples_per_second" : int_samples_per_second,
+        "batch_input" : get_cmd_option("--batch"),
+        "channels_file" : get_cmd_option("--channels"),
+        "dispatch_threads" : int_dispatch_threads,
+        "health_file" : get_cmd_option("--health"),
+        "health_interval_seconds" : float_health_interval_seconds,
+        "batch_output_directory" : get_cmd_option("--outputDir"),
+        "concurrency" : int_concurrency,
+        "parallel_sessions" : int_parallel_sessions,
+        "segment_seconds" : float_segment_seconds,
         "output_file" : get_cmd_option("--output"),        
+        "flush_bytes" : int_flush_bytes,
+        "flush_interval" : td_flush_interval,
+        "fsync_interval" : td_fsync_interval,
+        "write_caption_index" : cmd_option_exists("--index"),
+        "rotate_bytes" : int_rotate_bytes,
+        "rotate_interval_seconds" : float_rotate_interval_seconds,
+        "compress_rotated" : cmd_option_exists("--compressRotated"),
+        "hls_directory" : get_cmd_option("--hls"),
+        "hls_segment_seconds" : float_hls_segment_seconds,
+        "hls_window" : int_hls_window,
+        "mpegts_offset" : int_mpegts_offset,
+        "cache_file" : get_cmd_option("--cache"),
+        "cache_partial_results" : cmd_option_exists("--cachePartials"),
+        "metrics_file" : get_cmd_option("--metrics"),
+        "recording_file" : get_cmd_option("--record"),
+        "checkpoint_file" : get_cmd_option("--checkpoint"),
+        "checkpoint_interval_seconds" : float_checkpoint_interval_seconds,
+        "resume" : cmd_option_exists("--resume"),
+        "metrics_format" : metrics_format,
+        "metrics_interval_seconds" : float_metrics_interval_seconds,
         "phrases" : get_phrases(),
         "suppress_console_output" : cmd_option_exists("--quiet"),
         "captioning_mode" : captioning_mode,
-        "remain_time" : td_remain_time,
-        "delay" : td_delay,
-        "use_sub_rip_text_caption_format" : cmd_option_exists("--srt"),
+        "stream_offline_captions" : cmd_option_exists("--stream"),
+        "serve_port" : int_serve_port,
+        "serve_host" : serve_host,
+        "remain_time" : ticks_remain_time,
+        "delay" : ticks_delay,
+        "adaptive_delay" : cmd_option_exists("--adaptiveDelay"),
+        "min_delay" : ticks_min_delay,
+        "max_delay" : ticks_max_delay,
+        "target_revision_rate" : float_target_revision_rate,
+        "max_partial_rate" : float_max_partial_rate,
+        "caption_format" : caption_formats[0],
+        # With --formats, the other formats to write.
+        "extra_caption_formats" : caption_formats[1:],
+        "caption_layouts" : get_caption_layouts(usage),
+        # The name of the layout and the format of a track that writes one more caption file. None for the main track.
+        "caption_variant" : None,
         "max_line_length" : int_max_line_length,
         "lines" : int_lines,
         "stable_partial_result_threshold" : get_cmd_option("--threshold"),